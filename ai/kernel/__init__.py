@@ -1,4 +1,47 @@
 import logging
+import threading
+from abc import ABC, abstractmethod
+
+# Kernel 请求失败/被取消时返回的提示前缀, KernelPool、对冲请求和review流程据此判断回答不是真正的结果
+FAILED_ANSWER_PREFIX = "当前网络拥挤"
+CANCELLED_ANSWER_PREFIX = "分析已取消"
+
+
+class CancelEvent(threading.Event):
+    """
+    可注册回调的停止事件
+
+    与 threading.Event 用法一致, set() 时会依次调用已注册的回调,
+    Kernel 用它在请求进行中立即关闭连接, 而不是等到请求返回后再检查停止标志
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """注册回调, 如果事件已经触发则立即调用"""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.info(f"停止回调执行失败: {e}")
 
 
 class Kernel:
@@ -8,8 +51,52 @@ class Kernel:
     def answer(self, question:str) -> str:
         pass
 
+    def answer_stream(self, question:str, on_delta=None, cancel_event:CancelEvent=None) -> str:
+        """
+        流式回答, 每收到一段内容调用 on_delta(delta, text), cancel_event 触发时尽快中断请求
+        默认实现不支持流式, 直接返回完整回答
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            return CANCELLED_ANSWER_PREFIX
+        text = self.answer(question)
+        if on_delta and text:
+            on_delta(text, text)
+        return text
+
     def is_valid(self, question:str) -> bool:
         pass
-    
+
     def name(self) -> str:
         return "Kernel"
+
+
+class AsyncKernel(ABC):
+    """
+    异步 Kernel 接口, 供 asyncio 调度器使用
+
+    取消通过 asyncio 的任务取消完成: 调用方 cancel() 正在 await 的任务即可中断请求
+    """
+
+    @abstractmethod
+    async def answer(self, question:str) -> str:
+        pass
+
+    async def answer_stream(self, question:str, on_delta=None) -> str:
+        """
+        流式回答, 每收到一段内容调用 on_delta(delta, text)
+        默认实现不支持流式, 直接返回完整回答
+        """
+        text = await self.answer(question)
+        if on_delta and text:
+            on_delta(text, text)
+        return text
+
+    def set_pool_size(self, pool_size:int):
+        """调整底层连接池大小, 一般与最大并发数一致"""
+        pass
+
+    async def close(self):
+        pass
+
+    def name(self) -> str:
+        return "AsyncKernel"
@@ -1,9 +1,12 @@
-from ai.kernel import Kernel
-import requests 
+from ai.kernel import Kernel, FAILED_ANSWER_PREFIX
+from ai.kernel.http_pool import SessionPool, get_session_pool
+from ai.kernel.ratelimit import (RateLimiter, get_rate_limiter, call_with_retry, error_for_status, estimate_tokens,
+                                 CircuitOpenError, RetryableError)
 import logging
+import requests
 
 class AI53(Kernel):
-    def __init__(self, config:dict):
+    def __init__(self, config:dict, session_pool:SessionPool=None, rate_limiter:RateLimiter=None):
         self.url = config["url"]
         self.bot_id = config["bot_id"]
         self.secret_key = config["secret_key"]
@@ -11,7 +14,9 @@ class AI53(Kernel):
             "Authorization": "Bearer {}".format(self.secret_key),
             "Bot-Id": self.bot_id
         }
-    def answer(self, question:str, retry_count=0) -> str:
+        self.session_pool = session_pool or get_session_pool()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+    def answer(self, question:str) -> str:
         data = {
             "conversation_id": "",
             "query": question,
@@ -47,19 +52,29 @@ class AI53(Kernel):
     "created_at": 1724752607
 }
         """
-        response = requests.post(self.url, 
-                                 headers=self.headers, 
-                                 json=data, 
-                                #  proxies=proxies
-                                 )
-        logging.info("请求返回:{}".format(response.text))
-        if response.status_code != 200:
-            if retry_count < 3:
-                return self.answer(question, retry_count+1)
-            return "当前网络拥挤，请稍后再试。"
-        else:
+        def attempt():
+            try:
+                response = self.session_pool.post(self.url, 
+                                         headers=self.headers, 
+                                         json=data, 
+                                        #  proxies=proxies
+                                         )
+            except requests.RequestException as e:
+                raise RetryableError("请求异常: {}".format(e))
+            logging.info("请求返回:{}".format(response.text))
+            if response.status_code != 200:
+                error = error_for_status(response.status_code, response.headers.get("Retry-After"), response.text)
+                if error is not None:
+                    raise error
+                return FAILED_ANSWER_PREFIX + "，请稍后再试。"
             return response.json()["answer"]
 
+        try:
+            return call_with_retry(self.rate_limiter, attempt, estimate_tokens(question))
+        except (CircuitOpenError, RetryableError) as e:
+            logging.info("请求失败:{}".format(e))
+            return FAILED_ANSWER_PREFIX + "，请稍后再试。"
+
 
     def is_valid(self, question:str) -> bool:
         return True
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+
+from ai.kernel import AsyncKernel, CancelEvent, Kernel, FAILED_ANSWER_PREFIX
+from ai.kernel.fast_gtp import FastGTP, SSE_DONE, parse_sse_delta
+from ai.kernel.ratelimit import (RateLimiter, get_rate_limiter, call_with_retry_async, error_for_status,
+                                 estimate_tokens, CircuitOpenError, RetryableError)
+from ai.kernel.worker_pool import ResizableThreadPool
+from monitor.metrics import get_metrics
+from config.config import FastGTPConfig
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 为可选依赖, 缺失时通过线程池适配同步 Kernel
+    aiohttp = None
+
+
+class KernelAsyncAdapter(AsyncKernel):
+    """
+    把同步 Kernel 适配为 AsyncKernel
+
+    请求在可调整大小的线程池中执行, 任务被取消时触发 CancelEvent 中断同步请求,
+    在没有 aiohttp 的环境下作为 AsyncFastGTP 的替代
+    """
+
+    def __init__(self, kernel:Kernel, max_workers:int = 3):
+        self.kernel = kernel
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ResizableThreadPool(self.max_workers, thread_name_prefix="kernel")
+        self._request_timer = get_metrics().stage("http_request")
+
+    async def answer(self, question:str) -> str:
+        # 同步的非流式请求无法中途中断, 任务取消后线程会在请求返回后释放
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, self.kernel.answer, question)
+        finally:
+            self._request_timer.observe(time.perf_counter() - start)
+
+    async def answer_stream(self, question:str, on_delta=None) -> str:
+        cancel_event = CancelEvent()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        future = loop.run_in_executor(self._executor, self.kernel.answer_stream, question, on_delta, cancel_event)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+        finally:
+            self._request_timer.observe(time.perf_counter() - start)
+
+    def set_pool_size(self, pool_size:int):
+        pool_size = max(1, int(pool_size))
+        if pool_size == self.max_workers:
+            return
+        # 缩小时空闲线程先退出, 执行中的请求完成后线程再退出
+        self.max_workers = pool_size
+        self._executor.resize(pool_size)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+    def name(self) -> str:
+        return self.kernel.name()
+
+
+class AsyncFastGTP(AsyncKernel):
+    """
+    基于 aiohttp 的 FastGTP 客户端
+
+    - 所有请求在同一个事件循环中以协程方式执行, 不占用线程
+    - TCPConnector 复用 keep-alive 连接, 连接数上限与最大并发数一致
+    - 任务取消时 aiohttp 会立即关闭对应连接
+    """
+
+    def __init__(self, config:FastGTPConfig, pool_size:int = 3, rate_limiter:RateLimiter = None):
+        if aiohttp is None:
+            raise RuntimeError("AsyncFastGTP 需要安装 aiohttp")
+        self.config = config
+        self.pool_size = max(1, int(pool_size))
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self._request_builder = FastGTP(config)  # 复用请求体与请求头的构造
+        self._session = None
+        self._retired_sessions = []  # 调整连接池大小后被替换的旧会话, 没有在途请求时释放
+
+        # 统计信息
+        self._requests = 0
+        self._failures = 0
+        self._in_flight = 0
+        self._total_latency = 0.0
+        self._request_timer = get_metrics().stage("http_request")
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    def _timeout(self):
+        return aiohttp.ClientTimeout(sock_connect=self.config.connect_timeout, sock_read=self.config.read_timeout)
+
+    def set_pool_size(self, pool_size:int):
+        pool_size = max(1, int(pool_size))
+        if pool_size == self.pool_size:
+            return
+        self.pool_size = pool_size
+        if self._session is not None:
+            # 旧会话上的请求继续使用原有连接, 新请求使用新的连接池
+            self._retired_sessions.append(self._session)
+            self._session = None
+
+    async def _post(self, question:str, stream:bool):
+        session = self._get_session()
+        try:
+            return await session.post(self.config.url,
+                                      headers=self._request_builder.get_headers(),
+                                      json=self._request_builder.build_request(question, stream=stream),
+                                      timeout=self._timeout())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RetryableError("请求异常: {}".format(str(e) or type(e).__name__))
+
+    @staticmethod
+    async def _check_status(response):
+        """
+        检查响应状态码
+        :return: 非200且不需要重试时的提示信息, 正常时返回 None
+        :raises RetryableError: 需要重试的状态码
+        """
+        if response.status == 200:
+            return None
+        text = await response.text()
+        error = error_for_status(response.status, response.headers.get("Retry-After"), text)
+        if error is not None:
+            raise error
+        return FAILED_ANSWER_PREFIX + "，请稍后再试: {}".format(text)
+
+    async def answer(self, question:str) -> str:
+        async def attempt():
+            async with await self._post(question, stream=False) as response:
+                logging.info("分析完成:{}".format(response.status))
+                message = await self._check_status(response)
+                if message is not None:
+                    return message
+                try:
+                    data = await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise RetryableError("请求异常: {}".format(e))
+                return data["choices"][0]["message"]["content"]
+
+        return await self._call(question, attempt, "开始分析")
+
+    async def answer_stream(self, question:str, on_delta=None) -> str:
+        chunks = []
+
+        async def attempt():
+            async with await self._post(question, stream=True) as response:
+                message = await self._check_status(response)
+                if message is not None:
+                    return message
+                try:
+                    async for raw_line in response.content:
+                        delta = parse_sse_delta(raw_line.decode("utf-8", errors="replace").strip())
+                        if delta is SSE_DONE:
+                            break
+                        if delta:
+                            chunks.append(delta)
+                            if on_delta:
+                                on_delta(delta, "".join(chunks))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # 已经输出过内容时不再重试, 避免重复推送
+                    if chunks:
+                        raise
+                    raise RetryableError("请求异常: {}".format(e))
+                logging.info("流式分析结束")
+                return "".join(chunks)
+
+        return await self._call(question, attempt, "开始分析(流式)")
+
+    async def _call(self, question:str, attempt, log_message:str) -> str:
+        """在限流器控制下执行请求并记录统计信息"""
+        self._requests += 1
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            logging.info(log_message)
+            return await call_with_retry_async(self.rate_limiter, attempt, estimate_tokens(question))
+        except asyncio.CancelledError:
+            raise
+        except (CircuitOpenError, RetryableError) as e:
+            self._failures += 1
+            return FAILED_ANSWER_PREFIX + "，请稍后再试: {}".format(e)
+        except Exception as e:
+            self._failures += 1
+            logging.info("请求异常:{}".format(e))
+            return FAILED_ANSWER_PREFIX + "，请稍后再试。"
+        finally:
+            self._in_flight -= 1
+            elapsed = time.perf_counter() - start
+            self._total_latency += elapsed
+            self._request_timer.observe(elapsed)
+            if self._in_flight == 0 and self._retired_sessions:
+                # 没有在途请求时旧会话已不再使用, 及时释放其连接
+                asyncio.ensure_future(self._close_retired_sessions())
+
+    async def _close_retired_sessions(self):
+        sessions, self._retired_sessions = self._retired_sessions, []
+        for session in sessions:
+            await session.close()
+
+    def stats(self) -> dict:
+        """获取请求统计信息（用于监控）"""
+        finished = self._requests - self._in_flight
+        return {
+            'pool_size': self.pool_size,
+            'requests': self._requests,
+            'failures': self._failures,
+            'in_flight': self._in_flight,
+            'avg_latency_ms': (self._total_latency / finished * 1000) if finished else 0.0,
+        }
+
+    async def close(self):
+        sessions = self._retired_sessions + ([self._session] if self._session is not None else [])
+        self._retired_sessions = []
+        self._session = None
+        for session in sessions:
+            await session.close()
+
+    def name(self) -> str:
+        return "FastGTP"
+
+
+def create_async_kernel(config:FastGTPConfig, pool_size:int = 3, session_pool=None,
+                        rate_limiter:RateLimiter = None) -> AsyncKernel:
+    """创建 FastGTP 的异步客户端, 未安装 aiohttp 时退化为线程池适配"""
+    if aiohttp is not None:
+        return AsyncFastGTP(config, pool_size, rate_limiter)
+    logging.warning("未安装 aiohttp, 使用线程池执行分析请求")
+    return KernelAsyncAdapter(FastGTP(config, session_pool, rate_limiter), pool_size)
@@ -1,56 +1,174 @@
-from ai.kernel import Kernel
-import requests 
+from ai.kernel import Kernel, CancelEvent, FAILED_ANSWER_PREFIX, CANCELLED_ANSWER_PREFIX
+from ai.kernel.http_pool import SessionPool, get_session_pool, abort_response
+from ai.kernel.ratelimit import (RateLimiter, get_rate_limiter, call_with_retry, error_for_status, estimate_tokens,
+                                 CircuitOpenError, RetryableError)
 from config.config import FastGTPConfig
+import json
 import logging
+import requests
+
+SSE_DONE = object()  # 流式响应结束标记
+
+
+def parse_sse_delta(line:str):
+    """
+    解析一行 SSE 数据
+    :return: 增量文本; 流结束返回 SSE_DONE; 空行/心跳/无内容返回 None
+    """
+    # SSE 格式: "data: {...}", 空行分隔事件, ":" 开头为注释/心跳
+    if not line or not line.startswith("data:"):
+        return None
+    payload = line[5:].strip()
+    if payload == "[DONE]":
+        return SSE_DONE
+    try:
+        choices = json.loads(payload).get("choices") or []
+    except ValueError:
+        logging.info("无法解析的流式数据: {}".format(payload))
+        return None
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content") or None
+
+
 class FastGTP(Kernel):
-    def __init__(self, config:FastGTPConfig):
+    def __init__(self, config:FastGTPConfig, session_pool:SessionPool=None, rate_limiter:RateLimiter=None):
         self.config = config
+        self.session_pool = session_pool or get_session_pool()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self._headers = None
+        self._headers_key = None  # 生成请求头时使用的 secret_key, 配置修改后需要重建
 
     def get_headers(self) -> dict:
+        if self._headers is None or self._headers_key != self.config.secret_key:
+            self._headers_key = self.config.secret_key
+            self._headers = {
+                "Content-Type": "application/json",
+                "Authorization": "Bearer {}".format(self.config.secret_key)
+            }
+        return self._headers
+
+    def build_request(self, question:str, stream:bool) -> dict:
         return {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer {}".format(self.config.secret_key)
-        }      
+            "model": self.config.gtp_model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": question
+                }
+            ],
+            "stream": stream,
+        }
 
-    def answer(self, question:str, retry_count=0) -> str:
+    def answer(self, question:str) -> str:
         # sleep 10秒
         # import time
         # logging.info("answer")
         # time.sleep(5)
         # return "测试"
-        try:
-            data = {
-                "model": self.config.gtp_model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": question
-                    }
-                ],
-                "stream": False,
-            }
-            logging.info("开始分析")
+        data = self.build_request(question, stream=False)
+
+        def attempt():
             # proxies = {
             #     'http': 'socks5://xxxx:10080',
             #     'https': 'socks5://xxxx:10080',
             # }
-            response = requests.post(self.config.url, 
-                                    headers=self.get_headers(), 
-                                    json=data, 
-                                    #  proxies=proxies
-                                    timeout=300,
-                                    )
+            try:
+                response = self.session_pool.post(self.config.url, 
+                                        headers=self.get_headers(), 
+                                        json=data, 
+                                        #  proxies=proxies
+                                        timeout=(self.config.connect_timeout, self.config.read_timeout),
+                                        )
+            except requests.RequestException as e:
+                raise RetryableError("请求异常: {}".format(e))
             logging.info("分析完成:{}".format(response.status_code))
             if response.status_code != 200:
-                if retry_count < 3:
-                    return self.answer(question, retry_count+1)
-                return "当前网络拥挤，请稍后再试: {}".format(response.text)
-            else:
-                return response.json()["choices"][0]["message"]["content"]
+                error = error_for_status(response.status_code, response.headers.get("Retry-After"), response.text)
+                if error is not None:
+                    raise error
+                return FAILED_ANSWER_PREFIX + "，请稍后再试: {}".format(response.text)
+            return response.json()["choices"][0]["message"]["content"]
+
+        try:
+            logging.info("开始分析")
+            return call_with_retry(self.rate_limiter, attempt, estimate_tokens(question))
+        except (CircuitOpenError, RetryableError) as e:
+            return FAILED_ANSWER_PREFIX + "，请稍后再试: {}".format(e)
         except Exception as e:
             logging.info("请求异常:{}".format(e))
-            return "当前网络拥挤，请稍后再试。"
+            return FAILED_ANSWER_PREFIX + "，请稍后再试。"
     
+    def answer_stream(self, question:str, on_delta=None, cancel_event:CancelEvent=None) -> str:
+        """
+        以 SSE 流式方式获取回答
+
+        :param on_delta: 每收到一段内容时调用 on_delta(delta, text), text 为目前为止的完整内容
+        :param cancel_event: 触发后立即关闭连接并返回 "分析已取消"
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            return CANCELLED_ANSWER_PREFIX
+        data = self.build_request(question, stream=True)
+        chunks = []
+
+        def attempt():
+            try:
+                response = self.session_pool.post(self.config.url,
+                                        headers=self.get_headers(),
+                                        json=data,
+                                        stream=True,
+                                        timeout=(self.config.connect_timeout, self.config.read_timeout),
+                                        )
+            except requests.RequestException as e:
+                raise RetryableError("请求异常: {}".format(e))
+            abort = None
+            if cancel_event is not None:
+                abort = lambda: abort_response(response)
+                cancel_event.add_callback(abort)
+            try:
+                if response.status_code != 200:
+                    text = response.text
+                    error = error_for_status(response.status_code, response.headers.get("Retry-After"), text)
+                    if error is not None:
+                        raise error
+                    return FAILED_ANSWER_PREFIX + "，请稍后再试: {}".format(text)
+
+                for line in response.iter_lines(decode_unicode=True):
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    delta = parse_sse_delta(line)
+                    if delta is SSE_DONE:
+                        break
+                    if delta:
+                        chunks.append(delta)
+                        if on_delta:
+                            on_delta(delta, "".join(chunks))
+                return "".join(chunks)
+            except requests.RequestException as e:
+                # 已经输出过内容时不再重试, 避免重复推送
+                if chunks or (cancel_event is not None and cancel_event.is_set()):
+                    raise
+                raise RetryableError("请求异常: {}".format(e))
+            finally:
+                if abort is not None:
+                    cancel_event.remove_callback(abort)
+                response.close()
+
+        try:
+            logging.info("开始分析(流式)")
+            answer = call_with_retry(self.rate_limiter, attempt, estimate_tokens(question), cancel_event)
+            logging.info("流式分析结束")
+        except (CircuitOpenError, RetryableError) as e:
+            answer = FAILED_ANSWER_PREFIX + "，请稍后再试: {}".format(e)
+        except Exception as e:
+            answer = FAILED_ANSWER_PREFIX + "，请稍后再试。"
+            if not (cancel_event is not None and cancel_event.is_set()):
+                logging.info("请求异常:{}".format(e))
+
+        if answer is None or (cancel_event is not None and cancel_event.is_set()):
+            return CANCELLED_ANSWER_PREFIX
+        return answer
+
     def is_valid(self, question:str) -> bool:
         return True
     
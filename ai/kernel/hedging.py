@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from ai.kernel import AsyncKernel, FAILED_ANSWER_PREFIX
+
+
+class HedgedKernel(AsyncKernel):
+    """
+    对冲请求
+
+    - 请求在最近耗时的第 percentile 百分位内没有返回时, 再发出一个相同的请求(经 KernelPool 时可能路由到其他后端)
+    - 取先成功返回的结果, 取消另一个请求
+    - 对冲请求数不超过总请求数的 max_ratio, 避免上游变慢时成倍放大负载
+    - 流式请求以首个输出内容的时间(首字延迟)作为判断依据, 先输出内容的请求胜出
+    """
+
+    def __init__(self, kernel:AsyncKernel, percentile:float = 95, max_ratio:float = 0.1, min_samples:int = 20,
+                 min_delay:float = 2.0, window:int = 200):
+        self.kernel = kernel
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies = deque(maxlen=window)  # 最近成功请求的耗时(秒)
+        self._first_delta_latencies = deque(maxlen=window)  # 最近流式请求的首字延迟(秒)
+
+        # 统计信息
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._budget_skipped = 0
+
+    def hedge_delay(self, samples:deque):
+        """发出对冲请求前的等待时间, 样本不足时返回 None(不对冲)"""
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def _can_hedge(self) -> bool:
+        if self._hedges + 1 > self._requests * self.max_ratio:
+            self._budget_skipped += 1
+            return False
+        return True
+
+    async def answer(self, question:str) -> str:
+        self._requests += 1
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self.kernel.answer(question))
+        delay = self.hedge_delay(self._latencies)
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._can_hedge():
+                    answer = await self._race(primary, asyncio.ensure_future(self.kernel.answer(question)))
+                    self._record(self._latencies, answer, time.monotonic() - start)
+                    return answer
+            answer = await primary
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        self._record(self._latencies, answer, time.monotonic() - start)
+        return answer
+
+    async def answer_stream(self, question:str, on_delta=None) -> str:
+        self._requests += 1
+        start = time.monotonic()
+        state = {"owner": None, "first_delta": None}
+        attempts = []
+
+        def make_on_delta(attempt_index):
+            def on_attempt_delta(delta, text):
+                if state["owner"] is None:
+                    # 先输出内容的请求胜出, 取消另一个请求
+                    state["owner"] = attempt_index
+                    state["first_delta"] = time.monotonic() - start
+                    for index, task in enumerate(attempts):
+                        if index != attempt_index:
+                            task.cancel()
+                if state["owner"] == attempt_index and on_delta:
+                    on_delta(delta, text)
+            return on_attempt_delta
+
+        attempts.append(asyncio.ensure_future(self.kernel.answer_stream(question, make_on_delta(0))))
+        delay = self.hedge_delay(self._first_delta_latencies)
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({attempts[0]}, timeout=delay)
+                if not done and state["owner"] is None and self._can_hedge():
+                    attempts.append(asyncio.ensure_future(self.kernel.answer_stream(question, make_on_delta(1))))
+                    answer = await self._race(attempts[0], attempts[1], state)
+                    self._record(self._first_delta_latencies, answer, state["first_delta"])
+                    return answer
+            answer = await attempts[0]
+        except asyncio.CancelledError:
+            for task in attempts:
+                task.cancel()
+            raise
+        self._record(self._first_delta_latencies, answer, state["first_delta"])
+        return answer
+
+    async def _race(self, primary, hedge, stream_state:dict = None) -> str:
+        """等待两个请求中先成功的一个, 取消另一个"""
+        self._hedges += 1
+        logging.info("请求超过对冲等待时间, 发出对冲请求")
+        pending = {primary, hedge}
+        answer = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    result = task.result()
+                    if stream_state is not None and stream_state["owner"] is not None:
+                        # 流式请求以先输出内容的为准
+                        winner = primary if stream_state["owner"] == 0 else hedge
+                        if task is not winner:
+                            continue
+                    elif not self._succeeded(result) and pending:
+                        # 失败的结果先保留, 等待另一个请求
+                        answer = result
+                        continue
+                    if task is hedge and self._succeeded(result):
+                        self._hedge_wins += 1
+                    return result
+            return answer
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _succeeded(answer) -> bool:
+        return bool(answer) and not answer.startswith(FAILED_ANSWER_PREFIX)
+
+    def _record(self, samples:deque, answer:str, elapsed):
+        if elapsed is not None and self._succeeded(answer):
+            samples.append(elapsed)
+
+    def set_pool_size(self, pool_size:int):
+        self.kernel.set_pool_size(pool_size)
+
+    async def close(self):
+        await self.kernel.close()
+
+    def stats(self) -> dict:
+        """
+        获取对冲统计信息（用于调整对冲参数）
+
+        Returns:
+            dict: 请求数、对冲数、对冲胜出次数和当前的对冲等待时间
+        """
+        delay = self.hedge_delay(self._latencies)
+        stream_delay = self.hedge_delay(self._first_delta_latencies)
+        return {
+            'requests': self._requests,
+            'hedges': self._hedges,
+            'hedge_wins': self._hedge_wins,
+            'hedge_rate': self._hedges / self._requests if self._requests else 0.0,
+            'win_rate': self._hedge_wins / self._hedges if self._hedges else 0.0,
+            'budget_skipped': self._budget_skipped,
+            'hedge_delay': delay,
+            'stream_hedge_delay': stream_delay,
+        }
+
+    def name(self) -> str:
+        return self.kernel.name()
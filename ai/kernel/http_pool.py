@@ -0,0 +1,172 @@
+import socket
+import threading
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    """
+    各个 Kernel 共享的 HTTP 连接池
+
+    - 基于 requests.Session + HTTPAdapter, 复用 keep-alive 连接, 避免每次请求重新握手
+    - 每个目标主机的连接数上限为 pool_size (一般等于最大并发分析数), 超出时阻塞等待空闲连接
+    - 统计请求数、失败数、在途请求数、新建连接数等信息, 供监控使用
+    """
+
+    def __init__(self, pool_size: int = 3, connect_timeout: float = 10, read_timeout: float = 300):
+        self._lock = threading.Lock()
+        self.pool_size = max(1, int(pool_size))
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = self._build_session(self.pool_size)
+
+        # 统计信息
+        self._requests = 0
+        self._failures = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._total_latency = 0.0
+        self._retired_connections = 0  # resize 之前的旧连接池累计建立的连接数
+
+    def _build_session(self, pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,  # 缓存的主机数
+            pool_maxsize=pool_size,  # 每个主机的最大连接数
+            pool_block=True,  # 连接用完时等待, 而不是新建临时连接
+            max_retries=0,  # 重试由 Kernel 自己控制
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+    def configure(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None):
+        """调整连接池大小及超时时间, 连接池大小变化时会重建 Session"""
+        old_session = None
+        with self._lock:
+            if connect_timeout is not None:
+                self.connect_timeout = connect_timeout
+            if read_timeout is not None:
+                self.read_timeout = read_timeout
+            if pool_size is not None and max(1, int(pool_size)) != self.pool_size:
+                self.pool_size = max(1, int(pool_size))
+                self._retired_connections += self._count_connections(self._session)
+                old_session = self._session
+                self._session = self._build_session(self.pool_size)
+        if old_session is not None:
+            # 在途请求使用的连接归还时会因连接池已关闭而直接断开, 不影响请求本身
+            old_session.close()
+            logging.info(f"HTTP 连接池已调整, 大小: {self.pool_size}")
+
+    def timeout(self) -> tuple:
+        """返回 requests 使用的 (连接超时, 读取超时)"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """通过共享连接池发送 POST 请求, 未指定 timeout 时使用连接池的超时配置"""
+        kwargs.setdefault("timeout", self.timeout())
+        with self._lock:
+            session = self._session
+            self._requests += 1
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        start = time.perf_counter()
+        try:
+            return session.post(url, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._in_flight -= 1
+                self._total_latency += elapsed
+
+    @staticmethod
+    def _count_connections(session: requests.Session) -> int:
+        """统计 Session 下所有主机连接池累计建立的连接数"""
+        count = 0
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                try:
+                    count += pools[key].num_connections
+                except KeyError:
+                    continue
+        return count
+
+    def stats(self) -> dict:
+        """
+        获取连接池统计信息（用于监控）
+
+        Returns:
+            dict: 连接池状态信息
+        """
+        with self._lock:
+            connections = self._retired_connections + self._count_connections(self._session)
+            finished = self._requests - self._in_flight
+            return {
+                'pool_size': self.pool_size,
+                'connect_timeout': self.connect_timeout,
+                'read_timeout': self.read_timeout,
+                'requests': self._requests,
+                'failures': self._failures,
+                'in_flight': self._in_flight,
+                'peak_in_flight': self._peak_in_flight,
+                'connections_created': connections,
+                'connections_reused': max(0, self._requests - connections),
+                'avg_latency_ms': (self._total_latency / finished * 1000) if finished else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._session.close()
+
+
+def abort_response(response: requests.Response):
+    """
+    立即中断一个流式响应
+
+    仅调用 response.close() 无法唤醒阻塞在 recv 上的读线程, 需要先 shutdown 底层 socket,
+    被中断的连接不会归还连接池
+    """
+    connection = getattr(response.raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    try:
+        response.close()
+    except Exception:
+        pass
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """获取进程内共享的连接池"""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = SessionPool()
+    return _default_pool
+
+
+def configure_session_pool(pool_size: int = None, connect_timeout: float = None, read_timeout: float = None) -> SessionPool:
+    """根据配置调整共享连接池, 一般在加载配置或修改并发数后调用"""
+    pool = get_session_pool()
+    pool.configure(pool_size=pool_size, connect_timeout=connect_timeout, read_timeout=read_timeout)
+    return pool
@@ -0,0 +1,215 @@
+import logging
+import time
+from collections import deque
+
+from ai.kernel import AsyncKernel, FAILED_ANSWER_PREFIX, CANCELLED_ANSWER_PREFIX
+from ai.kernel.ai53 import AI53
+from ai.kernel.async_kernel import KernelAsyncAdapter, create_async_kernel
+from ai.kernel.http_pool import SessionPool
+from ai.kernel.ratelimit import RateLimiter
+from config.config import FastGTPConfig
+
+
+class Backend:
+    """
+    KernelPool 中的一个后端及其统计信息
+
+    latency 为完成请求耗时的指数加权移动平均(EWMA), 连续失败达到阈值后在 cool_down 秒内不再分配请求
+    """
+
+    def __init__(self, name:str, kernel:AsyncKernel, ewma_alpha:float = 0.3):
+        self.name = name
+        self.kernel = kernel
+        self.ewma_alpha = ewma_alpha
+        self.latency = None  # EWMA 耗时(秒), 还没有完成过请求时为 None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self._completed = deque()  # 最近一分钟内成功完成请求的时间, 用于计算吞吐量
+
+    def available(self, now:float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self, default_latency:float) -> float:
+        """路由评分, 越小越优先: 预计耗时 * (排队请求数 + 1)"""
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (self.in_flight + 1)
+
+    def record_success(self, elapsed:float, now:float):
+        self.consecutive_failures = 0
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency = self.ewma_alpha * elapsed + (1 - self.ewma_alpha) * self.latency
+        self._completed.append(now)
+
+    def record_failure(self, now:float, failure_threshold:int, cool_down:float):
+        self.failures += 1
+        if not self.available(now):
+            # 暂停前已发出的请求陆续失败, 不重复计算
+            return
+        self.consecutive_failures += 1
+        if failure_threshold > 0 and self.consecutive_failures >= failure_threshold:
+            self.ejected_until = now + cool_down
+            self.consecutive_failures = 0
+            logging.warning(f"后端 {self.name} 连续失败, 暂停使用 {cool_down} 秒")
+
+    def throughput(self, now:float) -> int:
+        """最近一分钟成功完成的请求数"""
+        while self._completed and now - self._completed[0] > 60:
+            self._completed.popleft()
+        return len(self._completed)
+
+
+class KernelPool(AsyncKernel):
+    """
+    多后端 Kernel 池
+
+    - 每个请求路由到 EWMA 耗时 * (进行中请求数 + 1) 最小的可用后端
+    - 后端连续失败后暂停使用一段时间, 请求失败且尚未输出内容时切换到下一个后端重试一次
+    - stats() 返回每个后端的耗时、进行中请求数和每分钟吞吐量
+    """
+
+    def __init__(self, backends:list, failure_threshold:int = 2, cool_down:float = 60):
+        if not backends:
+            raise ValueError("KernelPool 至少需要一个后端")
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+
+    def _choose(self, exclude=()) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        available = [b for b in candidates if b.available(now)]
+        if not available:
+            # 全部后端都在冷却中时选择最早恢复的, 而不是直接失败
+            return min(candidates, key=lambda b: b.ejected_until)
+        # 没有耗时数据的后端按已知的平均耗时估算, 保证新后端也能分到请求
+        known = [b.latency for b in available if b.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        return min(available, key=lambda b: b.score(default_latency))
+
+    async def _call(self, call, can_failover) -> str:
+        tried = []
+        while True:
+            backend = self._choose(tried)
+            tried.append(backend)
+            backend.requests += 1
+            backend.in_flight += 1
+            start = time.monotonic()
+            try:
+                answer = await call(backend.kernel)
+            finally:
+                backend.in_flight -= 1
+            now = time.monotonic()
+            if answer and answer.startswith(CANCELLED_ANSWER_PREFIX):
+                return answer
+            if answer and not answer.startswith(FAILED_ANSWER_PREFIX):
+                backend.record_success(now - start, now)
+                return answer
+            backend.record_failure(now, self.failure_threshold, self.cool_down)
+            if len(tried) >= 2 or len(tried) >= len(self.backends) or not can_failover():
+                return answer
+            logging.info(f"后端 {backend.name} 请求失败, 切换后端重试")
+
+    async def answer(self, question:str) -> str:
+        return await self._call(lambda kernel: kernel.answer(question), lambda: True)
+
+    async def answer_stream(self, question:str, on_delta=None) -> str:
+        emitted = []
+
+        def on_backend_delta(delta, text):
+            emitted.append(True)
+            if on_delta:
+                on_delta(delta, text)
+
+        # 已经向调用方输出过内容时不再切换后端, 避免内容重复
+        return await self._call(lambda kernel: kernel.answer_stream(question, on_backend_delta),
+                                lambda: not emitted)
+
+    def set_pool_size(self, pool_size:int):
+        for backend in self.backends:
+            backend.kernel.set_pool_size(pool_size)
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.kernel.close()
+
+    def available_count(self) -> int:
+        now = time.monotonic()
+        return sum(1 for b in self.backends if b.available(now))
+
+    def stats(self) -> list:
+        """
+        获取每个后端的统计信息（用于监控）
+
+        Returns:
+            list: 每个后端一个 dict
+        """
+        now = time.monotonic()
+        return [{
+            'name': b.name,
+            'available': b.available(now),
+            'ejected_for': max(0.0, b.ejected_until - now),
+            'ewma_latency_ms': b.latency * 1000 if b.latency is not None else None,
+            'in_flight': b.in_flight,
+            'requests': b.requests,
+            'failures': b.failures,
+            'throughput_per_minute': b.throughput(now),
+        } for b in self.backends]
+
+    def name(self) -> str:
+        return "KernelPool({})".format(", ".join(b.name for b in self.backends))
+
+
+def create_backend_kernel(backend_config:dict, base_config:FastGTPConfig, pool_size:int,
+                          session_pool:SessionPool, rate_limiter:RateLimiter) -> AsyncKernel:
+    """
+    根据后端配置创建异步 Kernel
+    :param backend_config: {"type": "fast_gtp"/"ai53", "url", "secret_key", "gtp_model"/"bot_id"}
+    :param base_config: 主后端配置, 提供超时和流式等公共设置
+    """
+    kernel_type = backend_config.get("type", "fast_gtp")
+    if kernel_type == "ai53":
+        return KernelAsyncAdapter(AI53(backend_config, session_pool, rate_limiter), pool_size)
+    if kernel_type != "fast_gtp":
+        raise ValueError("不支持的后端类型: {}".format(kernel_type))
+    config = FastGTPConfig()
+    config.url = backend_config.get("url", "")
+    config.secret_key = backend_config.get("secret_key", "")
+    config.gtp_model = backend_config.get("gtp_model", base_config.gtp_model)
+    config.connect_timeout = base_config.connect_timeout
+    config.read_timeout = base_config.read_timeout
+    config.stream = base_config.stream
+    return create_async_kernel(config, pool_size, session_pool, rate_limiter)
+
+
+def create_kernel_pool(primary:AsyncKernel, primary_name:str, backend_configs:list, base_config:FastGTPConfig,
+                       pool_size:int, session_pool:SessionPool, rate_limit_kwargs:dict,
+                       failure_threshold:int = 2, cool_down:float = 60, ewma_alpha:float = 0.3) -> AsyncKernel:
+    """
+    在主 Kernel 之外加入配置中的其他后端组成 KernelPool, 只有一个可用后端时直接返回该 Kernel
+    每个额外后端使用独立的限流器, 不同的 key 各自计算配额和熔断
+    :param primary: 主 Kernel, 主后端未配置 URL 时可以为 None
+    """
+    if not backend_configs:
+        return primary
+    backends = [Backend(primary_name, primary, ewma_alpha)] if primary is not None else []
+    for index, backend_config in enumerate(backend_configs, 1):
+        try:
+            kernel = create_backend_kernel(backend_config, base_config, pool_size, session_pool,
+                                           RateLimiter(**rate_limit_kwargs))
+        except (KeyError, ValueError) as e:
+            logging.error(f"后端配置无效, 已忽略: {e}")
+            continue
+        name = backend_config.get("name") or "{}#{}".format(kernel.name(), index)
+        backends.append(Backend(name, kernel, ewma_alpha))
+    if not backends:
+        return primary
+    if len(backends) == 1:
+        return backends[0].kernel
+    return KernelPool(backends, failure_threshold, cool_down)
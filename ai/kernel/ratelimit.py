@@ -0,0 +1,381 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+
+
+# 需要重试的 HTTP 状态码
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态, 请求被直接拒绝"""
+
+
+class RetryableError(Exception):
+    """
+    可重试的请求错误（429、5xx、网络异常等）
+    :param retry_after: 服务端通过 Retry-After 指定的等待秒数
+    :param throttled: 是否为限流(429), 限流不计入熔断失败次数
+    """
+
+    def __init__(self, message:str, retry_after:float = None, throttled:bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.throttled = throttled
+
+
+def error_for_status(status_code:int, retry_after_header, text:str):
+    """根据响应状态码生成 RetryableError, 不需要重试的状态码返回 None"""
+    if status_code not in RETRYABLE_STATUS:
+        return None
+    return RetryableError("HTTP {}: {}".format(status_code, text[:200]),
+                          retry_after=parse_retry_after(retry_after_header),
+                          throttled=status_code == 429)
+
+
+def parse_retry_after(value) -> float:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期）, 无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def estimate_tokens(text:str) -> int:
+    """粗略估算文本的 token 数（按 UTF-8 字节数/4, 中文约 0.75 token/字）"""
+    if not text:
+        return 1
+    return max(1, len(text.encode("utf-8")) // 4)
+
+
+class TokenBucket:
+    """
+    令牌桶, 每分钟补充 rate 个令牌, 桶容量为 rate (允许一分钟内的突发)
+    rate <= 0 表示不限制
+    """
+
+    def __init__(self, rate_per_minute:float):
+        self.rate = rate_per_minute
+        self.capacity = rate_per_minute
+        self._tokens = float(rate_per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now:float):
+        if self.rate <= 0:
+            return
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / 60.0)
+        self._updated = now
+
+    def try_take(self, amount:float, now:float) -> float:
+        """
+        尝试取出 amount 个令牌
+        :return: 0 表示成功, 否则为需要等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        # 单次请求超过桶容量时, 桶满即可放行, 避免永远等待
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        return (amount - self._tokens) * 60.0 / self.rate
+
+    def give_back(self, amount:float):
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def remaining(self, now:float) -> float:
+        if self.rate <= 0:
+            return -1
+        self._refill(now)
+        return self._tokens
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    - closed: 正常放行, 连续失败达到 failure_threshold 次后打开
+    - open: 直接拒绝请求, recovery_timeout 秒后进入 half_open
+    - half_open: 只放行一个探测请求, 成功则关闭, 失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold:int = 5, recovery_timeout:float = 30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self, now:float) -> bool:
+        if self.failure_threshold <= 0 or self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if now - self._opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # half_open: 同一时间只允许一个探测请求
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self):
+        """探测请求未得出结果（被取消、被限流等）时释放探测名额"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, now:float):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or (self.failure_threshold > 0 and self._failures >= self.failure_threshold):
+            if self.state != self.OPEN:
+                logging.warning(f"上游连续失败 {self._failures} 次, 熔断 {self.recovery_timeout} 秒")
+            self.state = self.OPEN
+            self._opened_at = now
+
+    def retry_in(self, now:float) -> float:
+        """熔断打开时距离进入 half_open 的秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (now - self._opened_at))
+
+
+class RateLimiter:
+    """
+    Kernel 共享的限流层
+
+    - 请求数(RPM)和 token 数(TPM)两个令牌桶
+    - 失败重试使用带抖动的指数退避, 服务端返回 Retry-After 时以其为准, 并暂停所有请求直到该时间
+    - 熔断器在上游持续失败时让排队的任务快速失败
+    - state() 返回当前剩余额度和熔断状态, 供状态栏展示
+    """
+
+    def __init__(self, requests_per_minute:float = 0, tokens_per_minute:float = 0, max_retries:int = 3,
+                 base_delay:float = 1.0, max_delay:float = 60.0, failure_threshold:int = 5,
+                 recovery_timeout:float = 30):
+        self._lock = threading.Lock()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self._breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+        self._blocked_until = 0.0  # Retry-After 指定的全局暂停截止时间(monotonic)
+        self._throttled = 0  # 因 429 等被限流的次数
+        self._rejected = 0  # 因熔断被拒绝的次数
+
+    def configure(self, requests_per_minute:float = None, tokens_per_minute:float = None, max_retries:int = None,
+                  base_delay:float = None, max_delay:float = None, failure_threshold:int = None,
+                  recovery_timeout:float = None):
+        with self._lock:
+            if requests_per_minute is not None and requests_per_minute != self._request_bucket.rate:
+                self._request_bucket = TokenBucket(requests_per_minute)
+            if tokens_per_minute is not None and tokens_per_minute != self._token_bucket.rate:
+                self._token_bucket = TokenBucket(tokens_per_minute)
+            if max_retries is not None:
+                self.max_retries = max_retries
+            if base_delay is not None:
+                self.base_delay = base_delay
+            if max_delay is not None:
+                self.max_delay = max_delay
+            if failure_threshold is not None:
+                self._breaker.failure_threshold = failure_threshold
+            if recovery_timeout is not None:
+                self._breaker.recovery_timeout = recovery_timeout
+
+    def try_acquire(self, tokens:int = 1) -> float:
+        """
+        尝试获取一次请求的额度
+        :return: 0 表示可以发送请求, 否则为需要等待的秒数
+        :raises CircuitOpenError: 熔断打开时
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if not self._breaker.allow(now):
+                self._rejected += 1
+                raise CircuitOpenError("上游服务不可用, 熔断中({:.0f}秒后重试)".format(self._breaker.retry_in(now)))
+            wait = self._request_bucket.try_take(1, now)
+            if wait > 0:
+                self._breaker.release_probe()
+                return wait
+            wait = self._token_bucket.try_take(tokens, now)
+            if wait > 0:
+                # 请求额度已扣除, 归还后再等待 token 额度
+                self._request_bucket.give_back(1)
+                self._breaker.release_probe()
+                return wait
+            return 0.0
+
+    def acquire(self, tokens:int = 1, cancel_event:threading.Event = None) -> bool:
+        """阻塞直到获取额度, cancel_event 触发时返回 False"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return True
+            if cancel_event is not None:
+                if cancel_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+    async def acquire_async(self, tokens:int = 1):
+        """异步等待直到获取额度"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_success(self):
+        with self._lock:
+            self._breaker.record_success()
+
+    def record_failure(self, retry_after:float = None, throttled:bool = False):
+        """
+        记录一次失败
+        :param retry_after: 服务端要求的等待秒数, 在此之前暂停所有请求
+        :param throttled: 限流(429)只暂停请求, 不计入熔断
+        """
+        with self._lock:
+            now = time.monotonic()
+            if throttled:
+                self._throttled += 1
+                self._breaker.release_probe()
+            else:
+                self._breaker.record_failure(now)
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + min(retry_after, self.max_delay))
+
+    def release(self):
+        """请求没有得出成功/失败结论（被取消或出现非网络异常）时调用"""
+        with self._lock:
+            self._breaker.release_probe()
+
+    def retry_delay(self, attempt:int, retry_after:float = None) -> float:
+        """第 attempt 次重试前的等待时间: 优先使用 Retry-After, 否则为带完全抖动的指数退避"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def state(self) -> dict:
+        """
+        获取限流状态（用于状态栏和监控）
+
+        Returns:
+            dict: 剩余额度(-1 表示不限制)、熔断状态等
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._breaker.state == CircuitBreaker.OPEN and self._breaker.retry_in(now) <= 0:
+                breaker_state = CircuitBreaker.HALF_OPEN
+            else:
+                breaker_state = self._breaker.state
+            return {
+                'requests_remaining': self._request_bucket.remaining(now),
+                'tokens_remaining': self._token_bucket.remaining(now),
+                'breaker': breaker_state,
+                'breaker_retry_in': self._breaker.retry_in(now),
+                'blocked_for': max(0.0, self._blocked_until - now),
+                'throttled': self._throttled,
+                'rejected': self._rejected,
+            }
+
+
+def call_with_retry(limiter:RateLimiter, attempt, tokens:int = 1, cancel_event:threading.Event = None):
+    """
+    在限流器控制下执行请求, attempt() 执行一次请求, 失败时抛出 RetryableError
+    :raises CircuitOpenError: 熔断打开
+    :raises RetryableError: 重试次数用尽
+    """
+    retry = 0
+    while True:
+        if not limiter.acquire(tokens, cancel_event):
+            return None
+        try:
+            result = attempt()
+        except RetryableError as e:
+            limiter.record_failure(e.retry_after, e.throttled)
+            if retry >= limiter.max_retries or (cancel_event is not None and cancel_event.is_set()):
+                raise
+            delay = limiter.retry_delay(retry, e.retry_after)
+            logging.info(f"请求失败: {e}, {delay:.1f}秒后第{retry + 1}次重试")
+            retry += 1
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    return None
+            else:
+                time.sleep(delay)
+            continue
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.record_success()
+        return result
+
+
+async def call_with_retry_async(limiter:RateLimiter, attempt, tokens:int = 1):
+    """call_with_retry 的异步版本, attempt 为返回协程的函数"""
+    retry = 0
+    while True:
+        await limiter.acquire_async(tokens)
+        try:
+            result = await attempt()
+        except RetryableError as e:
+            limiter.record_failure(e.retry_after, e.throttled)
+            if retry >= limiter.max_retries:
+                raise
+            delay = limiter.retry_delay(retry, e.retry_after)
+            logging.info(f"请求失败: {e}, {delay:.1f}秒后第{retry + 1}次重试")
+            retry += 1
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.record_success()
+        return result
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取进程内共享的限流器"""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter()
+    return _default_limiter
+
+
+def configure_rate_limiter(**kwargs) -> RateLimiter:
+    """根据配置调整共享限流器"""
+    limiter = get_rate_limiter()
+    limiter.configure(**kwargs)
+    return limiter
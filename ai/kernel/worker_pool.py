@@ -0,0 +1,105 @@
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+
+
+class ResizableThreadPool(Executor):
+    """
+    可在运行中调整大小的线程池, 用于执行同步 Kernel 请求
+
+    - resize 扩大时立即补充线程; 缩小时先让空闲线程退出, 执行中的线程完成当前请求后再退出, 不丢弃任何任务
+    - 线程通过条件变量等待任务, 没有轮询
+    - 可直接传给 loop.run_in_executor 使用
+    """
+
+    def __init__(self, max_workers:int = 3, thread_name_prefix:str = "worker"):
+        self.max_workers = max(1, int(max_workers))
+        self.thread_name_prefix = thread_name_prefix
+        self._condition = threading.Condition()
+        self._jobs = deque()  # (future, fn, args, kwargs)
+        self._workers = 0  # 存活的线程数
+        self._idle = 0  # 正在等待任务的线程数
+        self._retiring = 0  # 需要退出的线程数
+        self._shutdown = False
+        self._counter = 0
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("线程池已关闭")
+            self._jobs.append((future, fn, args, kwargs))
+            # 线程按需创建, 空闲线程足够时直接唤醒
+            if self._idle <= len(self._jobs) - 1 and self._workers - self._retiring < self.max_workers:
+                self._spawn()
+            self._condition.notify()
+        return future
+
+    def resize(self, max_workers:int):
+        """调整线程数上限, 立即生效"""
+        with self._condition:
+            self.max_workers = max(1, int(max_workers))
+            excess = self._workers - self._retiring - self.max_workers
+            if excess > 0:
+                # 空闲线程被唤醒后优先退出, 剩余的由完成当前请求的线程退出
+                self._retiring += excess
+                self._condition.notify_all()
+            elif excess < 0:
+                # 取消尚未执行的退出, 再按排队的任务数补充线程
+                self._retiring -= min(self._retiring, -excess)
+                target = min(self.max_workers, len(self._jobs) + self._workers - self._idle)
+                while self._workers - self._retiring < target:
+                    self._spawn()
+                self._condition.notify_all()
+
+    def _spawn(self):
+        self._workers += 1
+        self._counter += 1
+        thread = threading.Thread(target=self._work, daemon=True,
+                                  name="{}_{}".format(self.thread_name_prefix, self._counter))
+        thread.start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._jobs and not self._retiring and not self._shutdown:
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                if self._retiring or (self._shutdown and not self._jobs):
+                    if self._retiring:
+                        self._retiring -= 1
+                    self._workers -= 1
+                    self._condition.notify_all()
+                    return
+                future, fn, args, kwargs = self._jobs.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait:bool = True, *, cancel_futures:bool = False):
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                while self._jobs:
+                    self._jobs.popleft()[0].cancel()
+            self._condition.notify_all()
+        if wait:
+            with self._condition:
+                while self._workers:
+                    self._condition.wait()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'max_workers': self.max_workers,
+                'workers': self._workers,
+                'idle': self._idle,
+                'retiring': self._retiring,
+                'queued': len(self._jobs),
+            }
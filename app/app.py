@@ -1,50 +1,51 @@
 import os
-import threading
+import re
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, scrolledtext
 from config.config import Config
-from ai.kernel.fast_gtp import FastGTP
-from monitor.file import DirectoryWatcher
-import queue
+from app.prompt import check_options_map
+from app.engine import AnalysisEngine
+from app.markdown_render import render_markdown
+from app.source_view import SourceView
+from app.find_engine import FindEngine
 import time
 import logging
-import requests
-
-check_options_map = {
-    1: "功能性缺陷（逻辑错误、边界条件未处理、计算错误）",
-    2: "可靠性缺陷（未处理异常、资源泄露、竞态条件）",
-    3: "安全性缺陷 (SQL 注入、命令注入、硬编码密钥等）",
-    4: "可维护性缺陷（拼写错误、魔法数字、重复代码）",
-    5: "性能缺陷（不必要的循环、未优化的数据结构）"
-}
 
 class App:
-    def __init__(self, root:tk.Tk):
+    def __init__(self, root:tk.Tk, config:Config = None):
         self.root = root
         self.root.title("Code Review AI Assistant")
         self.root.geometry("1000x600")
         # self.root.iconbitmap("background.png")
         # 应用现代主题
         # 加载配置
-        self.config = Config()
-        self.config.load_from_yaml()
-        
-        
-        # 创建FastGTP实例
-        self.fast_gtp = FastGTP(self.config.fast_gtp_config)
-        
-        # 存储文件路径和对应的分析结果
-        self.file_analysis = {}  # {file_path: {"content": str, "status": str, "answer": str}}
-        
-        # 并发控制设置 - 从配置获取最大并发数
-        self.max_concurrent_analysis = self.config.max_concurrent_analysis
-        self.analysis_queue = queue.Queue()  # 待分析任务队列
-        self.active_analysis = {}  # 当前活跃的分析任务 {file_path: threading.Event}
-        self.analysis_workers = []  # 分析工作线程列表
-        self.running = True  # 控制工作线程的运行
-        self.analysis_paused = False  # 新增：控制分析是否暂停
-        
-        # 启动分析工作线程
+        if config is None:
+            config = Config()
+            config.load_from_yaml()
+        self.config = config
+        
+        # 分析流水线(调度、Kernel 请求、结果记录), 界面只订阅其中的状态变化
+        self.engine = AnalysisEngine(self.config)
+        self.file_analysis = self.engine.file_analysis  # 与分析引擎共享的分析记录
+        self.engine.subscribe(self.on_engine_event)
+        
+        self.running = True  # 控制引擎事件的消费
+        self.live_previews = {}  # 分析中打开的结果窗口 {file_path: text_widget}
+        self.preview_finder = None  # 优化建议中的查找结果(FindEngine), 代码的查找结果保存在 source_view 中
+        self.analysis_window = None  # 复用的分析结果窗口
+        self.last_status_update = 0.0  # 上次刷新状态栏的时间
+        self.ui_update_timer = self.engine.metrics.stage("ui_update")
+        self.tree_items = {}  # 文件路径 -> Treeview 项, 避免每次更新都遍历列表
+        # 等待刷新到列表的事件 {file_path: [(kind, data), 是否有新的流式内容]}, 同一文件只保留最后一个状态事件
+        self.pending_updates = {}
+        self.pending_clear = False  # 是否需要先清空列表
+        # 分析结果的Markdown在后台线程中渲染, 结果经队列回到UI线程后缓存到记录中
+        self.render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="markdown")
+        self.rendered_answers = queue.SimpleQueue()  # (file_path, answer_version, RenderedMarkdown)
+        
+        # 启动分析引擎
         self.start_analysis_workers()
         
         # 创建UI
@@ -52,6 +53,12 @@ class App:
         
         self.add_author_info()
 
+        # 隐藏的性能分析菜单: Ctrl+Shift+P
+        self.create_profiling_menu()
+
+        # 恢复上次运行的分析结果和未完成的任务
+        self.engine.restore_journal()
+
         # 启动监控线程
         self.start_monitoring()
     
@@ -124,6 +131,11 @@ class App:
         ttk.Entry(parent, textvariable=self.gpt_model).grid(row=row, column=1, padx=5, pady=5, sticky=tk.EW)
         row += 1
         
+        self.stream_var = tk.BooleanVar(value=self.config.fast_gtp_config.stream)
+        ttk.Checkbutton(parent, text="流式输出(边分析边显示)", variable=self.stream_var).grid(
+            row=row, column=0, columnspan=2, padx=5, pady=5, sticky=tk.W)
+        row += 1
+        
         # 监控路径
         ttk.Label(parent, text="监控路径:").grid(row=row, column=0, padx=5, pady=5, sticky=tk.W)
         self.monitor_path = tk.StringVar(value=self.config.monitor_project_path)
@@ -143,7 +155,7 @@ class App:
         # 并发控制设置 - 修改为从配置获取
         ttk.Label(parent, text="并发分析数:").grid(row=row, column=0, padx=5, pady=5, sticky=tk.W)
         self.max_concurrent = tk.IntVar(value=self.config.max_concurrent_analysis)
-        ttk.Spinbox(parent, from_=1, to=10, textvariable=self.max_concurrent).grid(row=row, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Spinbox(parent, from_=1, to=200, textvariable=self.max_concurrent).grid(row=row, column=1, padx=5, pady=5, sticky=tk.W)
         row += 1
         
         # 新增：检查类型多选框
@@ -223,6 +235,7 @@ class App:
         
         # 添加查看和删除按钮
         ttk.Button(button_frame, text="查看分析", command=self.show_selected_analysis).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="立即review", command=self.review_selected_now).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="删除记录", command=self.delete_selected_record).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="清除所有", command=self.clear_all_records).pack(side=tk.LEFT, padx=5)
         self.toggle_button = ttk.Button(button_frame, text="暂停分析", command=self.toggle_analysis)
@@ -247,6 +260,7 @@ class App:
         self.config.fast_gtp_config.secret_key = self.secret_key.get()
         self.config.fast_gtp_config.url = self.api_url.get()
         self.config.fast_gtp_config.gtp_model = self.gpt_model.get()
+        self.config.fast_gtp_config.stream = self.stream_var.get()
         self.config.monitor_project_path = self.monitor_path.get()
         self.config.max_concurrent_analysis = self.max_concurrent.get()  # 保存并发数配置
         self.config.ignore_gitignore = self.ignore_gitignore.get()  # 保存.gitignore配置
@@ -263,322 +277,192 @@ class App:
         self.config.save_to_yaml()
         messagebox.showinfo("保存成功", "配置已保存到config.yaml")
         
-        # 重启工作线程以应用新的并发数
+        # 应用新的并发数
         self.restart_workers()
     
     def restart_workers(self):
-        """重启工作线程以应用新的并发数"""
-        # 停止当前工作线程
-        self.running = False
-        for _ in range(len(self.analysis_workers)):
-            self.analysis_queue.put(None)  # 发送停止信号
-        
-        # 等待工作线程结束
-        for worker in self.analysis_workers:
-            if worker.is_alive():
-                worker.join(timeout=1)
-        
-        # 重置状态
-        self.running = True
-        self.analysis_workers = []
-        self.active_analysis = {}
-        self.analysis_paused = False
-        
-        # 更新最大并发数
-        self.max_concurrent_analysis = self.config.max_concurrent_analysis
-        logging.info(f"重启工作线程，新的最大并发数: {self.max_concurrent_analysis}")
-        # 启动新的工作线程
-        self.start_analysis_workers()
+        """应用新的并发数, 调度器直接调整并发上限, 不会中断进行中的任务"""
+        self.engine.apply_config()
+        self.update_status()
     
     def start_analysis_workers(self):
-        """启动分析工作线程"""
-        for i in range(self.max_concurrent_analysis):
-            worker = threading.Thread(
-                target=self.analysis_worker,
-                daemon=True
-            )
-            worker.start()
-            self.analysis_workers.append(worker)
-    
-    def analysis_worker(self):
-        """分析工作线程函数"""
-        while self.running:
-            try:
-                # 从队列获取任务
-                file_path = self.analysis_queue.get(timeout=1)
-                if file_path is None:  # 停止信号
-                    break
-                
-                # 检查记录是否已被删除
-                if file_path not in self.file_analysis:
-                    self.analysis_queue.task_done()
-                    continue
-                
-                # 创建停止事件
-                stop_event = threading.Event()
-                self.active_analysis[file_path] = stop_event
-                self.update_status()
-                
-                try:
-                    # 等待直到分析恢复
-                    while self.analysis_paused and self.running:
-                        time.sleep(0.1)
-                    # 更新状态为分析中
-                    self.root.after(0, self.update_analysis_status, file_path, "分析中")
-                    
-                    # 如果分析被中断，直接跳过
-                    if stop_event.is_set() or not self.running:
-                        continue
-                    
-                    # 获取文件内容
-                    content = self.file_analysis[file_path]["content"]
-                    
-                    focus = ""
-                    if self.config.check_type_list:
-                        num = 1
-                        for ct in self.config.check_type_list:
-                            if ct in check_options_map:
-                                focus += "{}. {}\n".format(num, check_options_map[ct])
-                                num += 1
-                    else:
-                        num = 1
-                        for ct in check_options_map:
-                            focus += "{}. {}\n".format(num, check_options_map[ct])
-                            num += 1
-
-                    """
-                        1. 功能性缺陷（逻辑错误、边界条件未处理、计算错误）  
-                        2. 可靠性缺陷（未处理异常、资源泄露、竞态条件）  
-                        3. 安全性缺陷 (SQL 注入、命令注入、硬编码密钥等）  
-                        4. 可维护性缺陷（拼写错误、魔法数字、重复代码）  
-                        5. 性能缺陷（不必要的循环、未优化的数据结构）
-                    """
-                    # 调用FastGTP分析内容（带中断检查）
-                    question = """
-                    请帮我review这段代码, 找出的明显代码缺陷(不用跨文件分析,只对当前代码进行分析)
-                    重点:
-                        {}
-                    要求:
-                        - 仅分析当前代码，不考虑调用外部函数会产生的问题  
-                        - 只针对真实且有显著影响的问题 
-                        - 允许回答“没有明显问题”
-                        - 不要编造或过度推测潜在风险
-                        - 不要对函数的参数过渡判断, 尤其是项目内部的函数的出入参
-                        - 不要对函数的返参(除err以外)未处理参数为nil的情况进行判断
-                        - 不要考虑数字类型溢出的问题
-                        - 代码内常量的使用如在文件内没提供可能是在同目录下的其他文件内，不要过渡推测
-
-                    并严格按照下面的格式回答我：
-                    代码中存在X个明显的安全问题:
-                    然后按照顺序列出每个问题描述以及优化方案, 使用markdown格式。
-                    代码如下:
-                    ```
-                    {}
-                    ```
-                    """.format(focus,content)          
-                    # 使用带中断检查的分析方法
-                    answer = self.safe_analyze_content(question, stop_event)
-                    
-                    # 如果分析被中断，直接跳过
-                    if stop_event.is_set():
-                        continue
-                    
-                    problem_count = -1
-                    # 更新分析结果
-                    if file_path in self.file_analysis:  # 确保记录仍然存在
-                        self.file_analysis[file_path]["answer"] = answer
-                        self.file_analysis[file_path]["status"] = "分析完成"
-                        # 解析答案中的问题数量
-                        if "代码中存在" in answer:
-                            try:
-                                problem_count = int(answer.split("代码中存在")[1].split("个明显的")[0].strip())
-                                if problem_count > 0:
-                                    send_report(self.config.name, file_path, problem_count)
-                            except ValueError:
-                                pass
-                    # 更新UI状态
-                    self.root.after(0, self.update_analysis_status, file_path, "分析完成", problem_count)
-                except Exception as e:
-                    if file_path in self.file_analysis and not stop_event.is_set():
-                        error_msg = f"分析失败: {str(e)}"
-                        self.file_analysis[file_path]["answer"] = error_msg
-                        self.file_analysis[file_path]["status"] = "分析失败"
-                        self.root.after(0, self.update_analysis_status, file_path, "分析失败")
-                finally:
-                    # 清理活跃任务
-                    if file_path in self.active_analysis:
-                        del self.active_analysis[file_path]
-                    
-                    # 更新状态
-                    self.update_status()
-                    
-                    # 标记任务完成
-                    self.analysis_queue.task_done()
-            except queue.Empty:
-                # 队列为空时继续等待
-                continue
+        """启动分析引擎, 并开始在UI线程中消费引擎事件"""
+        self.engine.start()
+        self.root.after(50, self.process_scheduler_events)
+    
+    def process_scheduler_events(self):
+        """在UI线程中批量处理文件变更和调度器事件, 引擎通过 on_engine_event 通知界面"""
+        now = time.time()
+        handled = self.engine.process_events()
+        self.flush_ui_updates()
+        self.collect_rendered_answers()
+        # 有事件时立即刷新状态栏, 否则每秒刷新一次(限流/熔断状态会随时间变化)
+        if handled or now - self.last_status_update >= 1:
+            self.last_status_update = now
+            self.update_status()
+        if self.running:
+            self.root.after(50, self.process_scheduler_events)
+    
+    def on_engine_event(self, kind, file_path, data):
+        """
+        分析引擎的观察者回调（在UI线程中执行）
+        只记录事件, 由 flush_ui_updates 每 50ms 批量刷新一次, 同一文件的多次状态变化只刷新最后一次,
+        流式内容单独标记, 不会覆盖同一帧内的状态变化(否则新文件可能直到分析完成才出现在列表中)
+        """
+        if kind == "cleared":
+            self.pending_updates.clear()
+            self.pending_clear = True
+            return
+        pending = self.pending_updates.setdefault(file_path, [None, False])
+        if kind == "partial":
+            pending[1] = True
+        else:
+            pending[0] = (kind, data)
+            if kind == "removed":
+                pending[1] = False
+    
+    def flush_ui_updates(self):
+        """把积累的引擎事件一次性应用到列表和已打开的结果窗口"""
+        if not self.pending_updates and not self.pending_clear:
+            return
+        start = time.perf_counter()
+        updates, self.pending_updates = self.pending_updates, {}
+        try:
+            if self.pending_clear:
+                self.pending_clear = False
+                self.tree.delete(*self.tree.get_children())
+                self.tree_items.clear()
+            for file_path, (event, partial) in updates.items():
+                if event is not None:
+                    self.render_engine_event(event[0], file_path, event[1])
+                if partial:
+                    self.refresh_partial_answer(file_path)
+        finally:
+            self.ui_update_timer.observe(time.perf_counter() - start)
+    
+    def render_engine_event(self, kind, file_path, data):
+        if kind in ("status", "restored"):
+            status, problem_count = data
+            self.update_analysis_status(file_path, status, problem_count)
+        elif kind == "removed":
+            item = self.tree_items.pop(file_path, None)
+            if item:
+                self.tree.delete(item)
     
-    def safe_analyze_content(self, question, stop_event):
-        """带中断检查的分析方法"""
-        # 在实际应用中，这里应该调用可中断的API
-        # 为简化实现，我们使用普通调用
-        # 在真实环境中，可以使用异步请求并定期检查stop_event
-        if stop_event.is_set():
-            return "分析已取消"
+    def refresh_partial_answer(self, file_path):
+        """流式分析过程中刷新列表状态和已打开的结果窗口"""
+        record = self.file_analysis.get(file_path)
+        if record is None or record.status != "分析中" or not record.partial_answer:
+            return
         
-        # 实际调用分析API
-        return self.fast_gtp.answer(question)
+        partial = record.partial_answer
+        item = self.tree_items.get(file_path)
+        if item:
+            if record.ttft is not None:
+                display_text = "分析中({}字, 首字{:.1f}s)...❗".format(len(partial), record.ttft)
+            else:
+                display_text = "分析中({}字)...❗".format(len(partial))
+            self.tree.item(item, values=(file_path, display_text), tags=('new',))
+        
+        text_preview = self.live_previews.get(file_path)
+        if text_preview is not None:
+            self.render_preview(text_preview, partial)
+    
+    def render_preview(self, text_widget, content, record=None):
+        """重新渲染结果窗口中的Markdown内容"""
+        try:
+            self.show_markdown(text_widget, self.get_rendered(content, record))
+            text_widget.config(state=tk.DISABLED)
+            text_widget.see(tk.END)
+        except tk.TclError:
+            # 窗口已关闭
+            pass
     
     def update_status(self):
         """更新状态栏信息"""
-        active_count = len(self.active_analysis)
-        queue_size = self.analysis_queue.qsize()
-        status_text = "暂停" if self.analysis_paused else "运行中"
-        status = f"状态: {status_text} | 活跃任务: {active_count} | 队列: {queue_size}"
-        self.root.after(0, lambda: self.status_var.set(status))
+        self.status_var.set(self.engine.status_text())
     
     def toggle_analysis(self):
         """切换分析状态（运行/暂停）"""
-        self.analysis_paused = not self.analysis_paused
-        if self.analysis_paused:
-            self.toggle_button.config(text="继续分析")
-        else:
+        if self.engine.paused:
+            self.engine.resume()
             self.toggle_button.config(text="暂停分析")
+        else:
+            self.engine.pause()
+            self.toggle_button.config(text="继续分析")
         self.update_status()
     
     def start_monitoring(self):
-        # 确保监控路径有效
-        path = self.config.monitor_project_path
-        if not path or not os.path.isdir(path):
-            logging.info(f"无效的监控路径: {path}")
-            return
-        
-        # 处理文件类型配置
-        file_types = self.config.file_types if self.config.file_types else None
-        
-        # 启动监控线程
-        self.monitor_thread = threading.Thread(
-            target=self.run_monitor, 
-            args=(path, file_types),
-            daemon=True
-        )
-        self.monitor_thread.start()
-    
-    def run_monitor(self, path, file_types):
-        self.watcher = DirectoryWatcher(
-            config=self.config,
-            path=path,
-            callback=self.file_modified_callback,
-            recursive=True,
-            file_types=file_types
-        )
-        self.watcher.start()
+        self.engine.start_monitoring()
     
     def restart_monitoring(self):
         # 先停止现有监控
-        if hasattr(self, 'watcher'):
-            self.watcher.stop()
+        self.engine.stop_monitoring()
         
         # 更新配置
         self.config.monitor_project_path = self.monitor_path.get()
         self.config.save_to_yaml()
         
         # 重新启动监控
-        self.start_monitoring()
+        self.engine.start_monitoring()
         messagebox.showinfo("重启成功", "文件监控已重启")
     
-    def file_modified_callback(self, file_path, content):
-        # 在UI线程中更新文件列表
-        self.root.after(0, self.update_file_list, file_path, content)
-    
-    def update_file_list(self, file_path, content):
-        # 检查是否已有该文件记录
-        if file_path in self.file_analysis:
-            # 如果文件正在分析中或等待分析中，忽略新事件
-            if (file_path in self.active_analysis or 
-                self.file_analysis[file_path]["status"] in ["等待分析", "分析中"]):
-                logging.info(f"文件 {file_path} 正在处理中，忽略新事件")
-                return
-            
-            # 更新现有记录
-            self.file_analysis[file_path]["content"] = content
-            self.file_analysis[file_path]["status"] = "新变更"
-            
-            # 更新Treeview
-            for item in self.tree.get_children():
-                if self.tree.item(item, "values")[0] == file_path:
-                    self.tree.item(item, values=(file_path, "● 新变更"))
-                    break
-            
-            # 将任务添加到分析队列
-            self.analysis_queue.put(file_path)
-            self.update_status()
-            
-            # 更新状态为等待分析
-            self.update_analysis_status(file_path, "等待分析")
-        else:
-            # 创建新记录
-            self.file_analysis[file_path] = {
-                "content": content,
-                "status": "新变更",
-                "answer": None
-            }
-            
-            # 添加到Treeview，使用 'urgent' 标签
-            item_id = self.tree.insert("", "end", values=(file_path, "● 新变更"), tags=('urgent',))
-            
-            # 将任务添加到分析队列
-            self.analysis_queue.put(file_path)
-            self.update_status()
-            
-            # 更新状态为等待分析
-            self.update_analysis_status(file_path, "等待分析")
-    
     def update_analysis_status(self, file_path, status, problem_count=-1):
-        """更新文件分析状态"""
+        """更新文件在列表中的状态显示"""
         # 如果文件记录已经被删除，则不更新
         if file_path not in self.file_analysis:
             return
-
-        self.file_analysis[file_path]["status"] = status
-        
-        # 更新Treeview状态
-        for item in self.tree.get_children():
-            if self.tree.item(item, "values")[0] == file_path:
-                display_text = status
-                tags = ()
-                
-                if status == "新变更":
-                    display_text = "● 新变更"
-                    tags = ('new',)  # 红色感叹号 + 红色背景
-                elif status == "等待分析":
-                    display_text = "等待中...❗"  # 添加红色感叹号
-                    tags = ('new',)
-                elif status == "分析中":
-                    display_text = "分析中...❗"  # 添加红色感叹号
-                    tags = ('new',)
-                elif status == "分析完成":
-                    if problem_count > 0:
-                        display_text = f"分析完成, 发现{problem_count}个潜在安全问题❗"
-                        tags = ('urgent',)
-                    elif problem_count == 0:
-                        display_text = "分析完成, 代码很健全✅"
-                        tags = ('completed',)  # 绿色背景表示已完成
-                    else:
-                        display_text = "分析完成❗"  # 添加红色感叹号
-                        tags = ('urgent',)
-                elif status == "分析失败":
-                    display_text = "分析失败❗"  # 添加红色感叹号
-                    tags = ('urgent',)
-                elif status == "已查看":
-                    display_text = "已查看"
-                    tags = ('completed',)  # 绿色背景表示已完成
-                
-                # 更新Treeview项
-                self.tree.item(item, values=(file_path, display_text), tags=tags)
-                break
         
-        self.update_status()
+        display_text = status
+        tags = ()
+        
+        if status == "新变更":
+            display_text = "● 新变更"
+            tags = ('urgent',)  # 新文件使用红色背景
+        elif status == "等待分析":
+            display_text = "等待中...❗"  # 添加红色感叹号
+            tags = ('new',)
+        elif status == "分析中":
+            display_text = "分析中...❗"  # 添加红色感叹号
+            tags = ('new',)
+        elif status == "分析完成":
+            if problem_count > 0:
+                display_text = f"分析完成, 发现{problem_count}个潜在安全问题❗"
+                tags = ('urgent',)
+            elif problem_count == 0:
+                display_text = "分析完成, 代码很健全✅"
+                tags = ('completed',)  # 绿色背景表示已完成
+            else:
+                display_text = "分析完成❗"  # 添加红色感叹号
+                tags = ('urgent',)
+        elif status == "分析失败":
+            display_text = "分析失败❗"  # 添加红色感叹号
+            tags = ('urgent',)
+        elif status == "已查看":
+            display_text = "已查看"
+            tags = ('completed',)  # 绿色背景表示已完成
+        
+        # 更新Treeview项, 新文件添加到列表末尾
+        item = self.tree_items.get(file_path)
+        if item is None:
+            self.tree_items[file_path] = self.tree.insert("", "end", values=(file_path, display_text), tags=tags)
+        else:
+            self.tree.item(item, values=(file_path, display_text), tags=tags)
+        
+        if status in ("分析完成", "分析失败"):
+            # 分析结束后用最终结果刷新已打开的流式结果窗口, 其余的在后台预先渲染
+            if file_path in self.live_previews:
+                record = self.file_analysis[file_path]
+                self.render_preview(self.live_previews.pop(file_path), record.answer or "", record)
+            else:
+                self.prerender_answer(file_path)
+    
+    def review_selected_now(self):
+        """把选中的文件排到队列最前面, 已分析完成的文件重新review"""
+        selected = self.tree.selection()
+        if not selected:
+            return
+        self.engine.review_now(self.tree.item(selected[0], "values")[0])
     
     def show_selected_analysis(self):
         """显示选中记录的分析结果"""
@@ -596,22 +480,48 @@ class App:
         item = selected[0]
         file_path = self.tree.item(item, "values")[0]
         
-        # 检查是否有分析结果
-        if file_path not in self.file_analysis or not self.file_analysis[file_path]["answer"]:
+        # 检查是否有分析结果, 流式分析中可以查看已收到的部分结果
+        record = self.file_analysis.get(file_path)
+        streaming = record is not None and record.status == "分析中" and bool(record.partial_answer)
+        analysis = record.partial_answer if streaming else (record.answer if record is not None else None)
+        if not analysis:
             messagebox.showinfo("提示", "该文件尚未完成分析")
             return
         
-        # 读取文件内容
-        with open(file_path, 'r', encoding='utf-8') as f:
-            file_content = f.read()
-
-        # 从字典获取分析结果
-        analysis = self.file_analysis[file_path]["answer"]
+        # 所有结果共用一个窗口, 源码按需从内存映射中加载
+        window = self.get_analysis_window()
+        try:
+            self.source_view.load(file_path)
+            self.preview_finder = None
+            self.find_status.set("")
+        except OSError as e:
+            messagebox.showerror("错误", f"无法打开文件: {e}")
+            return
+        window.title(f"分析结果 - {os.path.basename(file_path)}")
+        window.deiconify()
+        window.lift()
+        
+        # 应用Markdown样式, 已完成的结果使用缓存的渲染结果
+        self.show_markdown(self.text_preview, self.get_rendered(analysis, None if streaming else record))
+        self.text_preview.config(state=tk.DISABLED)
+        
+        # 流式分析中: 登记窗口以便持续刷新, 分析完成前不标记为已查看
+        self.live_previews.clear()
+        if streaming:
+            self.live_previews[file_path] = self.text_preview
+            return
         
-        # 创建弹出窗口
+        # 更新状态为已查看, 列表项改为已完成样式
+        self.engine.set_status(file_path, "已查看")
+    
+    def get_analysis_window(self):
+        """获取分析结果窗口, 第一次使用时创建, 关闭时只隐藏以便复用"""
+        if self.analysis_window is not None:
+            return self.analysis_window
         popup = tk.Toplevel(self.root)
-        popup.title(f"分析结果 - {os.path.basename(file_path)}")
         popup.geometry("800x500")
+        popup.protocol("WM_DELETE_WINDOW", self.hide_analysis_window)
+        self.analysis_window = popup
         
          # 添加作者信息到弹出窗口
         self.add_popup_author_info(popup)
@@ -620,6 +530,9 @@ class App:
         main_frame = ttk.Frame(popup)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # 查找栏: 在代码或优化建议中查找, 高亮所有匹配
+        self.create_find_bar(main_frame)
+        
         # 创建分栏
         paned = ttk.PanedWindow(main_frame, orient=tk.HORIZONTAL)
         paned.pack(fill=tk.BOTH, expand=True)
@@ -628,219 +541,173 @@ class App:
         left_frame = ttk.Frame(paned)
         paned.add(left_frame, weight=1)
 
-        # 添加查找功能框架
-        search_frame = ttk.Frame(left_frame)
-        search_frame.pack(fill=tk.X, pady=5)
-        
-        ttk.Label(search_frame, text="查找:").pack(side=tk.LEFT)
-        search_entry = ttk.Entry(search_frame)
-        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        search_entry.bind("<Return>", lambda e: self.find_in_text(text_source, search_entry.get()))
-        
-        ttk.Button(search_frame, text="查找", 
-                command=lambda: self.find_in_text(text_source, search_entry.get())).pack(side=tk.LEFT)
-        
         ttk.Label(left_frame, text="代码").pack(pady=5)
-        text_source = scrolledtext.ScrolledText(left_frame, wrap=tk.WORD)
-        text_source.pack(fill=tk.BOTH, expand=True)
-        text_source.insert(tk.END, file_content)
-        text_source.config(state=tk.DISABLED)
+        self.source_view = SourceView(left_frame)
+        self.source_view.pack(fill=tk.BOTH, expand=True)
         
-        text_source.bind("<Control-f>", lambda e: search_entry.focus())
+        self.source_view.text.bind("<Control-f>", lambda e: self.find_entry.focus())
 
         # 右侧Markdown预览区域
         right_frame = ttk.Frame(paned)
         paned.add(right_frame, weight=1)
         
         ttk.Label(right_frame, text="优化建议").pack(pady=5)
-        text_preview = scrolledtext.ScrolledText(
+        self.text_preview = scrolledtext.ScrolledText(
             right_frame,
             wrap=tk.WORD,
             font=("Arial", 10),
             padx=10,
             pady=10
         )
-        text_preview.pack(fill=tk.BOTH, expand=True)
-        
-        # 应用Markdown样式
-        self.apply_markdown_styles(text_preview, analysis)
-        text_preview.config(state=tk.DISABLED)
+        self.text_preview.pack(fill=tk.BOTH, expand=True)
+        self.configure_markdown_tags(self.text_preview)
+        self.text_preview.tag_config("found", background="yellow")
+        self.text_preview.tag_config("found_current", background="orange")
+        self.text_preview.bind("<Control-f>", lambda e: self.find_entry.focus())
         
         # 添加关闭按钮
-        ttk.Button(main_frame, text="关闭", command=popup.destroy).pack(pady=10)
-        
-        # 更新状态为已查看
-        self.file_analysis[file_path]["status"] = "已查看"
-        
-        # 更新Treeview项为已完成样式
-        for item in self.tree.get_children():
-            if self.tree.item(item, "values")[0] == file_path:
-                # 移除红色感叹号
-                self.tree.item(item, values=(file_path, "已查看"), tags=('completed',))
-                break
+        ttk.Button(main_frame, text="关闭", command=self.hide_analysis_window).pack(pady=10)
+        return popup
+    
+    def hide_analysis_window(self):
+        """隐藏结果窗口并释放文件映射"""
+        self.live_previews.clear()
+        self.source_view.close_document()
+        self.analysis_window.withdraw()
 
-    def find_in_text(self, text_widget, search_str):
-        """在文本组件中查找字符串"""
-        if not search_str:
-            return
+    def create_find_bar(self, parent):
+        """查找栏: 字面量/正则、区分大小写、全词匹配, 显示匹配总数, 回车/Shift+回车 查找下一个/上一个"""
+        find_frame = ttk.Frame(parent)
+        find_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(find_frame, text="查找:").pack(side=tk.LEFT)
+        self.find_entry = ttk.Entry(find_frame)
+        self.find_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.find_entry.bind("<Return>", lambda e: self.find_step(True))
+        self.find_entry.bind("<Shift-Return>", lambda e: self.find_step(False))
+        
+        self.find_scope = tk.StringVar(value="代码")
+        ttk.Combobox(find_frame, textvariable=self.find_scope, values=("代码", "优化建议"),
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=2)
+        self.find_regex = tk.BooleanVar(value=False)
+        self.find_case = tk.BooleanVar(value=False)
+        self.find_word = tk.BooleanVar(value=False)
+        ttk.Checkbutton(find_frame, text="正则", variable=self.find_regex).pack(side=tk.LEFT)
+        ttk.Checkbutton(find_frame, text="区分大小写", variable=self.find_case).pack(side=tk.LEFT)
+        ttk.Checkbutton(find_frame, text="全词", variable=self.find_word).pack(side=tk.LEFT)
+        ttk.Button(find_frame, text="上一个", command=lambda: self.find_step(False)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(find_frame, text="下一个", command=lambda: self.find_step(True)).pack(side=tk.LEFT, padx=2)
+        self.find_status = tk.StringVar(value="")
+        ttk.Label(find_frame, textvariable=self.find_status, width=12).pack(side=tk.LEFT, padx=5)
+    
+    def find_step(self, forward=True):
+        """查找条件变化时重新查找所有匹配并高亮, 否则移动到下一个/上一个匹配"""
+        query = (self.find_entry.get(), self.find_regex.get(), self.find_case.get(), self.find_word.get())
+        in_source = self.find_scope.get() == "代码"
+        if in_source:
+            document = self.source_view.document
+            if document is None:
+                return
+            finder = self.source_view.finder
+            if finder is None or finder.data is not document.data:
+                finder = FindEngine(document.data, document.line_starts)
+            start_offset = document.line_starts[self.source_view.top_line()]
+        else:
+            content = self.text_preview.get("1.0", "end-1c")
+            finder = self.preview_finder
+            if finder is None or finder.data != content:
+                finder = self.preview_finder = FindEngine(content)
+            start_offset = 0
         
-        # 取消之前的高亮
-        text_widget.tag_remove("found", "1.0", tk.END)
+        if finder.query != query:
+            try:
+                finder.search(*query)
+            except re.error as e:
+                self.find_status.set("正则错误")
+                logging.info(f"无效的正则表达式: {e}")
+                return
+            match = finder.seek(start_offset) if forward else finder.prev()
+        else:
+            match = finder.next() if forward else finder.prev()
         
-        # 如果为空字符串，直接返回
-        if not search_str.strip():
+        if in_source:
+            self.source_view.set_finder(finder)
+            if match is not None:
+                self.source_view.show_match(match[0])
+        else:
+            self.highlight_preview_matches(finder)
+        self.find_status.set(finder.status_text())
+    
+    def highlight_preview_matches(self, finder):
+        """优化建议中的所有匹配一次 tag_add, 并滚动到当前匹配"""
+        self.text_preview.tag_remove("found", "1.0", tk.END)
+        self.text_preview.tag_remove("found_current", "1.0", tk.END)
+        if not finder.count:
             return
         
-        # 从当前光标位置开始搜索
-        start_pos = text_widget.index(tk.INSERT)
-        idx = text_widget.search(search_str, start_pos, stopindex=tk.END)
-        
-        # 如果没找到，从头开始搜索
-        if not idx:
-            idx = text_widget.search(search_str, "1.0", stopindex=tk.END)
-        
-        # 如果找到，高亮显示并滚动到该位置
-        if idx:
-            end_pos = f"{idx}+{len(search_str)}c"
-            text_widget.tag_add("found", idx, end_pos)
-            text_widget.tag_config("found", background="yellow")
-            text_widget.see(idx)
-            text_widget.mark_set(tk.INSERT, end_pos)
-            text_widget.focus()
-        
-    def apply_markdown_styles(self, text_widget, content):
-        """应用Markdown样式到文本组件"""
+        def text_index(offset):
+            line, column = finder.position(offset)
+            return "{}.{}".format(line + 1, column)
+        
+        indices = []
+        for start, end in zip(finder.starts, finder.ends):
+            indices.append(text_index(start))
+            indices.append(text_index(end))
+        self.text_preview.tag_add("found", *indices)
+        if finder.current >= 0:
+            start, end = finder.match(finder.current)
+            self.text_preview.tag_add("found_current", text_index(start), text_index(end))
+            self.text_preview.see(text_index(start))
+    
+    def configure_markdown_tags(self, text_widget):
+        """配置Markdown样式标签, 每个文本组件只需配置一次"""
+        for level in range(1, 6):
+            text_widget.tag_config(f"h{level}", font=("Arial", 24 - (level * 2), "bold"))
+        text_widget.tag_config("bold", font=("Arial", 10, "bold"))
+        text_widget.tag_config("italic", font=("Arial", 10, "italic"))
+        text_widget.tag_config("code", font=("Courier New", 10), background="#f0f0f0")
+        text_widget.tag_config("list", lmargin1=20, lmargin2=30)
+        text_widget.tag_config("blockquote", background="#f9f9f9", lmargin1=20, lmargin2=20)
+    
+    def get_rendered(self, content, record=None):
+        """获取Markdown渲染结果, 传入记录时优先使用并缓存到记录中"""
+        if record is None:
+            return render_markdown(content)
+        rendered = record.rendered()
+        if rendered is None:
+            rendered = render_markdown(content)
+            record.set_rendered(record.answer_version, rendered)
+        return rendered
+    
+    def show_markdown(self, text_widget, rendered):
+        """一次插入渲染后的文本, 每个样式标签一次 tag_add"""
         text_widget.config(state=tk.NORMAL)
         text_widget.delete(1.0, tk.END)
-        
-        # 添加内容并应用样式
-        text_widget.insert(tk.END, content)
-        
-        # 标题样式
-        for level in range(1, 6):
-            start = 1.0
-            while True:
-                # 查找标题
-                start = text_widget.search(f"{'#' * level} ", start, stopindex=tk.END)
-                if not start:
-                    break
-                    
-                end = text_widget.search("\n", start, stopindex=tk.END) or tk.END
-                if not end:
-                    break
-                    
-                # 应用样式
-                size = 24 - (level * 2)
-                text_widget.tag_add(f"h{level}", start, f"{end}-1c")
-                text_widget.tag_config(f"h{level}", font=("Arial", size, "bold"))
-                
-                start = end
-        
-        # 加粗文本
-        start = 1.0
-        while True:
-            start = text_widget.search("**", start, stopindex=tk.END)
-            if not start:
-                break
-                
-            end = text_widget.search("**", f"{start}+2c", stopindex=tk.END)
-            if not end:
-                break
-                
-            # 应用样式
-            text_widget.tag_add("bold", f"{start}+2c", end)
-            text_widget.tag_config("bold", font=("Arial", 10, "bold"))
-            
-            # 删除标记符号
-            text_widget.delete(end, f"{end}+2c")
-            text_widget.delete(start, f"{start}+2c")
-            
-            start = end
-        
-        # 斜体文本
-        start = 1.0
-        while True:
-            start = text_widget.search("*", start, stopindex=tk.END)
-            if not start:
-                break
-                
-            end = text_widget.search("*", f"{start}+1c", stopindex=tk.END)
-            if not end:
-                break
-                
-            # 应用样式
-            text_widget.tag_add("italic", f"{start}+1c", end)
-            text_widget.tag_config("italic", font=("Arial", 10, "italic"))
-            
-            # 删除标记符号
-            text_widget.delete(end, f"{end}+1c")
-            text_widget.delete(start, f"{start}+1c")
-            
-            start = end
-        
-        # 代码块
-        start = 1.0
-        while True:
-            start = text_widget.search("```", start, stopindex=tk.END)
-            if not start:
-                break
-                
-            end = text_widget.search("```", f"{start}+3c", stopindex=tk.END)
-            if not end:
-                break
-                
-            # 应用样式
-            text_widget.tag_add("code", f"{start}+3c", end)
-            text_widget.tag_config("code", 
-                                font=("Courier New", 10),
-                                background="#f0f0f0",
-                                relief="solid",
-                                borderwidth=1)
-            
-            # 删除标记符号
-            text_widget.delete(end, f"{end}+3c")
-            text_widget.delete(start, f"{start}+3c")
-            
-            start = end
-        
-        # 列表项
-        start = 1.0
-        while True:
-            start = text_widget.search("- ", start, stopindex=tk.END)
-            if not start:
-                break
-                
-            end = text_widget.search("\n", start, stopindex=tk.END) or tk.END
-            
-            # 应用样式
-            text_widget.tag_add("list", start, end)
-            text_widget.tag_config("list", lmargin1=20, lmargin2=30)
-            
-            start = end
-        
-        # 引用
-        start = 1.0
+        text_widget.insert(tk.END, rendered.text)
+        for tag, indices in rendered.spans.items():
+            text_widget.tag_add(tag, *indices)
+    
+    def prerender_answer(self, file_path):
+        """分析完成后在后台线程中渲染结果, 打开结果窗口时直接使用"""
+        record = self.file_analysis.get(file_path)
+        if record is None or record.rendered() is not None:
+            return
+        answer, version = record.answer, record.answer_version
+        if not answer:
+            return
+        self.render_executor.submit(
+            lambda: self.rendered_answers.put((file_path, version, render_markdown(answer))))
+    
+    def collect_rendered_answers(self):
+        """把后台渲染完成的结果保存到记录中（在UI线程中执行）"""
         while True:
-            start = text_widget.search("> ", start, stopindex=tk.END)
-            if not start:
+            try:
+                file_path, version, rendered = self.rendered_answers.get_nowait()
+            except queue.Empty:
                 break
-                
-            end = text_widget.search("\n", start, stopindex=tk.END) or tk.END
-            
-            # 应用样式
-            text_widget.tag_add("blockquote", start, end)
-            text_widget.tag_config("blockquote", 
-                                background="#f9f9f9",
-                                lmargin1=20,
-                                borderwidth=1,
-                                relief="solid",
-                                # padding=5,
-                                )
-            
-            # 删除标记符号
-            text_widget.delete(start, f"{start}+2c")
-            
-            start = end
+            record = self.file_analysis.get(file_path)
+            if record is not None:
+                record.set_rendered(version, rendered)
 
     def delete_selected_record(self):
         """删除选中的记录"""
@@ -856,16 +723,8 @@ class App:
             time.sleep(0.2)  # 短暂延迟，让用户看到删除效果
             file_path = self.tree.item(item, "values")[0]
             
-            # 如果文件正在分析中，发送停止信号
-            if file_path in self.active_analysis:
-                self.active_analysis[file_path].set()
-            
-            # 从数据结构中删除
-            if file_path in self.file_analysis:
-                del self.file_analysis[file_path]
-            
-            # 从Treeview删除
-            self.tree.delete(item)
+            # 取消分析任务并删除记录, 列表项在引擎通知后移除
+            self.engine.remove(file_path)
         
         self.update_status()
     
@@ -874,10 +733,6 @@ class App:
         if not messagebox.askyesno("确认", "确定要清除所有记录吗？"):
             return
             
-        # 停止所有活跃的分析任务
-        for stop_event in self.active_analysis.values():
-            stop_event.set()
-        
         # 添加清除动画效果
         for item in self.tree.get_children():
             self.tree.item(item, tags=('urgent',))
@@ -885,63 +740,46 @@ class App:
         
         self.root.update()
         time.sleep(0.3)  # 短暂延迟，让用户看到清除效果
-        # 清空数据结构
-        self.file_analysis.clear()
-        
-        # 清空Treeview
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # 停止所有分析任务并清空记录, 列表在引擎通知后清空
+        self.engine.clear()
         
         self.update_status()
     
+    def create_profiling_menu(self):
+        """性能分析菜单, 不显示在界面上, 按 Ctrl+Shift+P 弹出"""
+        self.profiling_menu = tk.Menu(self.root, tearoff=0)
+        self.profiling_menu.add_command(label="开始性能分析", command=self.toggle_profiling)
+        self.profiling_menu.add_command(label="内存快照", command=self.take_memory_snapshot)
+        self.root.bind_all("<Control-Shift-P>", self.show_profiling_menu)
+
+    def show_profiling_menu(self, event=None):
+        running = self.engine.profiler is not None and self.engine.profiler.running
+        self.profiling_menu.entryconfigure(0, label="停止性能分析" if running else "开始性能分析")
+        self.profiling_menu.tk_popup(self.root.winfo_pointerx(), self.root.winfo_pointery())
+
+    def toggle_profiling(self):
+        """开始/停止 cProfile 和调用栈采样, 停止时写入结果文件"""
+        if self.engine.profiler is not None and self.engine.profiler.running:
+            paths = self.engine.stop_profiling()
+            messagebox.showinfo("性能分析", "结果已写入:\n" + "\n".join(paths))
+        else:
+            self.engine.start_profiling()
+            messagebox.showinfo("性能分析", "性能分析已开始, 再次按 Ctrl+Shift+P 停止")
+
+    def take_memory_snapshot(self):
+        path = self.engine.memory_snapshot()
+        messagebox.showinfo("内存快照", "内存快照已写入:\n" + path)
+
     def on_closing(self):
         """窗口关闭时清理资源"""
         self.running = False
         
-        # 停止所有活跃的分析任务
-        for stop_event in self.active_analysis.values():
-            stop_event.set()
-        
-        # 停止文件监控
-        if hasattr(self, 'watcher'):
-            self.watcher.stop()
+        # 停止文件监控和所有分析任务, 关闭连接
+        self.render_executor.shutdown(wait=False, cancel_futures=True)
+        self.engine.close()
         
         self.root.destroy()
 
-def send_report(name, file_name, question_count, base_url="http://172.18.154.66:5000"):
-    """
-    发送报告到Flask接口
-    
-    Args:
-        name (str): 报告名称，将作为文件名
-        file_name (str): 文件名称
-        question_count (int): 问题数量
-        base_url (str): Flask应用的基础URL，默认为http://172.18.154.66:5000
-    
-    Returns:
-        dict: 接口响应结果
-    """
-    url = "{}/report".format(base_url)
-    
-    # 准备请求数据
-    data = {
-        "name": name,
-        "file_name": file_name,
-        "question_count": question_count
-    }
-    
-    try:
-        # 发送POST请求
-        response = requests.post(url, data=data, timeout=5)
-        
-        # 返回JSON响应
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {
-            "code": 500,
-            "message": f"请求失败: {str(e)}"
-        }
-
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import logging
+import subprocess
+
+from monitor.gitignore import GitIgnoreChecker
+from app.engine import AnalysisEngine
+from app.prompt import LINE_NUMBER_PATTERN
+
+
+def run_git(root:str, args:list):
+    """在 root 目录执行 git 命令, 返回 stdout(bytes), 失败时返回 None"""
+    try:
+        result = subprocess.run(
+            ["git"] + args,
+            cwd=root,
+            capture_output=True,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),  # Windows: 不创建窗口
+        )
+    except Exception as e:
+        logging.error(f"执行 git 命令失败: {e}")
+        return None
+    if result.returncode != 0:
+        logging.error("git {} 失败: {}".format(" ".join(args), result.stderr.decode("utf-8", errors="replace").strip()))
+        return None
+    return result.stdout
+
+
+def list_files(root:str, file_types=None, ignore_gitignore:bool = True, rev_range:str = None) -> list:
+    """
+    列出需要review的文件(相对 root 的路径, 只保存路径, 文件内容在review时再读取)
+
+    - rev_range 为空时: git 仓库中所有已跟踪的文件, 非 git 目录则遍历整个目录
+    - rev_range 如 "main..HEAD": 该范围内新增/修改的文件
+    """
+    if rev_range:
+        output = run_git(root, ["diff", "--name-only", "-z", "--relative", "--diff-filter=ACMR", rev_range])
+        if output is None:
+            raise ValueError("无法获取 {} 中变更的文件".format(rev_range))
+        paths = _split_null(output)
+    else:
+        output = run_git(root, ["ls-files", "-z"]) if os.path.isdir(os.path.join(root, ".git")) else None
+        paths = _split_null(output) if output is not None else _walk(root)
+
+    checker = GitIgnoreChecker(base_path=root) if ignore_gitignore else None
+    files = []
+    for path in paths:
+        if file_types and not any(path.lower().endswith(ext.lower()) for ext in file_types):
+            continue
+        if checker is not None and checker.is_ignored(path):
+            continue
+        if os.path.isfile(os.path.join(root, path)):
+            files.append(path)
+    return files
+
+
+def _split_null(output:bytes) -> list:
+    return [p for p in output.decode("utf-8", errors="replace").split("\0") if p]
+
+
+def _walk(root:str):
+    for directory, dir_names, file_names in os.walk(root):
+        dir_names[:] = [d for d in dir_names if d != ".git"]
+        for name in file_names:
+            yield os.path.relpath(os.path.join(directory, name), root)
+
+
+class JsonReport:
+    """逐个文件写入的 JSON 报告, 不在内存中保留所有结果"""
+
+    def __init__(self, path:str, root:str):
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write('{{"root": {}, "files": [\n'.format(json.dumps(root, ensure_ascii=False)))
+        self.count = 0
+
+    def add(self, result:dict):
+        if self.count:
+            self.file.write(",\n")
+        self.file.write(json.dumps(result, ensure_ascii=False))
+        self.count += 1
+
+    def close(self, summary:dict):
+        self.file.write('\n], "summary": {}}}\n'.format(json.dumps(summary, ensure_ascii=False)))
+        self.file.close()
+
+
+class SarifReport:
+    """SARIF 2.1.0 报告, 每个发现问题的文件一条结果"""
+
+    RULE_ID = "code-review"
+
+    def __init__(self, path:str, root:str):
+        self.file = open(path, "w", encoding="utf-8")
+        run = {
+            "tool": {"driver": {
+                "name": "Code Review AI Assistant",
+                "rules": [{"id": self.RULE_ID, "shortDescription": {"text": "代码review发现的缺陷"}}],
+            }},
+            "originalUriBaseIds": {"SRCROOT": {"uri": _file_uri(root)}},
+        }
+        header = json.dumps(run, ensure_ascii=False)
+        self.file.write('{"version": "2.1.0", '
+                        '"$schema": "https://json.schemastore.org/sarif-2.1.0.json", '
+                        '"runs": [' + header[:-1] + ', "results": [\n')
+        self.count = 0
+
+    def add(self, result:dict):
+        if result["status"] != "分析完成" or result["problem_count"] == 0:
+            return
+        location = {"artifactLocation": {"uri": result["file"], "uriBaseId": "SRCROOT"}}
+        match = LINE_NUMBER_PATTERN.search(result["answer"] or "")
+        if match:
+            location["region"] = {"startLine": int(match.group(1) or match.group(2))}
+        if self.count:
+            self.file.write(",\n")
+        self.file.write(json.dumps({
+            "ruleId": self.RULE_ID,
+            "level": "warning" if result["problem_count"] > 0 else "note",
+            "message": {"text": result["answer"]},
+            "locations": [{"physicalLocation": location}],
+            "properties": {"problemCount": result["problem_count"]},
+        }, ensure_ascii=False))
+        self.count += 1
+
+    def close(self, summary:dict):
+        self.file.write('\n]}]}\n')
+        self.file.close()
+
+
+def _file_uri(path:str) -> str:
+    uri = os.path.abspath(path).replace(os.sep, "/")
+    if not uri.startswith("/"):
+        uri = "/" + uri  # Windows 盘符路径
+    return "file://" + uri.rstrip("/") + "/"
+
+
+class BatchReview:
+    """
+    命令行批量review: 按需读取文件交给 AnalysisEngine, 结果逐个写入报告
+
+    同时进入引擎的文件数不超过 max_pending, 完成的记录立即删除, 内存占用与文件总数无关
+    """
+
+    def __init__(self, engine:AnalysisEngine, root:str, files:list, reports:list, max_pending:int,
+                 progress_stream=None):
+        self.engine = engine
+        self.root = root
+        self.files = files
+        self.reports = reports
+        self.max_pending = max(1, max_pending)
+        self.progress_stream = progress_stream
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.problem_files = 0
+        self.problems = 0
+        self._finished = []
+        self._start = 0.0
+        self._last_progress = 0.0
+
+    def run(self, stop_event=None) -> dict:
+        self.engine.subscribe(self.on_engine_event)
+        self._start = time.monotonic()
+        pending = iter(self.files)
+        exhausted = False
+        while stop_event is None or not stop_event.is_set():
+            while not exhausted and len(self.engine.file_analysis) < self.max_pending:
+                path = next(pending, None)
+                if path is None:
+                    exhausted = True
+                    break
+                self.submit(path)
+            if exhausted and not self.engine.file_analysis:
+                break
+            self.engine.process_events()
+            for file_path in self._finished:
+                self.engine.remove(file_path)
+            self._finished.clear()
+            self.show_progress()
+            time.sleep(0.05)
+        self.engine.unsubscribe(self.on_engine_event)
+        self.show_progress(final=True)
+
+        summary = self.summary()
+        for report in self.reports:
+            report.close(summary)
+        return summary
+
+    def submit(self, path:str):
+        file_path = os.path.join(self.root, path)
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logging.info(f"跳过无法读取的文件: {path}, {e}")
+            self.skipped += 1
+            return
+        self.engine.update_file(file_path, content)
+
+    def on_engine_event(self, kind, file_path, data):
+        if kind != "status":
+            return
+        status, problem_count = data
+        if status not in ("分析完成", "分析失败"):
+            return
+        record = self.engine.file_analysis.get(file_path)
+        if record is None:
+            return
+        result = {
+            "file": os.path.relpath(file_path, self.root).replace(os.sep, "/"),
+            "status": status,
+            "problem_count": problem_count,
+            "answer": record.answer,
+        }
+        for report in self.reports:
+            report.add(result)
+        self.done += 1
+        if status == "分析失败":
+            self.failed += 1
+        elif problem_count > 0:
+            self.problem_files += 1
+            self.problems += problem_count
+        # 记录在本轮事件处理完后删除
+        self._finished.append(file_path)
+
+    def summary(self) -> dict:
+        return {
+            "total": len(self.files),
+            "reviewed": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "files_with_problems": self.problem_files,
+            "problems": self.problems,
+            "elapsed_seconds": round(time.monotonic() - self._start, 1),
+        }
+
+    def show_progress(self, final:bool = False):
+        """输出进度和预计剩余时间, 每 0.5 秒最多刷新一次"""
+        if self.progress_stream is None:
+            return
+        now = time.monotonic()
+        if not final and now - self._last_progress < 0.5:
+            return
+        self._last_progress = now
+        total = len(self.files)
+        finished = self.done + self.skipped
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = "[{}/{}] {:.1%} {:.1f}文件/s".format(finished, total, finished / total if total else 1.0, rate)
+        if not final and rate > 0:
+            line += " 预计剩余 {}".format(_format_seconds((total - finished) / rate))
+        elif final:
+            line += " 耗时 {}".format(_format_seconds(elapsed))
+        line += " | 问题 {} | 失败 {}".format(self.problems, self.failed)
+        self.progress_stream.write("\r" + line.ljust(80) + ("\n" if final else ""))
+        self.progress_stream.flush()
+
+
+def _format_seconds(seconds:float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return "{}h{:02d}m".format(seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return "{}m{:02d}s".format(seconds // 60, seconds % 60)
+    return "{}s".format(seconds)
+
+
+def run_batch_review(config, root:str, rev_range:str = None, json_path:str = None, sarif_path:str = None,
+                     progress_stream=None, stop_event=None) -> dict:
+    """review root 下的所有文件(或 rev_range 中变更的文件), 结果写入 JSON/SARIF 报告"""
+    root = os.path.abspath(root)
+    file_types = config.file_types if config.file_types else None
+    files = list_files(root, file_types, config.ignore_gitignore, rev_range)
+    logging.info(f"批量review {len(files)} 个文件: {root}")
+
+    reports = []
+    if json_path:
+        reports.append(JsonReport(json_path, root))
+    if sarif_path:
+        reports.append(SarifReport(sarif_path, root))
+
+    # 批量review的结果写入报告, 不记录任务日志, 也不恢复界面/守护进程的记录
+    engine = AnalysisEngine(config, use_journal=False)
+    engine.start()
+    try:
+        # 等待中的文件足够填满所有并发槽位和合并批次即可
+        max_pending = config.max_concurrent_analysis * max(2, config.batch_config.max_files)
+        review = BatchReview(engine, root, files, reports, max_pending, progress_stream or sys.__stderr__)
+        return review.run(stop_event)
+    finally:
+        engine.close()
@@ -0,0 +1,151 @@
+import ast
+import os
+import re
+
+from app.prompt import parse_problem_count, is_failed_answer
+
+
+# Go 顶层声明(gofmt 格式化后顶格书写)
+GO_DECL_PATTERN = re.compile(r"^(?:func|type|var|const|import)\b")
+# Python 语法错误无法解析时的兜底匹配
+PY_DECL_PATTERN = re.compile(r"^(?:async\s+def|def|class)\b")
+# 声明之前需要跟随声明一起划分的行: 注释和装饰器
+LEADING_LINE_PREFIXES = ("#", "//", "@")
+
+
+class Chunk:
+    """大文件切分后的一个分段, 行号从 1 开始, 包含 end_line"""
+
+    def __init__(self, start_line:int, end_line:int, text:str):
+        self.start_line = start_line
+        self.end_line = end_line
+        self.text = text
+
+    def line_count(self) -> int:
+        return self.end_line - self.start_line + 1
+
+
+def needs_chunking(content:str, max_lines:int) -> bool:
+    return max_lines > 0 and content.count("\n") + 1 > max_lines
+
+
+def split_content(content:str, file_path:str, max_lines:int) -> list:
+    """
+    把超过 max_lines 行的文件切分为多个分段
+
+    - .py/.go 文件按顶层函数/类型/声明的边界切分, 相邻的声明合并到同一分段直到接近 max_lines
+    - 单个声明超过 max_lines 或其他类型文件按固定行数窗口切分
+    """
+    lines = content.split("\n")
+    if not needs_chunking(content, max_lines):
+        return [Chunk(1, len(lines), content)]
+
+    boundaries = find_boundaries(lines, content, os.path.splitext(file_path)[1].lower())
+    # 每个声明及其之前的注释作为一个不可再分的段落(超长时再按窗口切分)
+    segments = []
+    starts = [0] + [b for b in boundaries if b > 0]
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(lines)
+        if end > start:
+            segments.append((start, end))
+
+    chunks = []
+    chunk_start, chunk_end = None, None
+    for start, end in segments:
+        if end - start > max_lines:
+            if chunk_start is not None:
+                chunks.append(_make_chunk(lines, chunk_start, chunk_end))
+                chunk_start = None
+            for window_start in range(start, end, max_lines):
+                chunks.append(_make_chunk(lines, window_start, min(end, window_start + max_lines)))
+            continue
+        if chunk_start is not None and end - chunk_start > max_lines:
+            chunks.append(_make_chunk(lines, chunk_start, chunk_end))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
+    if chunk_start is not None:
+        chunks.append(_make_chunk(lines, chunk_start, chunk_end))
+    return chunks
+
+
+def find_boundaries(lines:list, content:str, ext:str) -> list:
+    """返回顶层声明起始行的下标(从 0 开始), 不支持的文件类型返回空列表"""
+    if ext == ".py":
+        starts = _python_decl_starts(content, lines)
+    elif ext == ".go":
+        starts = [i for i, line in enumerate(lines) if GO_DECL_PATTERN.match(line)]
+    else:
+        return []
+
+    boundaries = []
+    for start in starts:
+        # 声明前紧挨着的注释/装饰器跟随声明划分
+        while start > 0 and lines[start - 1].startswith(LEADING_LINE_PREFIXES):
+            start -= 1
+        if not boundaries or start > boundaries[-1]:
+            boundaries.append(start)
+    return boundaries
+
+
+def _python_decl_starts(content:str, lines:list) -> list:
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        # 正在编辑中的文件可能暂时无法解析
+        return [i for i, line in enumerate(lines) if PY_DECL_PATTERN.match(line)]
+    starts = []
+    for node in tree.body:
+        lineno = node.lineno
+        for decorator in getattr(node, "decorator_list", []):
+            lineno = min(lineno, decorator.lineno)
+        starts.append(lineno - 1)
+    return starts
+
+
+def _make_chunk(lines:list, start:int, end:int) -> Chunk:
+    """start/end 为行下标, 左闭右开"""
+    return Chunk(start + 1, end, "\n".join(lines[start:end]))
+
+
+def strip_answer_header(answer:str) -> str:
+    """去掉回答开头"代码中存在X个明显的安全问题:"这一行, 合并时统一生成"""
+    first_line, _, rest = answer.strip().partition("\n")
+    if "代码中存在" in first_line:
+        return rest.strip()
+    return answer.strip()
+
+
+def merge_chunk_answers(chunks:list, answers:list):
+    """
+    合并各分段的review结果
+    :return: (answer, problem_count, complete), complete 为 False 表示有分段请求失败
+    """
+    total = 0
+    parsed = False
+    complete = True
+    sections = []
+    for chunk, answer in zip(chunks, answers):
+        title = "### 第 {}-{} 行".format(chunk.start_line, chunk.end_line)
+        if is_failed_answer(answer):
+            complete = False
+            sections.append("{}\n{}".format(title, answer or "分析失败"))
+            continue
+        count = parse_problem_count(answer)
+        if count >= 0:
+            parsed = True
+            total += count
+        # 没有问题的分段不展示
+        if count != 0:
+            sections.append("{}\n{}".format(title, strip_answer_header(answer)))
+
+    if all(is_failed_answer(answer) for answer in answers):
+        # 所有分段都失败时直接返回失败信息, 不生成合并结果
+        return answers[0], -1, False
+
+    problem_count = total if parsed else -1
+    header = "代码中存在{}个明显的安全问题:".format(problem_count if parsed else "?")
+    body = "\n\n".join(sections) if sections else "没有明显问题"
+    answer = "{}\n\n> 文件较大, 已按 {} 个分段分别review后合并\n\n{}".format(header, len(chunks), body)
+    return answer, problem_count, complete
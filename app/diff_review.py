@@ -0,0 +1,152 @@
+import difflib
+import logging
+import os
+import re
+import subprocess
+
+
+# 可能包含被修改代码的函数/类型签名行
+SIGNATURE_PATTERNS = {
+    ".py": re.compile(r"^\s*(?:async\s+def|def|class)\b"),
+    ".go": re.compile(r"^(?:func|type)\b"),
+}
+DEFAULT_SIGNATURE_PATTERN = re.compile(r"^\s*(?:(?:public|private|protected|static|async|export)\s+)*"
+                                       r"(?:function|func|def|class|fn)\b")
+
+
+class DiffRegion:
+    """一段需要review的变更区域, 行号从 1 开始, 包含 end_line"""
+
+    def __init__(self, start_line:int, end_line:int):
+        self.start_line = start_line
+        self.end_line = end_line
+        self.changed_lines = set()  # 区域内新增/修改的行号
+        self.deleted_after = {}  # {行号: 该行之后被删除的行数}
+
+
+class DiffSnippet:
+    """增量review的提示词内容"""
+
+    def __init__(self, text:str, regions:list, changed_count:int, deleted_count:int):
+        self.text = text
+        self.regions = regions
+        self.changed_count = changed_count
+        self.deleted_count = deleted_count
+
+    def summary(self) -> str:
+        ranges = ", ".join("{}-{}".format(r.start_line, r.end_line) for r in self.regions)
+        return "{} 处变更(新增/修改 {} 行, 删除 {} 行), 覆盖第 {} 行".format(
+            len(self.regions), self.changed_count, self.deleted_count, ranges)
+
+
+def read_head_content(file_path:str):
+    """读取文件在 git HEAD 中的内容, 不在 git 仓库中或是新文件时返回 None"""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    try:
+        result = subprocess.run(
+            ["git", "show", "HEAD:./{}".format(name)],
+            cwd=directory,
+            capture_output=True,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),  # Windows: 不创建窗口
+        )
+    except Exception as e:
+        logging.error(f"读取 HEAD 版本失败: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def compute_regions(old_content:str, new_content:str, context_lines:int) -> list:
+    """对比两个版本, 返回新版本中需要review的区域(变更行前后各扩展 context_lines 行, 重叠的区域合并)"""
+    old_lines = old_content.splitlines()
+    new_lines = new_content.splitlines()
+    if not new_lines:
+        return []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    regions = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if j2 > j1:
+            changed = range(j1 + 1, j2 + 1)
+            start, end = j1 + 1, j2
+        else:
+            # 纯删除: 以删除位置的前一行作为变更点
+            changed = range(0)
+            start = end = start_of_delete = max(1, j1)
+        start = max(1, start - context_lines)
+        end = min(len(new_lines), end + context_lines)
+        if regions and start <= regions[-1].end_line + 1:
+            region = regions[-1]
+            region.end_line = max(region.end_line, end)
+        else:
+            region = DiffRegion(start, end)
+            regions.append(region)
+        region.changed_lines.update(changed)
+        if tag == "delete":
+            region.deleted_after[start_of_delete] = region.deleted_after.get(start_of_delete, 0) + (i2 - i1)
+    return regions
+
+
+def find_signatures(lines:list, line_no:int, ext:str) -> list:
+    """
+    查找包含第 line_no 行的函数/类型签名(由外到内)
+    :return: [(行号, 签名行)]
+    """
+    pattern = SIGNATURE_PATTERNS.get(ext, DEFAULT_SIGNATURE_PATTERN)
+    signatures = []
+    current = lines[line_no - 1] if 0 < line_no <= len(lines) else ""
+    # 空行不能判断所在层级, 取最近的任意签名
+    indent = _indent_of(current) if current.strip() else float("inf")
+    for index in range(min(line_no, len(lines)) - 1, -1, -1):
+        line = lines[index]
+        if not line.strip() or not pattern.match(line):
+            continue
+        line_indent = _indent_of(line)
+        # 只保留缩进更小的签名, 即外层的定义
+        if line_indent < indent or (index == line_no - 1):
+            signatures.append((index + 1, line.rstrip()))
+            indent = line_indent
+            if indent == 0:
+                break
+    signatures.reverse()
+    return signatures
+
+
+def _indent_of(line:str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def build_diff_snippet(old_content:str, new_content:str, file_path:str, context_lines:int = 5):
+    """
+    生成增量review的代码片段: 每行带上在完整文件中的行号, 新增/修改的行以 + 标记,
+    区域之前附上所在函数的签名, 模型回答中的行号可以直接对应到完整文件
+    :return: DiffSnippet, 两个版本没有差异时返回 None
+    """
+    regions = compute_regions(old_content, new_content, context_lines)
+    if not regions:
+        return None
+
+    lines = new_content.splitlines()
+    ext = os.path.splitext(file_path)[1].lower()
+    width = len(str(len(lines)))
+    parts = []
+    changed_count = deleted_count = 0
+    for region in regions:
+        block = []
+        anchor = min(region.changed_lines) if region.changed_lines else region.start_line
+        for line_no, signature in find_signatures(lines, anchor, ext):
+            if line_no < region.start_line:
+                block.append("{} | {}".format(str(line_no).rjust(width), signature))
+                block.append("{} | ...".format(" " * width))
+        for line_no in range(region.start_line, region.end_line + 1):
+            marker = "+" if line_no in region.changed_lines else " "
+            block.append("{}{}| {}".format(str(line_no).rjust(width), marker, lines[line_no - 1]))
+            if line_no in region.deleted_after:
+                block.append("{}-| (此处删除了 {} 行)".format(" " * width, region.deleted_after[line_no]))
+        changed_count += len(region.changed_lines)
+        deleted_count += sum(region.deleted_after.values())
+        parts.append("\n".join(block))
+    return DiffSnippet("\n\n".join(parts), regions, changed_count, deleted_count)
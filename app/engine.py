@@ -0,0 +1,862 @@
+import os
+import asyncio
+import queue
+import threading
+import time
+import logging
+from collections import deque
+
+from config.config import Config
+from ai.kernel.async_kernel import create_async_kernel
+from ai.kernel.kernel_pool import KernelPool, create_kernel_pool
+from ai.kernel.hedging import HedgedKernel
+from ai.kernel.http_pool import configure_session_pool
+from ai.kernel.ratelimit import configure_rate_limiter, estimate_tokens, CircuitBreaker
+from app.prompt import (build_focus, build_question, build_chunk_question, chunk_prompt_version,
+                        build_diff_question, diff_prompt_version, build_batch_question, split_batch_answer,
+                        parse_problem_count, parse_findings, PROMPT_VERSION, is_failed_answer)
+from app.diff_review import build_diff_snippet, read_head_content
+from app.chunker import needs_chunking, split_content, merge_chunk_answers
+from app.review_cache import ReviewCache
+from app.job_journal import JobJournal
+from app.telemetry import TelemetryReporter
+from app.findings_history import FindingsHistory
+from app.result_store import ResultStore, FINISHED_STATUSES, content_hash
+from app.scheduler import AnalysisScheduler, PriorityPolicy
+from monitor.file import DirectoryWatcher
+from monitor.metrics import get_metrics, MetricsServer, MetricsDumper
+from monitor.profiling import Profiler
+
+
+class AnalysisEngine:
+    """
+    代码review流水线: 文件监控 -> 调度 -> Kernel 请求 -> 结果记录
+
+    不依赖任何UI, Tk 界面和后台守护进程都通过它运行:
+    - 文件变更、调度器事件先进入队列, 由宿主线程调用 process_events() 统一处理,
+      所有记录的修改和观察者回调都在宿主线程中执行(Tk 界面即 UI 线程)
+    - subscribe(listener) 注册观察者, listener(kind, file_path, data):
+        status:  文件状态变化, data = (status, problem_count)
+        restored: 从任务日志恢复的已完成记录, data = (status, problem_count)
+        partial: 流式/分段分析的部分结果, data = 已收到的内容
+        removed: 记录被删除, data = None
+        cleared: 所有记录被清除, file_path 和 data 为 None
+    """
+
+    def __init__(self, config:Config, use_journal:bool = True):
+        """
+        :param use_journal: 是否记录任务日志(还需 journal_config.enabled), 批量review不记录
+        """
+        self.config = config
+
+        # 共享HTTP连接池, 大小与最大并发数一致
+        self.session_pool = configure_session_pool(
+            pool_size=self.config.max_concurrent_analysis,
+            connect_timeout=self.config.fast_gtp_config.connect_timeout,
+            read_timeout=self.config.fast_gtp_config.read_timeout,
+        )
+
+        # 共享限流器: RPM/TPM 限制、退避重试和熔断
+        self.rate_limiter = configure_rate_limiter(**self.config.rate_limit_config.to_kwargs())
+
+        # 创建FastGTP异步客户端, 配置了多个后端时组成按耗时路由的Kernel池
+        primary_kernel = None
+        if self.config.fast_gtp_config.url or not self.config.kernel_pool_config.backends:
+            primary_kernel = create_async_kernel(self.config.fast_gtp_config,
+                                                 self.config.max_concurrent_analysis,
+                                                 self.session_pool)
+        pool_config = self.config.kernel_pool_config
+        self.async_kernel = create_kernel_pool(primary_kernel, "FastGTP", pool_config.backends,
+                                               self.config.fast_gtp_config,
+                                               self.config.max_concurrent_analysis, self.session_pool,
+                                               self.config.rate_limit_config.to_kwargs(),
+                                               failure_threshold=pool_config.failure_threshold,
+                                               cool_down=pool_config.cool_down,
+                                               ewma_alpha=pool_config.ewma_alpha)
+        self.kernel_pool = self.async_kernel if isinstance(self.async_kernel, KernelPool) else None
+
+        # 对冲请求: 请求耗时超过最近耗时的高百分位时再发一个相同请求, 取先返回的结果
+        self.hedged_kernel = None
+        hedge_config = self.config.hedge_config
+        if hedge_config.enabled:
+            self.hedged_kernel = HedgedKernel(self.async_kernel,
+                                              percentile=hedge_config.percentile,
+                                              max_ratio=hedge_config.max_ratio,
+                                              min_samples=hedge_config.min_samples,
+                                              min_delay=hedge_config.min_delay)
+            self.async_kernel = self.hedged_kernel
+
+        # 持久化review缓存
+        self.review_cache = None
+        if self.config.review_cache_config.enabled:
+            cache_config = self.config.review_cache_config
+            try:
+                self.review_cache = ReviewCache(cache_config.path,
+                                                max_entries=cache_config.max_entries,
+                                                max_size_mb=cache_config.max_size_mb,
+                                                max_age_days=cache_config.max_age_days)
+            except Exception as e:
+                logging.error(f"打开review缓存失败: {e}")
+
+        # 任务日志: 重启后恢复分析结果和未完成的任务
+        self.journal = None
+        if use_journal and self.config.journal_config.enabled:
+            journal_config = self.config.journal_config
+            try:
+                self.journal = JobJournal(journal_config.path,
+                                          flush_interval=journal_config.flush_interval,
+                                          max_age_days=journal_config.max_age_days)
+            except Exception as e:
+                logging.error(f"打开任务日志失败: {e}")
+
+        # 统计上报: 后台线程批量发送, 不增加review的延迟
+        self.telemetry = None
+        telemetry_config = self.config.telemetry_config
+        if telemetry_config.enabled and telemetry_config.base_url:
+            self.telemetry = TelemetryReporter(telemetry_config.base_url,
+                                               spool_path=telemetry_config.spool_path,
+                                               max_queue=telemetry_config.max_queue,
+                                               max_spool=telemetry_config.max_spool,
+                                               batch_size=telemetry_config.batch_size,
+                                               flush_interval=telemetry_config.flush_interval,
+                                               retry_interval=telemetry_config.retry_interval)
+
+        # review历史: 每次review的耗时、token 估算和拆分后的各个问题, 用于按目录/时间查询
+        self.history = None
+        self._started_at = {}  # {file_path: 开始分析的时间}
+        history_config = self.config.history_config
+        if history_config.enabled:
+            try:
+                self.history = FindingsHistory(history_config.path, max_age_days=history_config.max_age_days)
+            except Exception as e:
+                logging.error(f"打开review历史失败: {e}")
+
+        # 存储文件路径和对应的分析结果, 超过内存上限时最久未查看的结果转存到磁盘
+        result_store_config = self.config.result_store_config
+        self.file_analysis = ResultStore(result_store_config.memory_limit_mb,
+                                         result_store_config.spill_path)  # {file_path: ReviewRecord}
+
+        self.max_concurrent_analysis = self.config.max_concurrent_analysis
+        self.scheduler = None  # 异步分析调度器
+        self.ttft_samples = deque(maxlen=50)  # 最近的流式首字延迟(秒)
+        self.watcher = None
+        self.monitor_thread = None
+        self._listeners = []
+        self._inbox = queue.SimpleQueue()  # 监控线程提交的文件变更 (file_path, content)
+        self.metrics = get_metrics()
+        self.metrics_server = None
+        self.metrics_dumper = None
+        self.profiler = None  # 性能分析, 首次使用时创建
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """启动异步分析调度器"""
+        # 调度策略: 默认短任务和最近保存的文件优先, 等待时间越长优先级越高
+        scheduler_config = self.config.scheduler_config
+        policy = None
+        if scheduler_config.policy == "priority":
+            policy = PriorityPolicy(self.estimate_job_tokens,
+                                    size_weight=scheduler_config.size_weight,
+                                    aging_rate=scheduler_config.aging_rate,
+                                    recency_bonus=scheduler_config.recency_bonus,
+                                    recency_decay=scheduler_config.recency_decay)
+        batch_config = self.config.batch_config
+        if batch_config.enabled:
+            # 多个小文件合并到一个请求中review, 减少请求数和重复的提示词
+            self.scheduler = AnalysisScheduler(self.analyze_file, self.max_concurrent_analysis,
+                                               batch_handler=self.analyze_batch,
+                                               batch_cost=self.estimate_batch_cost,
+                                               batch_token_budget=batch_config.token_budget,
+                                               batch_max_files=batch_config.max_files,
+                                               batch_max_wait=batch_config.max_wait,
+                                               policy=policy)
+        else:
+            self.scheduler = AnalysisScheduler(self.analyze_file, self.max_concurrent_analysis, policy=policy)
+        self.scheduler.start()
+        self.start_metrics_export()
+        if self.config.profiling_config.enabled:
+            self.start_profiling()
+
+    def start_metrics_export(self):
+        """按配置启动本机指标端口和定期 JSON 快照"""
+        metrics_config = self.config.metrics_config
+        if metrics_config.http_port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, metrics_config.http_port)
+            except OSError as e:
+                logging.error(f"启动指标服务失败: {e}")
+        if metrics_config.json_path and self.metrics_dumper is None:
+            self.metrics_dumper = MetricsDumper(self.metrics, metrics_config.json_path, metrics_config.dump_interval)
+
+    def close(self):
+        """停止监控和所有分析任务, 释放连接和缓存"""
+        self.stop_monitoring()
+        if self.profiler is not None and self.profiler.running:
+            self.stop_profiling()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.metrics_dumper is not None:
+            self.metrics_dumper.stop()
+            self.metrics_dumper = None
+        if self.scheduler is not None:
+            self.scheduler.cancel_all()
+            try:
+                self.scheduler.run_coroutine(self.async_kernel.close()).result(timeout=2)
+            except Exception as e:
+                logging.info(f"关闭分析客户端失败: {e}")
+            self.scheduler.stop()
+        if self.review_cache is not None:
+            self.review_cache.close()
+        if self.journal is not None:
+            self.journal.close()
+        self.file_analysis.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        if self.history is not None:
+            self.history.close()
+
+    # ---------- 性能分析（在宿主线程中调用） ----------
+
+    def get_profiler(self) -> Profiler:
+        if self.profiler is None:
+            profiling_config = self.config.profiling_config
+            self.profiler = Profiler(profiling_config.output_dir,
+                                     sample_interval=profiling_config.sample_interval,
+                                     tracemalloc_frames=profiling_config.tracemalloc_frames)
+        return self.profiler
+
+    def start_profiling(self):
+        """在宿主线程和调度器事件循环线程中开启 cProfile, 并开始采样所有线程的调用栈"""
+        profiler = self.get_profiler()
+        if profiler.running:
+            return
+        profiler.start()
+        self._call_in_loop(profiler.enable_current_thread)
+
+    def stop_profiling(self) -> list:
+        """停止性能分析, 返回写入的文件路径"""
+        if self.profiler is None or not self.profiler.running:
+            return []
+        self._call_in_loop(self.profiler.disable_current_thread)
+        return self.profiler.stop()
+
+    def memory_snapshot(self) -> str:
+        """写入 tracemalloc 内存快照(与上一次快照比较), 返回文件路径"""
+        return self.get_profiler().memory_snapshot()
+
+    def _call_in_loop(self, func):
+        """在调度器的事件循环线程中执行 func 并等待完成"""
+        if self.scheduler is None:
+            return
+
+        async def call():
+            func()
+
+        try:
+            self.scheduler.run_coroutine(call()).result(timeout=2)
+        except Exception as e:
+            logging.info(f"在事件循环线程中执行失败: {e}")
+
+    def restore_journal(self):
+        """
+        从任务日志恢复上次运行的记录（在 start() 之后、宿主线程中调用）
+        已完成的结果直接恢复, 关闭期间被修改的文件和未完成的任务按原来的提交顺序重新排队
+        """
+        if self.journal is None:
+            return
+        try:
+            rows = self.journal.load()
+        except Exception as e:
+            logging.error(f"读取任务日志失败: {e}")
+            return
+        restored = requeued = 0
+        for file_path, journal_hash, status, answer, problem_count in rows:
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    current = f.read()
+            except (OSError, UnicodeDecodeError):
+                # 文件已被删除或无法读取
+                self.journal.remove(file_path)
+                continue
+            if answer is not None:
+                record = self.file_analysis.create(file_path, current, status)
+                unchanged = record.content_hash == journal_hash
+                record.content = None  # 已完成的记录只保留内容哈希
+                record.content_hash = journal_hash
+                record.answer = answer
+                record.problem_count = problem_count
+                if unchanged and self.keeps_review_base():
+                    # 日志不保存文件内容, 文件未变化时当前内容就是上次review的内容
+                    record.reviewed_content = current
+                self.notify("restored", file_path, (status, problem_count))
+                restored += 1
+                if unchanged:
+                    continue
+            # 未完成的任务, 或关闭期间文件被修改
+            self.update_file(file_path, current)
+            requeued += 1
+        if rows:
+            logging.info(f"从任务日志恢复 {restored} 条结果, 重新排队 {requeued} 个任务")
+
+    def serve_forever(self, stop_event:threading.Event, interval:float = 0.05):
+        """没有UI时在当前线程中循环处理事件, 直到 stop_event 被触发"""
+        while not stop_event.is_set():
+            self.process_events()
+            stop_event.wait(interval)
+
+    def apply_config(self):
+        """应用新的并发数和限流配置, 调度器直接调整并发上限, 不会中断进行中的任务"""
+        self.max_concurrent_analysis = self.config.max_concurrent_analysis
+        self.session_pool.configure(pool_size=self.max_concurrent_analysis)
+        self.rate_limiter.configure(**self.config.rate_limit_config.to_kwargs())
+        self.async_kernel.set_pool_size(self.max_concurrent_analysis)
+        self.scheduler.set_concurrency(self.max_concurrent_analysis)
+        logging.info(f"调整最大并发数: {self.max_concurrent_analysis}")
+
+    # ---------- 文件监控 ----------
+
+    def start_monitoring(self, path:str = None):
+        """在后台线程中监控目录, 路径无效时返回 False"""
+        path = path or self.config.monitor_project_path
+        if not path or not os.path.isdir(path):
+            logging.info(f"无效的监控路径: {path}")
+            return False
+
+        # 处理文件类型配置
+        file_types = self.config.file_types if self.config.file_types else None
+        self.watcher = DirectoryWatcher(
+            config=self.config,
+            path=path,
+            callback=self.file_modified,
+            recursive=True,
+            file_types=file_types
+        )
+        self.monitor_thread = threading.Thread(target=self.watcher.start, daemon=True)
+        self.monitor_thread.start()
+        return True
+
+    def stop_monitoring(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def file_modified(self, file_path, content):
+        """文件变更回调（任意线程可调用）, 在下一次 process_events() 中处理"""
+        self._inbox.put((file_path, content))
+
+    # ---------- 观察者 ----------
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def notify(self, kind, file_path=None, data=None):
+        for listener in list(self._listeners):
+            try:
+                listener(kind, file_path, data)
+            except Exception as e:
+                logging.error(f"通知观察者失败: {kind}, {file_path}, {e}")
+
+    # ---------- 宿主线程中的事件处理 ----------
+
+    def process_events(self) -> bool:
+        """
+        处理文件变更和调度器事件, 这是分析结果进入记录的唯一通道
+        :return: 是否处理了事件
+        """
+        handled = False
+        while True:
+            try:
+                file_path, content = self._inbox.get_nowait()
+            except queue.Empty:
+                break
+            handled = True
+            self.update_file(file_path, content)
+        while True:
+            try:
+                kind, file_path, data = self.scheduler.events.get_nowait()
+            except queue.Empty:
+                break
+            handled = True
+            try:
+                self.handle_scheduler_event(kind, file_path, data)
+            except Exception as e:
+                logging.error(f"处理分析事件失败: {kind}, {file_path}, {e}")
+        if handled:
+            self.file_analysis.enforce_limit()
+        return handled
+
+    def update_file(self, file_path, content):
+        """记录文件的新内容并提交分析"""
+        record = self.file_analysis.get(file_path)
+        if record is None:
+            # 创建新记录
+            record = self.file_analysis.create(file_path, content, "新变更")
+            if self.journal is not None:
+                self.journal.enqueue(file_path, record.content_hash)
+            self.notify("status", file_path, ("新变更", -1))
+            self.scheduler.submit(file_path)
+            self.set_status(file_path, "等待分析")
+            return
+
+        in_progress = (self.scheduler.is_queued(file_path) or
+                       record.status in ["等待分析", "分析中"])
+        if in_progress and record.content == content:
+            logging.info(f"文件 {file_path} 内容未变化且正在处理中，忽略新事件")
+            return
+
+        # 更新现有记录, 版本号递增后旧版本的分析结果会被丢弃
+        self.file_analysis.ensure_loaded(record)
+        record.content = content
+        record.content_hash = content_hash(content)
+        record.generation += 1
+        record.status = "新变更"
+        record.partial_answer = None
+        self.file_analysis.touch(file_path)
+        if self.journal is not None:
+            self.journal.enqueue(file_path, record.content_hash)
+
+        if in_progress:
+            # 等待中的任务会直接分析最新内容, 进行中的请求立即中断后重新排队
+            logging.info(f"文件 {file_path} 在分析过程中被修改, 改为分析最新内容")
+            self.scheduler.supersede(file_path)
+        else:
+            self.notify("status", file_path, ("新变更", -1))
+            self.scheduler.submit(file_path)
+        self.set_status(file_path, "等待分析")
+
+    def set_status(self, file_path, status, problem_count=-1):
+        """更新文件分析状态并通知观察者"""
+        record = self.file_analysis.get(file_path)
+        # 如果文件记录已经被删除，则不更新
+        if record is None:
+            return
+        record.status = status
+        if status in FINISHED_STATUSES:
+            # 分析结束后不再保存文件内容, 查看时按最近查看顺序排到最后
+            record.content = None
+            record.partial_answer = None
+            if status != "已查看":
+                record.problem_count = problem_count
+            self.file_analysis.touch(file_path)
+        if self.journal is not None:
+            if status in ("分析完成", "分析失败"):
+                self.journal.set_result(file_path, status, record.answer, problem_count)
+            else:
+                self.journal.set_status(file_path, status)
+        self.notify("status", file_path, (status, problem_count))
+
+    def handle_scheduler_event(self, kind, file_path, data):
+        if kind == "ttft":
+            self.ttft_samples.append(data)
+            return
+        record = self.file_analysis.get(file_path)
+        if record is None:
+            return
+
+        if kind == "started":
+            self._started_at[file_path] = time.monotonic()
+            self.set_status(file_path, "分析中")
+        elif kind == "partial":
+            text, ttft, generation = data
+            if generation != record.generation or record.status != "分析中":
+                return
+            record.partial_answer, record.ttft = text, ttft
+            self.notify("partial", file_path, text)
+        elif kind == "done":
+            if data is None:
+                return
+            answer, problem_count, generation, reviewed_content, prompt_tokens = data
+            if generation != record.generation:
+                # 文件已被再次修改, 旧内容的结果直接丢弃
+                logging.info(f"丢弃过期的分析结果: {file_path}")
+                return
+            record.answer = answer
+            if reviewed_content is not None and self.keeps_review_base():
+                # 本次review的内容, 作为下次增量review的基准
+                record.reviewed_content = reviewed_content
+            self.record_history(file_path, record, answer, problem_count, prompt_tokens)
+            self.set_status(file_path, "分析完成", problem_count)
+        elif kind == "failed":
+            if self.scheduler.is_queued(file_path):
+                # 失败的是被新内容替换的旧任务
+                return
+            self._started_at.pop(file_path, None)
+            record.answer = f"分析失败: {str(data)}"
+            self.set_status(file_path, "分析失败")
+
+    def keeps_review_base(self) -> bool:
+        """只有增量review以上次review的内容为基准时才保存该内容, 否则记录只保留内容哈希"""
+        diff_config = self.config.diff_review_config
+        return diff_config.enabled and diff_config.base != "head"
+
+    def record_history(self, file_path, record, answer, problem_count, prompt_tokens):
+        """把完成的review写入历史(只入队), 必须在 set_status 丢弃文件内容之前调用"""
+        started_at = self._started_at.pop(file_path, None)
+        if self.history is None or problem_count < 0 or is_failed_answer(answer):
+            return
+        latency = time.monotonic() - started_at if started_at is not None else None
+        # prompt_tokens 为实际发送的提示词(增量片段/分段/合并请求中的份额)的估算值, 命中缓存时为 0
+        answer_tokens = estimate_tokens(answer) if prompt_tokens else 0
+        self.history.record(file_path, record.content_hash, self.config.fast_gtp_config.gtp_model, problem_count,
+                            parse_findings(answer, problem_count), latency=latency,
+                            prompt_tokens=prompt_tokens, answer_tokens=answer_tokens)
+
+    # ---------- 记录操作（宿主线程调用） ----------
+
+    def review_now(self, file_path):
+        """把文件排到队列最前面, 已分析完成的文件重新review"""
+        record = self.file_analysis.get(file_path)
+        if record is None:
+            return
+        if record.content is None:
+            # 已结束的记录不保存文件内容, 重新读取
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                logging.error(f"读取文件失败, 无法重新review: {file_path}, {e}")
+                return
+            record.content = content
+            record.content_hash = content_hash(content)
+            record.generation += 1
+        self.file_analysis.ensure_loaded(record)
+        self.scheduler.boost(file_path)
+        if record.status not in ["等待分析", "分析中"]:
+            self.set_status(file_path, "等待分析")
+
+    def remove(self, file_path):
+        """删除记录, 如果文件正在分析中或等待分析则取消任务"""
+        self.scheduler.cancel(file_path)
+        self._started_at.pop(file_path, None)
+        if self.file_analysis.pop(file_path, None) is not None:
+            if self.journal is not None:
+                self.journal.remove(file_path)
+            self.notify("removed", file_path)
+
+    def clear(self):
+        """停止所有分析任务并清除所有记录"""
+        self.scheduler.cancel_all()
+        self._started_at.clear()
+        self.file_analysis.clear()
+        if self.journal is not None:
+            self.journal.clear()
+        self.notify("cleared")
+
+    def pause(self):
+        self.scheduler.pause()
+
+    def resume(self):
+        self.scheduler.resume()
+
+    @property
+    def paused(self) -> bool:
+        return self.scheduler.paused
+
+    def status_text(self) -> str:
+        """状态栏/日志中展示的运行状态"""
+        active_count = self.scheduler.active_count()
+        queue_size = self.scheduler.pending_count()
+        status_text = "暂停" if self.scheduler.paused else "运行中"
+        status = f"状态: {status_text} | 活跃任务: {active_count} | 队列: {queue_size}"
+        feedback = self.scheduler.feedback_stats()
+        if feedback['count']:
+            status += " | 平均反馈: {:.1f}s".format(feedback['mean'])
+        if self.ttft_samples:
+            status += " | 首字延迟: {:.1f}s".format(sum(self.ttft_samples) / len(self.ttft_samples))
+        if self.review_cache is not None:
+            hits, misses = self.review_cache.hit_counts()
+            status += " | 缓存命中: {}/{}".format(hits, hits + misses)
+        if self.kernel_pool is not None:
+            backend_stats = self.kernel_pool.stats()
+            status += " | 后端: {}/{}可用 {}/min".format(
+                sum(1 for b in backend_stats if b['available']), len(backend_stats),
+                sum(b['throughput_per_minute'] for b in backend_stats))
+        if self.hedged_kernel is not None:
+            hedge_stats = self.hedged_kernel.stats()
+            if hedge_stats['hedges']:
+                status += " | 对冲: {}次 胜率{:.0%}".format(hedge_stats['hedges'], hedge_stats['win_rate'])
+        limit_state = self.rate_limiter.state()
+        if limit_state['breaker'] == CircuitBreaker.OPEN:
+            status += " | 熔断中({:.0f}s)".format(limit_state['breaker_retry_in'])
+        elif limit_state['breaker'] == CircuitBreaker.HALF_OPEN:
+            status += " | 熔断恢复中"
+        if limit_state['blocked_for'] > 0:
+            status += " | 限流等待{:.0f}s".format(limit_state['blocked_for'])
+        if limit_state['requests_remaining'] >= 0:
+            status += " | RPM剩余: {:.0f}".format(limit_state['requests_remaining'])
+        if limit_state['tokens_remaining'] >= 0:
+            status += " | TPM剩余: {:.0f}".format(limit_state['tokens_remaining'])
+        return status
+
+    # ---------- 分析流程（在调度器的事件循环中执行） ----------
+    async def analyze_file(self, file_path):
+        """
+        分析单个文件（在调度器的事件循环中执行）
+        :return: (answer, problem_count, generation, reviewed_content, prompt_tokens), 记录已被删除时返回 None
+                 reviewed_content 为完整review的内容(分析失败时为 None), 增量review以其为基准时由宿主线程保存;
+                 prompt_tokens 为实际发送的提示词的估算 token 数(Kernel 不返回实际用量), 命中缓存时为 0
+        """
+        record = self.file_analysis.get(file_path)
+        if record is None:
+            return None
+        
+        # 分析期间文件再次保存时任务会被中断, 结果按内容版本号判断是否过期
+        content, generation = record.content, record.generation
+        if content is None:
+            return None
+        focus = build_focus(self.config.check_type_list)
+        # 增量review: 只发送相对基准版本的变更区域
+        diff_snippet = await self.build_diff_snippet(record, content, file_path)
+        chunk_config = self.config.chunk_config
+        chunked = (diff_snippet is None and chunk_config.enabled
+                   and needs_chunking(content, chunk_config.max_lines))
+        if diff_snippet is not None:
+            cache_content, prompt_version = diff_snippet.text, diff_prompt_version()
+        elif chunked:
+            cache_content, prompt_version = content, chunk_prompt_version(chunk_config.max_lines)
+        else:
+            cache_content, prompt_version = content, PROMPT_VERSION
+        
+        # 先查询review缓存, 相同内容+检查类型+提示词版本+模型的结果直接复用
+        cache_key = None
+        if self.review_cache is not None:
+            cache_key = ReviewCache.make_key(cache_content, focus, prompt_version,
+                                             self.config.fast_gtp_config.gtp_model)
+            cached = self.review_cache.get(cache_key)
+            if cached is not None:
+                answer, problem_count = cached
+                logging.info(f"命中review缓存: {file_path}")
+                self.report_problems(file_path, problem_count)
+                return answer, problem_count, generation, content, 0
+        
+        if diff_snippet is None and not chunked:
+            return await self.review_full(file_path, content, generation, cache_key)
+        if diff_snippet is not None:
+            question = build_diff_question(diff_snippet.text, os.path.basename(file_path),
+                                           self.config.check_type_list)
+            prompt_tokens = estimate_tokens(question)
+            answer = await self.analyze_content(question, file_path, generation)
+            problem_count = parse_problem_count(answer)
+            complete = not is_failed_answer(answer)
+            if complete:
+                answer += "\n\n> 增量review: 仅分析了{}".format(diff_snippet.summary())
+        else:
+            answer, problem_count, complete, prompt_tokens = await self.analyze_chunks(content, file_path, generation)
+        
+        if complete and cache_key is not None:
+            self.review_cache.put(cache_key, answer, problem_count, self.config.fast_gtp_config.gtp_model)
+        self.report_problems(file_path, problem_count)
+        return answer, problem_count, generation, content if complete else None, prompt_tokens
+    
+    async def review_full(self, file_path, content, generation, cache_key):
+        """
+        review文件全文, 调用方已查询过review缓存(未命中)
+        :return: 与 analyze_file 相同
+        """
+        question = build_question(content, self.config.check_type_list)
+        prompt_tokens = estimate_tokens(question)
+        answer = await self.analyze_content(question, file_path, generation)
+        # 解析答案中的问题数量
+        problem_count = parse_problem_count(answer)
+        complete = not is_failed_answer(answer)
+        if complete and cache_key is not None:
+            self.review_cache.put(cache_key, answer, problem_count, self.config.fast_gtp_config.gtp_model)
+        self.report_problems(file_path, problem_count)
+        return answer, problem_count, generation, content if complete else None, prompt_tokens
+    
+    async def build_diff_snippet(self, record, content, file_path):
+        """
+        计算相对基准版本(上次review的内容或 git HEAD)的变更片段
+        :return: DiffSnippet, 不满足增量review条件时返回 None(review全文)
+        """
+        diff_config = self.config.diff_review_config
+        if not diff_config.enabled:
+            return None
+        total_lines = content.count("\n") + 1
+        if total_lines < diff_config.min_lines:
+            return None
+        
+        loop = asyncio.get_running_loop()
+        if diff_config.base == "head":
+            base_content = await loop.run_in_executor(None, read_head_content, file_path)
+        else:
+            # 提交分析前已在宿主线程中加载(ensure_loaded), 这里不会访问转存文件
+            base_content = record.reviewed_content
+        if not base_content:
+            return None
+        
+        snippet = await loop.run_in_executor(None, build_diff_snippet, base_content, content, file_path,
+                                             diff_config.context_lines)
+        if snippet is None:
+            return None
+        region_lines = sum(r.end_line - r.start_line + 1 for r in snippet.regions)
+        if region_lines > total_lines * diff_config.max_changed_ratio:
+            logging.info(f"变更区域过大({region_lines}/{total_lines}行), review全文: {file_path}")
+            return None
+        logging.info(f"增量review {file_path}: {snippet.summary()}")
+        return snippet
+    
+    def estimate_job_tokens(self, file_path):
+        """估算分析文件的提示词 token 数, 供优先级调度使用（在调度器的事件循环中执行）"""
+        record = self.file_analysis.get(file_path)
+        if record is None:
+            return None
+        # 每次选择任务都会对所有等待中的任务估算, 按内容版本缓存
+        content = record.content
+        if content is None:
+            return None
+        cached = record.token_estimate
+        if cached is None or cached[0] != record.generation:
+            cached = (record.generation, estimate_tokens(content))
+            record.token_estimate = cached
+        return cached[1]
+    
+    def estimate_batch_cost(self, file_path):
+        """
+        估算文件合并review时占用的 token 数（在调度器的事件循环中执行）
+        :return: token 数, 文件较大或需要增量/分段review时返回 None, 单独分析
+        """
+        record = self.file_analysis.get(file_path)
+        if record is None or record.content is None:
+            return None
+        content = record.content
+        tokens = estimate_tokens(content)
+        if tokens > self.config.batch_config.max_file_tokens:
+            return None
+        line_count = content.count("\n") + 1
+        if self.config.diff_review_config.enabled and line_count >= self.config.diff_review_config.min_lines:
+            return None
+        if self.config.chunk_config.enabled and needs_chunking(content, self.config.chunk_config.max_lines):
+            return None
+        return tokens
+    
+    async def analyze_batch(self, file_paths):
+        """
+        把多个小文件合并到一个请求中review, 再按文件拆分回答（在调度器的事件循环中执行）
+        :return: {file_path: (answer, problem_count, generation, reviewed_content, prompt_tokens)},
+                 合并请求的提示词 token 数按各文件内容的长度分摊
+        """
+        results = {}
+        focus = build_focus(self.config.check_type_list)
+        model = self.config.fast_gtp_config.gtp_model
+        batch = []  # [(file_path, content, cache_key)]
+        generations = {}
+        for file_path in file_paths:
+            record = self.file_analysis.get(file_path)
+            if record is None or record.content is None:
+                results[file_path] = None
+                continue
+            content = record.content
+            generations[file_path] = record.generation
+            cache_key = None
+            if self.review_cache is not None:
+                cache_key = ReviewCache.make_key(content, focus, PROMPT_VERSION, model)
+                cached = self.review_cache.get(cache_key)
+                if cached is not None:
+                    logging.info(f"命中review缓存: {file_path}")
+                    self.report_problems(file_path, cached[1])
+                    results[file_path] = cached + (generations[file_path], content, 0)
+                    continue
+            batch.append((file_path, content, cache_key))
+        
+        if len(batch) == 1:
+            # 只剩一个文件时单独review, 缓存已在上面查询过
+            file_path, content, cache_key = batch[0]
+            results[file_path] = await self.review_full(file_path, content, generations[file_path], cache_key)
+            return results
+        if not batch:
+            return results
+        
+        logging.info(f"合并review {len(batch)} 个文件")
+        question = build_batch_question([(os.path.basename(path), content) for path, content, _ in batch],
+                                        self.config.check_type_list)
+        question_tokens = estimate_tokens(question)
+        total_length = sum(len(content) for _, content, _ in batch) or 1
+        shares = {path: question_tokens * len(content) // total_length for path, content, _ in batch}
+        answer = await self.async_kernel.answer(question)
+        if is_failed_answer(answer):
+            for file_path, _, _ in batch:
+                results[file_path] = (answer, -1, generations[file_path], None, shares[file_path])
+            return results
+        
+        sections = split_batch_answer(answer, len(batch))
+        missing = []
+        for index, (file_path, content, cache_key) in enumerate(batch, 1):
+            file_answer = sections.get(index)
+            if file_answer is None:
+                missing.append((file_path, content, cache_key))
+                continue
+            problem_count = parse_problem_count(file_answer)
+            if cache_key is not None and problem_count >= 0:
+                self.review_cache.put(cache_key, file_answer, problem_count, model)
+            self.report_problems(file_path, problem_count)
+            results[file_path] = (file_answer, problem_count, generations[file_path], content, shares[file_path])
+        
+        # 回答中缺失的文件单独重新review
+        if missing:
+            logging.info(f"合并review的回答缺少 {len(missing)} 个文件, 单独review")
+            answers = await asyncio.gather(*(self.review_full(file_path, content, generations[file_path], cache_key)
+                                             for file_path, content, cache_key in missing))
+            for (file_path, _, _), result in zip(missing, answers):
+                # 合并请求中的份额也计入
+                results[file_path] = result[:4] + (result[4] + shares[file_path],)
+        return results
+    
+    async def analyze_chunks(self, content, file_path, generation):
+        """
+        大文件按函数/声明边界切分后并行review, 再合并各分段结果
+        并行度受 Kernel 连接池大小限制, 耗时取决于分段大小而不是文件大小
+        :return: (answer, problem_count, complete, prompt_tokens)
+        """
+        chunks = split_content(content, file_path, self.config.chunk_config.max_lines)
+        file_name = os.path.basename(file_path)
+        logging.info(f"文件较大, 分为 {len(chunks)} 段review: {file_path}")
+        answers = [None] * len(chunks)
+        prompt_tokens = [0] * len(chunks)
+        
+        async def review_chunk(index, chunk):
+            question = build_chunk_question(chunk, index + 1, len(chunks), file_name, self.config.check_type_list)
+            prompt_tokens[index] = estimate_tokens(question)
+            answers[index] = await self.async_kernel.answer(question)
+            # 每完成一个分段就把已有结果推送给观察者
+            finished = [(c, a) for c, a in zip(chunks, answers) if a is not None]
+            partial, _, _ = merge_chunk_answers([c for c, _ in finished], [a for _, a in finished])
+            self.scheduler.emit("partial", file_path, (partial, None, generation))
+        
+        await asyncio.gather(*(review_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+        return merge_chunk_answers(chunks, answers) + (sum(prompt_tokens),)
+    
+    def report_problems(self, file_path, problem_count):
+        """发现问题时上报统计（只入队, 由后台线程批量发送）"""
+        if problem_count > 0 and self.telemetry is not None:
+            self.telemetry.report(self.config.name, file_path, problem_count)
+    
+    async def analyze_content(self, question, file_path, generation):
+        """调用异步Kernel分析内容, 任务被取消时请求会立即中断"""
+        # 非流式模式
+        if not self.config.fast_gtp_config.stream:
+            return await self.async_kernel.answer(question)
+        
+        # 流式模式: 边接收边推送给观察者
+        start = time.time()
+        progress = {"ttft": None, "last_push": 0.0}
+        
+        def on_delta(delta, text):
+            now = time.time()
+            if progress["ttft"] is None:
+                progress["ttft"] = now - start
+            # 限制刷新频率, 避免宿主线程处理过多事件
+            if now - progress["last_push"] >= 0.1:
+                progress["last_push"] = now
+                self.scheduler.emit("partial", file_path, (text, progress["ttft"], generation))
+        
+        answer = await self.async_kernel.answer_stream(question, on_delta)
+        if progress["ttft"] is not None:
+            self.scheduler.emit("ttft", file_path, progress["ttft"])
+        return answer
@@ -0,0 +1,117 @@
+import re
+import bisect
+from array import array
+
+
+def index_lines(data) -> array:
+    """建立行首偏移索引, data 为 str 或 bytes/mmap"""
+    newline = "\n" if isinstance(data, str) else b"\n"
+    starts = array("Q", [0])
+    find = data.find
+    position = find(newline)
+    while position >= 0:
+        starts.append(position + 1)
+        position = find(newline, position + 1)
+    return starts
+
+
+class FindEngine:
+    """
+    在整个文档的原始内容(str 或 bytes/mmap)上查找, 不依赖 Tk 文本组件
+
+    - 行首偏移索引只建立一次, 匹配位置按需转换为 (行, 列)
+    - search() 一次找出所有匹配(字面量或正则, 可选区分大小写和全词匹配), 保存为紧凑的偏移数组
+    - next()/prev() 在匹配之间移动, matches_between() 按偏移范围取出需要高亮的匹配
+    """
+
+    # 匹配数上限, 避免单个字符的查询占用过多内存
+    MAX_MATCHES = 1000000
+
+    def __init__(self, data, line_starts:array = None):
+        self.data = data
+        self.is_bytes = not isinstance(data, str)
+        self.line_starts = line_starts if line_starts is not None else index_lines(data)
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.current = -1
+        self.truncated = False
+        self.query = None  # (text, regex, case_sensitive, whole_word)
+
+    def search(self, text:str, regex:bool = False, case_sensitive:bool = False, whole_word:bool = False) -> int:
+        """
+        查找所有匹配, 正则表达式无效时抛出 re.error
+        :return: 匹配数
+        """
+        self.query = (text, regex, case_sensitive, whole_word)
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.current = -1
+        self.truncated = False
+        if not text:
+            return 0
+        pattern = text if regex else re.escape(text)
+        if whole_word:
+            pattern = r"\b(?:{})\b".format(pattern)
+        if self.is_bytes:
+            pattern = pattern.encode("utf-8")
+        compiled = re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+        starts, ends = self.starts, self.ends
+        for match in compiled.finditer(self.data):
+            start, end = match.span()
+            if start == end:
+                # 空匹配(如 ^ 或 a*)无法高亮, 跳过
+                continue
+            starts.append(start)
+            ends.append(end)
+            if len(starts) >= self.MAX_MATCHES:
+                self.truncated = True
+                break
+        return len(starts)
+
+    @property
+    def count(self) -> int:
+        return len(self.starts)
+
+    def match(self, index:int):
+        return self.starts[index], self.ends[index]
+
+    def seek(self, offset:int):
+        """把当前匹配设为 offset 之后的第一个匹配(到末尾时从头开始)"""
+        if not self.starts:
+            return None
+        self.current = bisect.bisect_left(self.starts, offset) % len(self.starts)
+        return self.match(self.current)
+
+    def next(self):
+        if not self.starts:
+            return None
+        self.current = (self.current + 1) % len(self.starts)
+        return self.match(self.current)
+
+    def prev(self):
+        if not self.starts:
+            return None
+        self.current = (self.current - 1) % len(self.starts) if self.current >= 0 else len(self.starts) - 1
+        return self.match(self.current)
+
+    def matches_between(self, start:int, end:int):
+        """偏移范围 [start, end) 内的匹配 [(start, end)]"""
+        first = bisect.bisect_left(self.starts, start)
+        last = bisect.bisect_left(self.starts, end)
+        return list(zip(self.starts[first:last], self.ends[first:last]))
+
+    def position(self, offset:int):
+        """偏移对应的 (行, 列), 均从 0 开始, 列按字符计算"""
+        line = bisect.bisect_right(self.line_starts, offset) - 1
+        line_start = self.line_starts[line]
+        if self.is_bytes:
+            return line, len(self.data[line_start:offset].decode("utf-8", errors="replace"))
+        return line, offset - line_start
+
+    def status_text(self) -> str:
+        if self.query is None or not self.query[0]:
+            return ""
+        if not self.starts:
+            return "无匹配"
+        total = "{}+".format(self.count) if self.truncated else str(self.count)
+        return "{}/{}".format(self.current + 1 if self.current >= 0 else 0, total)
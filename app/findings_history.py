@@ -0,0 +1,246 @@
+import hashlib
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_path(path:str) -> str:
+    """统一为绝对路径和 / 分隔符, 目录前缀查询按字符串范围扫描索引"""
+    return os.path.abspath(path).replace(os.sep, "/")
+
+
+def finding_fingerprint(title:str) -> str:
+    """问题标题去掉数字和空白后的哈希, 代码行号变化时同一个问题的指纹不变"""
+    normalized = re.sub(r"[\d\s]+", "", title or "").lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class FindingsHistory:
+    """
+    review历史数据库（SQLite, WAL 模式）
+
+    - reviews: 每次review一行, 记录文件、内容哈希、模型、时间、耗时、估算的 token 数和问题数
+    - findings: 从回答中拆分出的每个问题, 冗余保存文件路径和时间, 查询时不需要关联 reviews
+    - is_latest 标记每个文件最近一次review, 其中的问题即为"未解决"的问题;
+      previous_count 保存上一次review的问题数, 用于查询问题数上升的文件
+    - 按文件路径和时间建立索引, 目录前缀查询转换为路径的范围扫描
+    - 与 JobJournal 相同, 调用方只把记录放入队列, 由后台线程批量写入
+    """
+
+    # 单个事务最多合并的记录数
+    MAX_BATCH = 200
+
+    def __init__(self, path:str = "findings_history.db", flush_interval:float = 0.5, max_age_days:float = 365):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                id INTEGER PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                model TEXT,
+                reviewed_at REAL NOT NULL,
+                latency REAL,
+                prompt_tokens INTEGER,
+                answer_tokens INTEGER,
+                problem_count INTEGER NOT NULL,
+                previous_count INTEGER NOT NULL DEFAULT -1,
+                is_latest INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_reviews_path_time ON reviews(file_path, reviewed_at);
+            CREATE INDEX IF NOT EXISTS idx_reviews_time ON reviews(reviewed_at);
+            CREATE INDEX IF NOT EXISTS idx_reviews_latest ON reviews(file_path) WHERE is_latest = 1;
+            CREATE TABLE IF NOT EXISTS findings (
+                id INTEGER PRIMARY KEY,
+                review_id INTEGER NOT NULL,
+                file_path TEXT NOT NULL,
+                reviewed_at REAL NOT NULL,
+                finding_index INTEGER NOT NULL,
+                line INTEGER,
+                title TEXT NOT NULL,
+                body TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                is_latest INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_findings_path_time ON findings(file_path, reviewed_at);
+            CREATE INDEX IF NOT EXISTS idx_findings_time ON findings(reviewed_at);
+            CREATE INDEX IF NOT EXISTS idx_findings_review ON findings(review_id);
+            CREATE INDEX IF NOT EXISTS idx_findings_open ON findings(file_path) WHERE is_latest = 1;
+        """)
+        self._prune()
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="findings-history")
+        self._writer.start()
+
+    # ---------- 写入（任意线程可调用, 只入队不等待写入） ----------
+
+    def record(self, file_path:str, content_hash:str, model:str, problem_count:int, findings:list,
+               latency:float = None, prompt_tokens:int = None, answer_tokens:int = None, reviewed_at:float = None):
+        """
+        记录一次完成的review
+        :param findings: parse_findings() 的结果
+        """
+        self._queue.put(("record", (normalize_path(file_path), content_hash, model,
+                                    reviewed_at if reviewed_at is not None else time.time(),
+                                    latency, prompt_tokens, answer_tokens, problem_count, findings)))
+
+    def flush(self, timeout:float = 5):
+        """等待已入队的记录全部写入"""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout:float = 5):
+        if self._writer is None:
+            return
+        self._queue.put(("close", None))
+        self._writer.join(timeout)
+        self._writer = None
+        self._conn.close()
+
+    # ---------- 查询 ----------
+
+    def open_findings(self, under:str = None, since:float = None, until:float = None, limit:int = 1000) -> list:
+        """
+        各文件最近一次review中的问题
+        :param under: 只查询该目录(含子目录)下的文件
+        :param since/until: 按review时间过滤(时间戳)
+        :return: [{"file_path", "reviewed_at", "index", "line", "title", "fingerprint"}]
+        """
+        sql = ("SELECT file_path, reviewed_at, finding_index, line, title, fingerprint FROM findings "
+               "WHERE is_latest = 1")
+        sql, args = self._filters(sql, [], under, since, until)
+        sql += " ORDER BY file_path, finding_index LIMIT ?"
+        rows = self._query(sql, args + [limit])
+        return [{"file_path": r[0], "reviewed_at": r[1], "index": r[2], "line": r[3], "title": r[4],
+                 "fingerprint": r[5]} for r in rows]
+
+    def regressions(self, under:str = None, since:float = None, until:float = None, limit:int = 1000) -> list:
+        """
+        最近一次review的问题数比上一次多的文件
+        :return: [{"file_path", "reviewed_at", "previous_count", "problem_count"}]
+        """
+        sql = ("SELECT file_path, reviewed_at, previous_count, problem_count FROM reviews "
+               "WHERE is_latest = 1 AND previous_count >= 0 AND problem_count > previous_count")
+        sql, args = self._filters(sql, [], under, since, until)
+        sql += " ORDER BY problem_count - previous_count DESC LIMIT ?"
+        rows = self._query(sql, args + [limit])
+        return [{"file_path": r[0], "reviewed_at": r[1], "previous_count": r[2], "problem_count": r[3]}
+                for r in rows]
+
+    def file_history(self, file_path:str, since:float = None, until:float = None, limit:int = 100) -> list:
+        """单个文件的review记录, 最新的在前"""
+        sql = ("SELECT reviewed_at, content_hash, model, latency, prompt_tokens, answer_tokens, problem_count "
+               "FROM reviews WHERE file_path = ?")
+        sql, args = self._filters(sql, [normalize_path(file_path)], None, since, until)
+        sql += " ORDER BY reviewed_at DESC LIMIT ?"
+        rows = self._query(sql, args + [limit])
+        keys = ("reviewed_at", "content_hash", "model", "latency", "prompt_tokens", "answer_tokens", "problem_count")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def summary(self, under:str = None, since:float = None, until:float = None) -> dict:
+        """时间范围内的review次数、发现的问题总数、平均耗时和估算的 token 总数"""
+        sql = ("SELECT COUNT(*), COALESCE(SUM(problem_count), 0), AVG(latency), "
+               "COALESCE(SUM(prompt_tokens), 0) + COALESCE(SUM(answer_tokens), 0) FROM reviews WHERE problem_count >= 0")
+        sql, args = self._filters(sql, [], under, since, until)
+        row = self._query(sql, args)[0]
+        return {"reviews": row[0], "problems": row[1], "avg_latency": row[2] or 0.0, "tokens": row[3]}
+
+    @staticmethod
+    def _filters(sql:str, args:list, under:str, since:float, until:float):
+        if under:
+            prefix = normalize_path(under).rstrip("/") + "/"
+            # 路径前缀转换为范围条件, 可以使用 file_path 索引
+            sql += " AND file_path >= ? AND file_path < ?"
+            args += [prefix, prefix[:-1] + chr(ord("/") + 1)]
+        if since is not None:
+            sql += " AND reviewed_at >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND reviewed_at < ?"
+            args.append(until)
+        return sql, args
+
+    def _query(self, sql:str, args:list) -> list:
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    # ---------- 后台写入线程 ----------
+
+    def _prune(self):
+        """删除过期的历史记录, 每个文件最近一次的review始终保留"""
+        cutoff = time.time() - self.max_age_seconds
+        self._conn.execute("DELETE FROM findings WHERE reviewed_at < ? AND is_latest = 0", (cutoff,))
+        self._conn.execute("DELETE FROM reviews WHERE reviewed_at < ? AND is_latest = 0", (cutoff,))
+
+    def _write_loop(self):
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.MAX_BATCH and batch[-1][0] == "record":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            closing = self._write_batch(batch)
+
+    def _write_batch(self, batch:list) -> bool:
+        closing = False
+        waiters = []
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                for op, args in batch:
+                    if op == "record":
+                        self._insert(*args)
+                    elif op == "flush":
+                        waiters.append(args)
+                    elif op == "close":
+                        closing = True
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logging.error(f"写入review历史失败: {e}")
+                try:
+                    self._conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+        for waiter in waiters:
+            waiter.set()
+        return closing
+
+    def _insert(self, file_path, content_hash, model, reviewed_at, latency, prompt_tokens, answer_tokens,
+                problem_count, findings):
+        row = self._conn.execute("SELECT id, problem_count FROM reviews WHERE file_path = ? AND is_latest = 1",
+                                 (file_path,)).fetchone()
+        previous_count = -1
+        if row is not None:
+            previous_count = row[1]
+            self._conn.execute("UPDATE reviews SET is_latest = 0 WHERE id = ?", (row[0],))
+            self._conn.execute("UPDATE findings SET is_latest = 0 WHERE review_id = ?", (row[0],))
+        review_id = self._conn.execute(
+            "INSERT INTO reviews (file_path, content_hash, model, reviewed_at, latency, prompt_tokens, answer_tokens, "
+            "problem_count, previous_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (file_path, content_hash, model, reviewed_at, latency, prompt_tokens, answer_tokens, problem_count,
+             previous_count)).lastrowid
+        self._conn.executemany(
+            "INSERT INTO findings (review_id, file_path, reviewed_at, finding_index, line, title, body, fingerprint) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(review_id, file_path, reviewed_at, f["index"], f["line"], f["title"], f["body"],
+              finding_fingerprint(f["title"])) for f in findings])
@@ -0,0 +1,191 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+class JobJournal:
+    """
+    分析任务日志（SQLite, WAL 模式）, 重启或崩溃后恢复分析记录
+
+    - 每个文件一行, 记录最近一次提交的内容哈希、状态和分析结果, seq 为提交顺序;
+      不保存文件内容, 恢复时重新读取文件并与内容哈希比较
+    - 调用方只把操作放入队列, 由后台线程合并为一个事务批量写入, 不阻塞调度和UI
+    - 重启后 load() 按提交顺序返回所有记录, 由 AnalysisEngine 恢复结果并重新排队未完成的任务
+    """
+
+    # 单个事务最多合并的操作数
+    MAX_BATCH = 500
+
+    def __init__(self, path:str = "review_journal.db", flush_interval:float = 0.5, max_age_days:float = 7):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._queue = queue.SimpleQueue()  # (操作, 参数)
+        self._writes = 0
+        self._batches = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                file_path TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                answer TEXT,
+                problem_count INTEGER NOT NULL DEFAULT -1,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if "content" in columns:
+            # 旧版本的日志保存了文件内容, 去掉该列
+            self._conn.executescript("""
+                BEGIN;
+                CREATE TABLE jobs_new (
+                    file_path TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    answer TEXT,
+                    problem_count INTEGER NOT NULL DEFAULT -1,
+                    updated_at REAL NOT NULL
+                );
+                INSERT INTO jobs_new SELECT file_path, seq, content_hash, status, answer, problem_count, updated_at
+                    FROM jobs;
+                DROP TABLE jobs;
+                ALTER TABLE jobs_new RENAME TO jobs;
+                COMMIT;
+            """)
+            self._conn.execute("VACUUM")
+        # 过期的已完成记录直接删除, 未完成的任务始终保留
+        self._conn.execute("DELETE FROM jobs WHERE answer IS NOT NULL AND updated_at < ?",
+                           (time.time() - self.max_age_seconds,))
+        self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM jobs").fetchone()[0]
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="job-journal")
+        self._writer.start()
+
+    # ---------- 记录操作（任意线程可调用, 只入队不等待写入） ----------
+
+    def enqueue(self, file_path:str, content_hash:str):
+        """文件提交分析(新文件或内容变化), 之前的结果作废"""
+        self._seq += 1
+        self._queue.put(("enqueue", (file_path, self._seq, content_hash, time.time())))
+
+    def set_status(self, file_path:str, status:str):
+        self._queue.put(("status", (status, time.time(), file_path)))
+
+    def set_result(self, file_path:str, status:str, answer:str, problem_count:int):
+        """分析完成/失败"""
+        self._queue.put(("result", (status, answer, problem_count, time.time(), file_path)))
+
+    def remove(self, file_path:str):
+        self._queue.put(("remove", (file_path,)))
+
+    def clear(self):
+        self._queue.put(("clear", ()))
+
+    def flush(self, timeout:float = 5):
+        """等待已入队的操作全部写入"""
+        done = threading.Event()
+        self._queue.put(("flush", (done,)))
+        return done.wait(timeout)
+
+    def close(self, timeout:float = 5):
+        """写入剩余的操作后关闭数据库"""
+        if self._writer is None:
+            return
+        self._queue.put(("close", ()))
+        self._writer.join(timeout)
+        self._writer = None
+        self._conn.close()
+
+    # ---------- 读取（启动时调用） ----------
+
+    def load(self) -> list:
+        """
+        按提交顺序返回所有记录
+        :return: [(file_path, content_hash, status, answer, problem_count)]
+        """
+        self.flush()
+        return self._conn.execute(
+            "SELECT file_path, content_hash, status, answer, problem_count FROM jobs ORDER BY seq"
+        ).fetchall()
+
+    def stats(self) -> dict:
+        """
+        获取写入统计信息（用于监控）
+
+        Returns:
+            dict: 写入的操作数、事务数和平均每个事务合并的操作数
+        """
+        return {
+            'writes': self._writes,
+            'batches': self._batches,
+            'writes_per_batch': self._writes / self._batches if self._batches else 0.0,
+        }
+
+    # ---------- 后台写入线程 ----------
+
+    def _write_loop(self):
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            # 第一个操作到达后最多再等待 flush_interval 秒, 把期间的操作合并到一个事务
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.MAX_BATCH and batch[-1][0] not in ("flush", "close"):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            closing = self._write_batch(batch)
+
+    def _write_batch(self, batch:list) -> bool:
+        """在一个事务中执行一批操作, 返回是否收到关闭请求"""
+        closing = False
+        waiters = []
+        try:
+            self._conn.execute("BEGIN")
+            for op, args in batch:
+                if op == "enqueue":
+                    self._conn.execute(
+                        "INSERT INTO jobs (file_path, seq, content_hash, status, answer, problem_count, updated_at) "
+                        "VALUES (?, ?, ?, '等待分析', NULL, -1, ?) "
+                        "ON CONFLICT(file_path) DO UPDATE SET seq = excluded.seq, content_hash = excluded.content_hash, "
+                        "status = excluded.status, answer = NULL, problem_count = -1, "
+                        "updated_at = excluded.updated_at", args)
+                elif op == "status":
+                    self._conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE file_path = ?", args)
+                elif op == "result":
+                    self._conn.execute("UPDATE jobs SET status = ?, answer = ?, problem_count = ?, updated_at = ? "
+                                       "WHERE file_path = ?", args)
+                elif op == "remove":
+                    self._conn.execute("DELETE FROM jobs WHERE file_path = ?", args)
+                elif op == "clear":
+                    self._conn.execute("DELETE FROM jobs")
+                elif op == "flush":
+                    waiters.append(args[0])
+                elif op == "close":
+                    closing = True
+            self._conn.execute("COMMIT")
+            self._writes += len(batch) - len(waiters) - int(closing)
+            self._batches += 1
+        except sqlite3.Error as e:
+            logging.error(f"写入任务日志失败: {e}")
+            try:
+                self._conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+        for waiter in waiters:
+            waiter.set()
+        return closing
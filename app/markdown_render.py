@@ -0,0 +1,89 @@
+import re
+
+
+HEADING_PATTERN = re.compile(r"(#{1,5})\s+(.*)")
+LIST_PATTERN = re.compile(r"\s*(?:[-*+]|\d+\.)\s")
+# 行内样式: **加粗**, *斜体*, `代码`
+INLINE_PATTERN = re.compile(r"\*\*(?P<bold>.+?)\*\*|(?<![\w*])\*(?P<italic>[^\s*](?:.*?[^\s*])?)\*(?![\w*])"
+                            r"|`(?P<code>[^`]+)`")
+
+
+class RenderedMarkdown:
+    """
+    Markdown 渲染结果: 去掉标记符号后的纯文本, 以及每个样式标签对应的 Tk 文本索引
+
+    spans 为 {tag: [start1, end1, start2, end2, ...]}, 可直接展开传给 text_widget.tag_add
+    """
+
+    __slots__ = ("text", "spans")
+
+    def __init__(self, text:str, spans:dict):
+        self.text = text
+        self.spans = spans
+
+    def size(self) -> int:
+        """估算占用的内存(字节)"""
+        return len(self.text) + sum(len(indices) for indices in self.spans.values()) * 16
+
+
+def render_markdown(content:str) -> RenderedMarkdown:
+    """
+    逐行解析一次 Markdown, 不依赖 Tk, 可在后台线程中执行
+
+    支持标题(h1~h5)、代码块、引用、列表以及行内的加粗/斜体/代码
+    """
+    lines = []
+    spans = {}
+    in_code = False
+    for line in (content or "").split("\n"):
+        if line.lstrip().startswith("```"):
+            # 代码块的起止行不显示
+            in_code = not in_code
+            continue
+        line_number = len(lines) + 1
+        if in_code:
+            lines.append(line)
+            _add_span(spans, "code", line_number, 0, len(line))
+            continue
+
+        tag = None
+        match = HEADING_PATTERN.match(line)
+        if match:
+            tag = "h{}".format(len(match.group(1)))
+            line = match.group(2)
+        elif line.startswith(">"):
+            tag = "blockquote"
+            line = line[1:].lstrip()
+        elif LIST_PATTERN.match(line):
+            tag = "list"
+
+        text = _render_inline(line, line_number, spans)
+        if tag is not None:
+            _add_span(spans, tag, line_number, 0, len(text))
+        lines.append(text)
+    return RenderedMarkdown("\n".join(lines), spans)
+
+
+def _render_inline(line:str, line_number:int, spans:dict) -> str:
+    if "*" not in line and "`" not in line:
+        return line
+    parts = []
+    column = 0
+    position = 0
+    for match in INLINE_PATTERN.finditer(line):
+        before = line[position:match.start()]
+        parts.append(before)
+        column += len(before)
+        tag = match.lastgroup
+        text = match.group(tag)
+        parts.append(text)
+        _add_span(spans, tag, line_number, column, column + len(text))
+        column += len(text)
+        position = match.end()
+    parts.append(line[position:])
+    return "".join(parts)
+
+
+def _add_span(spans:dict, tag:str, line_number:int, start:int, end:int):
+    if end > start:
+        spans.setdefault(tag, []).extend(("{}.{}".format(line_number, start), "{}.{}".format(line_number, end)))
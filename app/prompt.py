@@ -0,0 +1,238 @@
+import re
+import time
+
+from ai.kernel import FAILED_ANSWER_PREFIX, CANCELLED_ANSWER_PREFIX
+from monitor.metrics import get_metrics
+
+check_options_map = {
+    1: "功能性缺陷（逻辑错误、边界条件未处理、计算错误）",
+    2: "可靠性缺陷（未处理异常、资源泄露、竞态条件）",
+    3: "安全性缺陷 (SQL 注入、命令注入、硬编码密钥等）",
+    4: "可维护性缺陷（拼写错误、魔法数字、重复代码）",
+    5: "性能缺陷（不必要的循环、未优化的数据结构）"
+}
+
+# 提示词模板版本, 修改 REVIEW_PROMPT 或回答格式时需要递增, 使旧的缓存结果失效
+PROMPT_VERSION = 1
+
+REVIEW_PROMPT = """
+                    请帮我review这段代码, 找出的明显代码缺陷(不用跨文件分析,只对当前代码进行分析)
+                    重点:
+                        {}
+                    要求:
+                        - 仅分析当前代码，不考虑调用外部函数会产生的问题  
+                        - 只针对真实且有显著影响的问题 
+                        - 允许回答“没有明显问题”
+                        - 不要编造或过度推测潜在风险
+                        - 不要对函数的参数过渡判断, 尤其是项目内部的函数的出入参
+                        - 不要对函数的返参(除err以外)未处理参数为nil的情况进行判断
+                        - 不要考虑数字类型溢出的问题
+                        - 代码内常量的使用如在文件内没提供可能是在同目录下的其他文件内，不要过渡推测
+
+                    并严格按照下面的格式回答我：
+                    代码中存在X个明显的安全问题:
+                    然后按照顺序列出每个问题描述以及优化方案, 使用markdown格式。
+                    代码如下:
+                    ```
+                    {}
+                    ```
+                    """
+
+# 大文件分段review时附加在提示词前的说明
+CHUNK_NOTE = """
+                    以下代码是文件 {} 的第 {}/{} 段(第 {}-{} 行), 其余部分会单独review:
+                        - 片段之外定义的函数、类型、变量和导入视为存在, 不要因为片段不完整而报告问题
+                        - 描述问题时请注明所在行号
+                    """
+
+# 增量review提示词: 只发送变更区域, 每行带有在完整文件中的行号
+DIFF_REVIEW_PROMPT = """
+                    请帮我review这段代码的本次修改, 找出的明显代码缺陷(不用跨文件分析,只对当前代码进行分析)
+                    重点:
+                        {}
+                    说明:
+                        - 下面是文件 {} 中本次修改的区域, 每行开头是该行在完整文件中的行号
+                        - 行号后带 + 的是新增或修改的行, 其余为上下文, "-|" 表示此处删除了代码
+                        - 区域之前的 "..." 上方是该区域所在的函数/类型签名
+                    要求:
+                        - 只分析新增或修改的行引入的问题, 上下文仅供参考
+                        - 片段之外定义的函数、类型、变量和导入视为存在, 不要因为片段不完整而报告问题
+                        - 只针对真实且有显著影响的问题
+                        - 允许回答“没有明显问题”
+                        - 不要编造或过度推测潜在风险
+                        - 描述问题时使用代码中标注的行号
+
+                    并严格按照下面的格式回答我：
+                    代码中存在X个明显的安全问题:
+                    然后按照顺序列出每个问题描述(注明行号)以及优化方案, 使用markdown格式。
+                    代码如下:
+                    ```
+                    {}
+                    ```
+                    """
+
+# 多个小文件合并到一个请求时的提示词, 每个文件的回答以分隔行开头, 便于拆分回各个文件
+BATCH_REVIEW_PROMPT = """
+                    请帮我分别review下面 {} 个文件的代码, 找出每个文件中明显的代码缺陷(不用跨文件分析,每个文件只对其自身代码进行分析)
+                    重点:
+                        {}
+                    要求:
+                        - 仅分析当前代码，不考虑调用外部函数会产生的问题
+                        - 只针对真实且有显著影响的问题
+                        - 允许回答“没有明显问题”
+                        - 不要编造或过度推测潜在风险
+                        - 不要对函数的参数过渡判断, 尤其是项目内部的函数的出入参
+                        - 不要考虑数字类型溢出的问题
+                        - 代码内常量的使用如在文件内没提供可能是在同目录下的其他文件内，不要过渡推测
+
+                    并严格按照下面的格式依次回答每个文件, 不要遗漏任何文件：
+                    ===== FILE 序号 =====
+                    代码中存在X个明显的安全问题:
+                    然后按照顺序列出该文件每个问题描述以及优化方案, 使用markdown格式。
+                    文件如下:
+                    {}
+                    """
+
+BATCH_FILE_TEMPLATE = """
+                    ===== FILE {}: {} =====
+                    ```
+                    {}
+                    ```
+                    """
+
+BATCH_ANSWER_SEPARATOR = re.compile(r"^[ \t>#*]*=+\s*FILE\s*(\d+)\b[^\n]*$", re.MULTILINE)
+
+# 回答开头的问题数量, 如 "代码中存在2个明显的安全问题"
+PROBLEM_COUNT_PATTERN = re.compile(r"代码中存在\s*(\d+)\s*个")
+
+# 每个问题的标题行, 如 "### 1. xxx" / "**问题2：xxx**" / "3、xxx"
+FINDING_HEADER_PATTERN = re.compile(r"^(?P<marker>[ \t>]*(?:#+|\*\*|[-*])?)[ \t]*(?:问题\s*)?(?P<index>\d+)\s*[.、:：)）]"
+                                    r"(?!\d)\s*(?P<title>[^\n]*)$", re.MULTILINE)
+
+# 回答中的行号, 如 "第 12 行" / "line 12"
+LINE_NUMBER_PATTERN = re.compile(r"(?:第\s*(\d+)\s*行|[Ll]ine\s*(\d+))")
+
+# Kernel 在请求失败或被取消时返回的提示前缀, 这类回答不是真正的review结果
+FAILED_ANSWER_PREFIXES = (FAILED_ANSWER_PREFIX, CANCELLED_ANSWER_PREFIX)
+
+# 解析回答的耗时
+_parse_timer = get_metrics().stage("answer_parse")
+
+
+def build_focus(check_type_list) -> str:
+    """根据检查类型配置生成提示词中的"重点"部分, 未配置时检查全部类型"""
+    focus = ""
+    num = 1
+    for ct in (check_type_list or check_options_map):
+        if ct in check_options_map:
+            focus += "{}. {}\n".format(num, check_options_map[ct])
+            num += 1
+    return focus
+
+
+def build_question(content:str, check_type_list) -> str:
+    """构造review提示词"""
+    return REVIEW_PROMPT.format(build_focus(check_type_list), content)
+
+
+def build_chunk_question(chunk, index:int, total:int, file_name:str, check_type_list) -> str:
+    """构造大文件单个分段的review提示词, index 从 1 开始"""
+    note = CHUNK_NOTE.format(file_name, index, total, chunk.start_line, chunk.end_line)
+    return note + build_question(chunk.text, check_type_list)
+
+
+def chunk_prompt_version(max_lines:int) -> str:
+    """分段review的结果与分段大小有关, 作为缓存 key 中的提示词版本"""
+    return "{}/chunk{}".format(PROMPT_VERSION, max_lines)
+
+
+def build_diff_question(snippet_text:str, file_name:str, check_type_list) -> str:
+    """构造增量review提示词"""
+    return DIFF_REVIEW_PROMPT.format(build_focus(check_type_list), file_name, snippet_text)
+
+
+def diff_prompt_version() -> str:
+    """增量review的缓存 key 以变更片段为内容, 与全文review区分"""
+    return "{}/diff".format(PROMPT_VERSION)
+
+
+def build_batch_question(files:list, check_type_list) -> str:
+    """
+    构造多文件合并review提示词
+    :param files: [(文件名, 内容)], 回答中的序号从 1 开始
+    """
+    body = "".join(BATCH_FILE_TEMPLATE.format(i, name, content) for i, (name, content) in enumerate(files, 1))
+    return BATCH_REVIEW_PROMPT.format(len(files), build_focus(check_type_list), body)
+
+
+def split_batch_answer(answer:str, file_count:int) -> dict:
+    """
+    把合并请求的回答拆分回各个文件
+    :return: {序号(从 1 开始): 该文件的回答}, 回答中缺失的文件不在结果中
+    """
+    start = time.perf_counter()
+    sections = {}
+    matches = list(BATCH_ANSWER_SEPARATOR.finditer(answer or ""))
+    for i, match in enumerate(matches):
+        index = int(match.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(answer)
+        section = answer[match.end():end].strip()
+        if 1 <= index <= file_count and index not in sections and section:
+            sections[index] = section
+    _parse_timer.observe(time.perf_counter() - start)
+    return sections
+
+
+def parse_problem_count(answer:str) -> int:
+    """
+    解析回答中的问题数量
+    :return: 问题数量, 无法解析时返回 -1
+    """
+    start = time.perf_counter()
+    match = PROBLEM_COUNT_PATTERN.search(answer or "")
+    _parse_timer.observe(time.perf_counter() - start)
+    return int(match.group(1)) if match else -1
+
+
+def parse_findings(answer:str, problem_count:int = -1) -> list:
+    """
+    把回答拆分为逐个问题
+    优先使用带标题/加粗标记的编号行, 编号必须从 1 开始连续递增, 问题描述中的编号列表不会被当作新问题
+    :return: [{"index": 序号, "title": 标题, "line": 第一个行号或 None, "body": 该问题的完整内容}]
+    """
+    start = time.perf_counter()
+    answer = answer or ""
+    headers = list(FINDING_HEADER_PATTERN.finditer(answer))
+    marked = [m for m in headers if m.group("marker").strip(" \t>")[:1] == "#" or "**" in m.group("marker")]
+    candidates = marked or headers
+    selected = []
+    for match in candidates:
+        if int(match.group("index")) == len(selected) + 1:
+            selected.append(match)
+        if problem_count > 0 and len(selected) == problem_count:
+            break
+
+    findings = []
+    for i, match in enumerate(selected):
+        end = selected[i + 1].start() if i + 1 < len(selected) else len(answer)
+        body = answer[match.start():end].strip()
+        line = LINE_NUMBER_PATTERN.search(body)
+        findings.append({
+            "index": i + 1,
+            "title": match.group("title").replace("**", "").strip(" :：#"),
+            "line": int(line.group(1) or line.group(2)) if line else None,
+            "body": body,
+        })
+    _parse_timer.observe(time.perf_counter() - start)
+    return findings
+
+
+def is_failed_answer(answer:str) -> bool:
+    """判断回答是否为请求失败/取消时的提示信息"""
+    return not answer or answer.startswith(FAILED_ANSWER_PREFIXES)
+
+
+def normalize_content(content:str) -> str:
+    """规范化文件内容: 统一换行符, 去除行尾空白和末尾空行, 仅空白差异的内容视为相同"""
+    lines = content.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).rstrip("\n")
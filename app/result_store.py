@@ -0,0 +1,287 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+
+
+# 已结束分析的状态, 这些记录不再需要文件内容, 可以转存到磁盘
+FINISHED_STATUSES = ("分析完成", "分析失败", "已查看")
+
+
+def content_hash(content:str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _compress(text):
+    return None if text is None else zlib.compress(text.encode("utf-8"))
+
+
+def _decompress(data):
+    return None if data is None else zlib.decompress(data).decode("utf-8")
+
+
+class ReviewRecord:
+    """
+    单个文件的分析记录
+
+    - content 只在等待/进行分析时保存, 分析结束后只保留 content_hash
+    - answer 和 reviewed_content(增量review的基准) 压缩保存, 转存到磁盘后在访问时再加载
+    - rendered 缓存 answer 的 Markdown 渲染结果, answer 变化或转存时丢弃
+    """
+
+    __slots__ = ("path", "generation", "status", "content", "content_hash", "problem_count",
+                 "partial_answer", "ttft", "token_estimate", "answer_version", "_answer", "_reviewed",
+                 "_rendered", "_spilled", "_store")
+
+    def __init__(self, store, path:str, content:str, status:str):
+        self._store = store
+        self.path = path
+        self.generation = 0  # 内容版本号, 每次保存递增
+        self.status = status
+        self.content = content
+        self.content_hash = content_hash(content)
+        self.problem_count = -1
+        self.partial_answer = None  # 流式分析中已收到的内容
+        self.ttft = None  # 流式分析首字延迟
+        self.token_estimate = None  # (generation, 估算 token 数)
+        self.answer_version = 0  # answer 每次变化递增, 用于判断渲染结果是否过期
+        self._answer = None
+        self._reviewed = None
+        self._rendered = None  # (answer_version, RenderedMarkdown)
+        self._spilled = False
+
+    @property
+    def answer(self):
+        if self._spilled:
+            self._store.load(self)
+        return _decompress(self._answer)
+
+    @answer.setter
+    def answer(self, text):
+        if self._spilled:
+            self._store.load(self)
+        before = self.memory_size()
+        self._answer = _compress(text)
+        self._rendered = None
+        self.answer_version += 1
+        self._store.resize(self.memory_size() - before)
+
+    @property
+    def reviewed_content(self):
+        if self._spilled:
+            self._store.load(self)
+        return _decompress(self._reviewed)
+
+    @reviewed_content.setter
+    def reviewed_content(self, text):
+        if self._spilled:
+            self._store.load(self)
+        before = self.memory_size()
+        self._reviewed = _compress(text)
+        self._store.resize(self.memory_size() - before)
+
+    def rendered(self, version:int = None):
+        """获取渲染结果, 不存在或已过期时返回 None"""
+        if self._rendered is None or self._rendered[0] != (self.answer_version if version is None else version):
+            return None
+        return self._rendered[1]
+
+    def set_rendered(self, version:int, rendered):
+        """缓存 answer_version 版本的渲染结果, answer 已变化时忽略"""
+        if version != self.answer_version or self._spilled:
+            return
+        before = self.memory_size()
+        self._rendered = (version, rendered)
+        self._store.resize(self.memory_size() - before)
+
+    @property
+    def spilled(self) -> bool:
+        return self._spilled
+
+    def memory_size(self) -> int:
+        """内存中压缩数据和渲染缓存的大小"""
+        size = (len(self._answer) if self._answer else 0) + (len(self._reviewed) if self._reviewed else 0)
+        if self._rendered is not None:
+            size += self._rendered[1].size()
+        return size
+
+
+class ResultStore:
+    """
+    有内存上限的分析记录表, 接口与 {file_path: ReviewRecord} 的 dict 相同
+
+    - 按最近查看/更新的顺序排列, 压缩数据的总大小超过 memory_limit 时,
+      把最久未查看的已结束记录的 answer/reviewed_content 转存到磁盘(SQLite), 访问时再加载
+    - 记录的增删、转存和加载只在宿主线程中进行; 提交分析前用 ensure_loaded() 加载,
+      进行中的记录不会被转存, 调度器线程只读取记录和设置进行中记录的 partial_answer/ttft 等字段,
+      answer/reviewed_content 通过 done 事件回到宿主线程设置
+    - 磁盘文件只是本次运行的临时存储, 打开时清空
+    """
+
+    def __init__(self, memory_limit_mb:float = 64, spill_path:str = "review_spill.db"):
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.spill_path = spill_path
+        self._records = OrderedDict()  # {file_path: ReviewRecord}, 最近查看的在末尾
+        self._bytes = 0  # 内存中压缩数据的总大小
+        self._spills = 0
+        self._loads = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # ---------- dict 接口 ----------
+
+    def get(self, file_path, default=None):
+        return self._records.get(file_path, default)
+
+    def __getitem__(self, file_path):
+        return self._records[file_path]
+
+    def __contains__(self, file_path):
+        return file_path in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def values(self):
+        return self._records.values()
+
+    def items(self):
+        return self._records.items()
+
+    def pop(self, file_path, default=None):
+        record = self._records.pop(file_path, None)
+        if record is None:
+            return default
+        self.resize(-record.memory_size())
+        if record._spilled:
+            self._execute("DELETE FROM spill WHERE file_path = ?", (file_path,))
+        return record
+
+    def clear(self):
+        self._records.clear()
+        with self._lock:
+            self._bytes = 0
+        if self._conn is not None:
+            self._execute("DELETE FROM spill")
+
+    # ---------- 记录操作 ----------
+
+    def create(self, file_path:str, content:str, status:str) -> ReviewRecord:
+        record = ReviewRecord(self, file_path, content, status)
+        self._records[file_path] = record
+        return record
+
+    def touch(self, file_path):
+        """标记记录刚被查看或更新"""
+        if file_path in self._records:
+            self._records.move_to_end(file_path)
+
+    def resize(self, delta:int):
+        with self._lock:
+            self._bytes += delta
+
+    def enforce_limit(self):
+        """超过内存上限时, 从最久未查看的记录开始转存, 直到降到上限的 80%"""
+        if self.memory_limit <= 0 or self._bytes <= self.memory_limit:
+            return
+        target = self.memory_limit * 0.8
+        records = []
+        freed = 0
+        for record in self._records.values():
+            if self._bytes - freed <= target:
+                break
+            if record._spilled or record.status not in FINISHED_STATUSES:
+                continue
+            size = record.memory_size()
+            if size:
+                records.append(record)
+                freed += size
+        if not records or not self._executemany(
+                "INSERT OR REPLACE INTO spill (file_path, answer, reviewed) VALUES (?, ?, ?)",
+                [(record.path, record._answer, record._reviewed) for record in records]):
+            return
+        for record in records:
+            record._answer = record._reviewed = record._rendered = None
+            record._spilled = True
+        self.resize(-freed)
+        self._spills += len(records)
+        logging.info(f"分析记录超过内存上限, 转存 {len(records)} 条到磁盘")
+
+    def ensure_loaded(self, record:ReviewRecord):
+        """提交分析前(宿主线程)加载转存的记录, 之后调度器线程读取时不会再访问磁盘"""
+        if record._spilled:
+            self.load(record)
+
+    def load(self, record:ReviewRecord):
+        """从磁盘加载转存的记录"""
+        row = self._execute("SELECT answer, reviewed FROM spill WHERE file_path = ?", (record.path,), fetch=True)
+        answer, reviewed = row if row else (None, None)
+        record._answer, record._reviewed = answer, reviewed
+        record._spilled = False
+        self.resize(record.memory_size())
+        self._loads += 1
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.spill_path + suffix)
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        """
+        获取内存和转存统计信息（用于监控）
+
+        Returns:
+            dict: 记录数、内存中压缩数据大小、已转存的记录数、转存和加载次数
+        """
+        return {
+            'records': len(self._records),
+            'memory_bytes': self._bytes,
+            'spilled': sum(1 for record in self._records.values() if record._spilled),
+            'spills': self._spills,
+            'loads': self._loads,
+        }
+
+    # ---------- 磁盘存储 ----------
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.spill_path))
+            os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.spill_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute("DROP TABLE IF EXISTS spill")
+            self._conn.execute("CREATE TABLE spill (file_path TEXT PRIMARY KEY, answer BLOB, reviewed BLOB)")
+        return self._conn
+
+    def _execute(self, sql:str, args:tuple = (), fetch:bool = False):
+        with self._lock:
+            try:
+                cursor = self._connect().execute(sql, args)
+                return cursor.fetchone() if fetch else True
+            except sqlite3.Error as e:
+                logging.error(f"访问分析记录转存文件失败: {e}")
+                return None
+
+    def _executemany(self, sql:str, rows:list) -> bool:
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("BEGIN")
+                conn.executemany(sql, rows)
+                conn.execute("COMMIT")
+                return True
+            except sqlite3.Error as e:
+                logging.error(f"写入分析记录转存文件失败: {e}")
+                return False
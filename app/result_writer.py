@@ -0,0 +1,63 @@
+import os
+import re
+import json
+import time
+import logging
+
+
+class ResultWriter:
+    """
+    把分析结果写入磁盘的引擎观察者, 供无界面的守护进程使用
+
+    - 每个文件的最新结果写入 output_dir 下的一个 Markdown 文件(文件名由源文件路径转换而来)
+    - 每次分析完成/失败追加一行到 results.jsonl, 便于其他工具汇总
+    """
+
+    def __init__(self, engine, output_dir:str, base_dir:str = None):
+        self.engine = engine
+        self.output_dir = output_dir
+        self.base_dir = base_dir  # 监控目录, 结果文件名使用相对于它的路径
+        os.makedirs(output_dir, exist_ok=True)
+        self.log_path = os.path.join(output_dir, "results.jsonl")
+
+    def __call__(self, kind, file_path, data):
+        if kind != "status":
+            return
+        status, problem_count = data
+        if status not in ("分析完成", "分析失败"):
+            return
+        record = self.engine.file_analysis.get(file_path)
+        if record is None:
+            return
+        answer = record.answer or ""
+        try:
+            report_path = os.path.join(self.output_dir, self.report_name(file_path, self.base_dir))
+            with open(report_path, "w", encoding="utf-8") as f:
+                f.write("# {}\n\n{}\n".format(file_path, answer))
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "file": file_path,
+                    "status": status,
+                    "problem_count": problem_count,
+                    "report": report_path,
+                }, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logging.error(f"写入分析结果失败: {file_path}, {e}")
+            return
+        logging.info(f"{status}: {file_path}, 问题数: {problem_count}")
+
+    @staticmethod
+    def report_name(file_path:str, base_dir:str = None) -> str:
+        """源文件路径转换为结果文件名, 例如 src/app/main.py -> src_app_main.py.md"""
+        path = os.path.abspath(file_path)
+        if base_dir:
+            try:
+                relative = os.path.relpath(path, os.path.abspath(base_dir))
+            except ValueError:
+                # Windows: 不在同一个盘符
+                relative = os.pardir
+            if not relative.startswith(os.pardir):
+                path = relative
+        name = re.sub(r"[^\w.-]+", "_", path).strip("_")
+        return (name or "file") + ".md"
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from app.prompt import normalize_content
+
+
+class ReviewCache:
+    """
+    基于内容寻址的持久化review缓存（SQLite, WAL 模式）
+
+    - key 为 规范化后的文件内容 + 检查类型 + 提示词版本 + 模型 的哈希, 内容相同的保存直接复用结果
+    - 按最近访问时间做 LRU 淘汰, 同时限制条目数、总大小和最长保存时间
+    - 记录命中/未命中次数, 供状态栏展示
+    """
+
+    # 每写入多少条执行一次淘汰, 避免每次写入都扫描整表
+    EVICT_INTERVAL = 50
+
+    def __init__(self, path:str = "review_cache.db", max_entries:int = 5000, max_size_mb:float = 200,
+                 max_age_days:float = 30):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._puts_since_evict = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS review_cache (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                problem_count INTEGER NOT NULL,
+                model TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_review_cache_last_access ON review_cache(last_access)")
+        self.evict()
+
+    @staticmethod
+    def make_key(content:str, focus:str, prompt_version, model:str) -> str:
+        """计算缓存 key"""
+        digest = hashlib.sha256()
+        for part in (normalize_content(content), focus, str(prompt_version), model or ""):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key:str):
+        """
+        查询缓存
+        :return: (answer, problem_count), 未命中或已过期返回 None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, problem_count, created_at FROM review_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[2] > self.max_age_seconds:
+                self._misses += 1
+                return None
+            self._conn.execute("UPDATE review_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._hits += 1
+            return row[0], row[1]
+
+    def put(self, key:str, answer:str, problem_count:int, model:str = ""):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO review_cache (key, answer, problem_count, model, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, answer, problem_count, model, len(answer.encode("utf-8")), now, now))
+            self._puts_since_evict += 1
+            need_evict = self._puts_since_evict >= self.EVICT_INTERVAL
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        """淘汰过期条目, 再按最近访问时间淘汰超出条目数/总大小限制的条目"""
+        with self._lock:
+            self._puts_since_evict = 0
+            try:
+                self._conn.execute("DELETE FROM review_cache WHERE created_at < ?",
+                                   (time.time() - self.max_age_seconds,))
+                count, total_size = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM review_cache").fetchone()
+                if count <= self.max_entries and total_size <= self.max_size_bytes:
+                    return
+                # 从最久未访问的条目开始删除, 直到满足限制
+                removed_keys = []
+                rows = self._conn.execute("SELECT key, size FROM review_cache ORDER BY last_access").fetchall()
+                for key, size in rows:
+                    if count <= self.max_entries and total_size <= self.max_size_bytes:
+                        break
+                    removed_keys.append((key,))
+                    count -= 1
+                    total_size -= size
+                self._conn.executemany("DELETE FROM review_cache WHERE key = ?", removed_keys)
+                logging.info(f"review缓存淘汰 {len(removed_keys)} 条")
+            except sqlite3.Error as e:
+                logging.error(f"review缓存淘汰失败: {e}")
+
+    def hit_counts(self) -> tuple:
+        """返回 (命中次数, 未命中次数), 不访问数据库"""
+        return self._hits, self._misses
+
+    def stats(self) -> dict:
+        """
+        获取缓存统计信息（用于监控）
+
+        Returns:
+            dict: 缓存状态信息
+        """
+        with self._lock:
+            count, total_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM review_cache").fetchone()
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'entries': count,
+                'size_bytes': total_size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM review_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,511 @@
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+from monitor.metrics import get_metrics
+
+
+class FifoPolicy:
+    """按提交顺序派发任务, boost 的任务排到最前面(最近 boost 的最先派发)"""
+
+    def __init__(self):
+        self._front = OrderedDict()  # boost 的任务 {key: None}, 最近 boost 的在末尾
+
+    def select(self, pending:OrderedDict, saved_at:dict, now:float):
+        """
+        从等待中的任务里选出下一个要执行的任务（在事件循环线程中调用）
+        :param pending: {key: 进入队列的时间}, 按提交顺序排列
+        :param saved_at: {key: 最近一次提交(保存)的时间}
+        """
+        for key in reversed(self._front):
+            if key in pending:
+                return key
+        return next(iter(pending))
+
+    def add(self, key, queued_at:float, saved_at:float):
+        """任务进入等待队列, 或等待中的任务内容/保存时间已更新"""
+        pass
+
+    def boost(self, key):
+        self._front[key] = None
+        self._front.move_to_end(key)
+
+    def forget(self, key):
+        """任务已派发或取消"""
+        self._front.pop(key, None)
+
+
+class PriorityPolicy(FifoPolicy):
+    """
+    按优先级派发任务, 分数越小越先执行:
+
+        分数 = 估算 token 数 / 1000 * size_weight       (短任务优先)
+             - recency_bonus * exp(-保存后经过的秒数 / recency_decay)   (刚保存的文件优先, 用户正在等结果)
+             - 等待秒数 * aging_rate                     (老化: 等待越久越优先, 大文件不会一直被插队)
+             - boost_bonus (用户点击"立即review")
+
+    cost(key) 返回任务的估算 token 数, 无法估算时返回 None(按 0 处理)
+
+    除了"刚保存"一项, 各任务分数之间的差值不随时间变化(老化项对所有任务相同), 因此按
+    token 数、进入队列的时间和 boost 计算的固定部分放在堆中, 选择时只对堆顶附近
+    (刚保存的加分仍可能使其胜出)的任务计算完整分数, 不再每次对所有等待中的任务重新打分
+    """
+
+    def __init__(self, cost, size_weight:float = 1.0, aging_rate:float = 0.1, recency_bonus:float = 2.0,
+                 recency_decay:float = 30.0, boost_bonus:float = 1000.0):
+        self.cost = cost
+        self.size_weight = size_weight
+        self.aging_rate = aging_rate
+        self.recency_bonus = recency_bonus
+        self.recency_decay = recency_decay
+        self.boost_bonus = boost_bonus
+        self._boosted = set()
+        self._heap = []  # [固定部分分数, 序号, key], 内容更新或 boost 后压入新条目, 旧条目在堆顶时丢弃
+        self._entries = {}  # {key: 当前有效的堆条目}
+        self._counter = itertools.count()
+        self._latest_saved = 0.0  # 等待中任务最近的保存时间(只增不减), 用于估计"刚保存"加分的上限
+
+    def score(self, key, queued_at:float, saved_at:float, now:float) -> float:
+        tokens = self.cost(key) or 0
+        score = tokens / 1000 * self.size_weight
+        if self.recency_decay > 0:
+            score -= self.recency_bonus * math.exp(-(now - saved_at) / self.recency_decay)
+        score -= (now - queued_at) * self.aging_rate
+        if key in self._boosted:
+            score -= self.boost_bonus
+        return score
+
+    def recency(self, saved_at:float, now:float) -> float:
+        if self.recency_decay <= 0:
+            return 0.0
+        return self.recency_bonus * math.exp(-(now - saved_at) / self.recency_decay)
+
+    def select(self, pending:OrderedDict, saved_at:dict, now:float):
+        heap = self._heap
+        max_recency = self.recency(self._latest_saved, now)
+        best_key, best_score = None, None
+        candidates = []
+        while heap:
+            entry = heap[0]
+            key = entry[2]
+            if self._entries.get(key) is not entry or key not in pending:
+                heapq.heappop(heap)
+                continue
+            # 之后的任务固定部分不更小, 加分也不超过 max_recency, 不可能胜出
+            if best_key is not None and entry[0] - max_recency >= best_score:
+                break
+            candidates.append(heapq.heappop(heap))
+            score = entry[0] - self.recency(saved_at.get(key, now), now)
+            if best_key is None or score < best_score:
+                best_key, best_score = key, score
+        for entry in candidates:
+            heapq.heappush(heap, entry)
+        if best_key is None:
+            # 不经过 add() 提交的任务, 退回到逐个打分
+            return min(pending, key=lambda key: self.score(key, pending[key], saved_at.get(key, pending[key]), now))
+        return best_key
+
+    def add(self, key, queued_at:float, saved_at:float):
+        tokens = self.cost(key) or 0
+        base = tokens / 1000 * self.size_weight + queued_at * self.aging_rate
+        self._push(key, base)
+        self._latest_saved = max(self._latest_saved, saved_at)
+
+    def boost(self, key):
+        if key not in self._boosted:
+            self._boosted.add(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._push(key, entry[3])
+
+    def forget(self, key):
+        self._boosted.discard(key)
+        self._entries.pop(key, None)
+
+    def _push(self, key, base:float):
+        priority = base - self.boost_bonus if key in self._boosted else base
+        entry = [priority, next(self._counter), key, base]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            # 过期条目太多时重建
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+
+class AnalysisScheduler:
+    """
+    基于 asyncio 的分析任务调度器
+
+    - 单个后台线程运行事件循环, 每个分析任务是一个协程, 不再为每个并发槽位创建线程
+    - 并发数上限可随时调整, 暂停/恢复和取消都通过事件唤醒, 空闲时不轮询
+    - 任务的开始/完成/失败/取消等事件统一写入 self.events (线程安全队列), 由 UI 线程批量消费
+
+    handler 为 async def handler(key) -> result, 在事件循环线程中执行
+    policy 决定等待中的任务的执行顺序, 默认按提交顺序(FifoPolicy)
+
+    批量合并(可选): batch_cost(key) 返回任务的估算 token 数时表示可以合并, 返回 None 表示单独执行;
+    可合并的任务先进入缓冲区, 达到 token 预算/文件数上限或等待超过 batch_max_wait 秒后一起交给
+    async def batch_handler(keys) -> {key: result} 执行, 只占用一个并发槽位; 缓冲区只有一个任务时仍交给 handler
+    """
+
+    def __init__(self, handler, max_concurrency:int = 3, batch_handler=None, batch_cost=None,
+                 batch_token_budget:int = 6000, batch_max_files:int = 8, batch_max_wait:float = 0.3,
+                 policy:FifoPolicy = None):
+        self.handler = handler
+        self.policy = policy or FifoPolicy()
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.events = queue.SimpleQueue()  # (kind, key, data), kind: started/done/failed/cancelled/自定义
+        self.batch_handler = batch_handler
+        self.batch_cost = batch_cost
+        self.batch_token_budget = batch_token_budget
+        self.batch_max_files = batch_max_files
+        self.batch_max_wait = batch_max_wait
+
+        self._loop = None
+        self._thread = None
+        self._wakeup = None  # asyncio.Event, 有新任务/槽位释放/恢复时唤醒调度协程
+        self._dispatcher = None
+        self._pending = OrderedDict()  # 等待执行的任务 {key: 提交时间}, 仅在事件循环线程中修改
+        self._active = {}  # 正在执行的任务 {key: asyncio.Task}, 仅在事件循环线程中修改
+        self._batch_members = {}  # 批量任务中尚未取消的 key {asyncio.Task: set}
+        self._batch = OrderedDict()  # 等待合并的任务 {key: 估算 token 数}
+        self._batch_since = 0.0  # 缓冲区中第一个任务的加入时间
+        self._paused = False
+        self._saved_at = {}  # 任务最近一次提交的时间 {key: time}, 用于计算反馈时间
+        self._feedback_times = deque(maxlen=200)  # 最近任务从提交到出结果的耗时(秒)
+
+        metrics = get_metrics()
+        self._queue_wait_timer = metrics.stage("queue_wait")
+        self._feedback_timer = metrics.histogram("review_feedback_seconds", "文件保存到出结果的耗时(秒)")
+        self._job_counters = {kind: metrics.counter("review_jobs_total", "结束的分析任务数", result=kind)
+                              for kind in ("done", "failed", "cancelled")}
+        metrics.gauge("review_jobs_pending", "等待中的分析任务数", func=self.pending_count)
+        metrics.gauge("review_jobs_active", "执行中的分析任务数", func=self.active_count)
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """启动事件循环线程"""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), daemon=True, name="analysis-loop")
+        self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready:threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = self._loop.create_task(self._dispatch())
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def stop(self, timeout:float = 5):
+        """取消所有任务并停止事件循环"""
+        if self._thread is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout)
+        except Exception as e:
+            logging.info(f"停止调度器超时或失败: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+    async def _shutdown(self):
+        self._pending.clear()
+        self._batch.clear()
+        tasks = list(set(self._active.values()))
+        if self._dispatcher is not None:
+            tasks.append(self._dispatcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run_coroutine(self, coro):
+        """在调度器的事件循环中执行协程, 返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _call(self, func, *args):
+        """线程安全地在事件循环线程中执行函数"""
+        self._loop.call_soon_threadsafe(func, *args)
+
+    # ---------- 对外接口（任意线程可调用） ----------
+
+    def submit(self, key):
+        """提交任务, 同一个 key 已在等待队列中时不会重复提交"""
+        self._call(self._submit, key)
+
+    def cancel(self, key):
+        """取消任务: 等待中的任务直接移除, 执行中的任务立即中断"""
+        self._call(self._cancel, key)
+
+    def cancel_all(self):
+        self._call(self._cancel_all)
+
+    def supersede(self, key):
+        """任务内容已更新: 中断执行中的旧任务(不发送 cancelled 事件)并重新排队, 等待中的任务保持原位置"""
+        self._call(self._supersede, key)
+
+    def pause(self):
+        """暂停派发新任务, 已在执行的任务继续完成"""
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+        self._call(self._wakeup.set)
+
+    def set_concurrency(self, max_concurrency:int):
+        """调整并发数上限, 立即生效; 缩小时执行中的任务会继续完成"""
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._call(self._wakeup.set)
+
+    def boost(self, key):
+        """提高任务优先级(立即review), 任务不在队列中时同时提交"""
+        self._call(self._boost, key)
+
+    def emit(self, kind, key, data=None):
+        """向UI线程发送事件"""
+        if kind in ("done", "failed"):
+            saved_at = self._saved_at.pop(key, None)
+            if saved_at is not None:
+                self._feedback_times.append(time.time() - saved_at)
+                self._feedback_timer.observe(self._feedback_times[-1])
+        counter = self._job_counters.get(kind)
+        if counter is not None:
+            counter.inc()
+        self.events.put((kind, key, data))
+
+    def feedback_stats(self) -> dict:
+        """
+        获取从保存(提交)到出结果的耗时统计
+
+        Returns:
+            dict: count/mean/p50/p95 (秒), 没有样本时为 0
+        """
+        samples = sorted(self._feedback_times)
+        if not samples:
+            return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0}
+        return {
+            'count': len(samples),
+            'mean': sum(samples) / len(samples),
+            'p50': samples[len(samples) // 2],
+            'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        }
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def pending_count(self) -> int:
+        return len(self._pending) + len(self._batch)
+
+    def active_count(self) -> int:
+        return len(self._active)
+
+    def is_active(self, key) -> bool:
+        return key in self._active
+
+    def is_queued(self, key, timeout:float = 1) -> bool:
+        """
+        任务是否在等待、合并缓冲区或执行中
+        其他线程调用时在事件循环线程中查询, 结果已包含该线程之前提交的 submit/supersede 等操作
+        """
+        if self._thread is None or threading.current_thread() is self._thread:
+            return self._is_queued(key)
+        future = concurrent.futures.Future()
+        try:
+            self._call(lambda: future.set_result(self._is_queued(key)))
+            return future.result(timeout)
+        except (RuntimeError, concurrent.futures.TimeoutError) as e:
+            logging.info(f"查询任务状态失败: {key}, {e}")
+            return False
+
+    # ---------- 事件循环线程内部实现 ----------
+
+    def _is_queued(self, key) -> bool:
+        return key in self._pending or key in self._batch or key in self._active
+
+    def _submit(self, key):
+        self._saved_at.setdefault(key, time.time())
+        if key in self._batch:
+            return
+        if key not in self._pending:
+            self._pending[key] = time.time()
+            self._wakeup.set()
+        # 等待中的任务内容或保存时间可能已更新, 重新计算优先级
+        self.policy.add(key, self._pending[key], self._saved_at[key])
+
+    def _boost(self, key):
+        self.policy.boost(key)
+        if not self._is_queued(key):
+            self._submit(key)
+        self._wakeup.set()
+
+    def _next_key(self):
+        return self.policy.select(self._pending, self._saved_at, time.time())
+
+    def _take(self, key):
+        """把任务移出等待队列"""
+        self._queue_wait_timer.observe(time.time() - self._pending.pop(key))
+        self.policy.forget(key)
+
+    def _cancel(self, key):
+        self._saved_at.pop(key, None)
+        self.policy.forget(key)
+        if self._pending.pop(key, None) is not None or self._batch.pop(key, None) is not None:
+            self.emit("cancelled", key)
+        task = self._active.get(key)
+        if task is None:
+            return
+        members = self._batch_members.get(task)
+        if members is not None and len(members) > 1:
+            # 批量任务中只取消这一个文件, 其余文件继续分析
+            members.discard(key)
+            del self._active[key]
+            self.emit("cancelled", key)
+        else:
+            task.cancel()
+
+    def _supersede(self, key):
+        task = self._active.pop(key, None)
+        if task is not None:
+            members = self._batch_members.get(task)
+            if members is not None and len(members) > 1:
+                # 批量任务中的其他文件继续分析
+                members.discard(key)
+            else:
+                # 已从 _active 中移除, 完成回调不会再为旧任务发送 cancelled 事件
+                task.cancel()
+        # 反馈时间从最新一次保存开始计算
+        self._saved_at[key] = time.time()
+        self._submit(key)
+
+    def _cancel_all(self):
+        for key in list(self._pending) + list(self._batch):
+            self.policy.forget(key)
+            self.emit("cancelled", key)
+        self._saved_at.clear()
+        self._pending.clear()
+        self._batch.clear()
+        for task in set(self._active.values()):
+            task.cancel()
+
+    def _running_count(self) -> int:
+        """占用的并发槽位数, 一个批量任务只占一个槽位"""
+        return len(set(self._active.values()))
+
+    def _fill_batch(self) -> bool:
+        """
+        把接下来要执行的可合并任务移入缓冲区
+        :return: 缓冲区是否已满(达到 token 预算或文件数上限)
+        """
+        if self.batch_handler is None or self.batch_cost is None:
+            return False
+        while self._pending:
+            key = self._next_key()
+            cost = self.batch_cost(key)
+            if cost is None:
+                return False
+            if self._batch and (len(self._batch) >= self.batch_max_files
+                                or sum(self._batch.values()) + cost > self.batch_token_budget):
+                return True
+            self._take(key)
+            if not self._batch:
+                self._batch_since = time.monotonic()
+            self._batch[key] = cost
+        return len(self._batch) >= self.batch_max_files
+
+    async def _dispatch(self):
+        """
+        调度协程: 有空闲槽位且未暂停时按 policy 选出的顺序派发任务, 否则等待唤醒;
+        缓冲区中有待合并的任务时最多等待 batch_max_wait 秒
+        """
+        while True:
+            timeout = None
+            if not self._paused:
+                batch_full = self._fill_batch()
+                has_slot = self._running_count() < self.max_concurrency
+                if self._batch:
+                    waited = time.monotonic() - self._batch_since
+                    # 缓冲区已满、等待超时或下一个任务不能合并时立即派发
+                    if batch_full or waited >= self.batch_max_wait or self._pending:
+                        if has_slot:
+                            keys = list(self._batch)
+                            self._batch.clear()
+                            self._start(keys)
+                            continue
+                    else:
+                        timeout = self.batch_max_wait - waited
+                elif self._pending and has_slot:
+                    key = self._next_key()
+                    self._take(key)
+                    self._start([key])
+                    continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, keys:list):
+        if len(keys) == 1:
+            task = self._loop.create_task(self._run_job(keys[0]))
+        else:
+            task = self._loop.create_task(self._run_batch(keys))
+            self._batch_members[task] = set(keys)
+        for key in keys:
+            self._active[key] = task
+        task.add_done_callback(lambda t, keys=keys: self._on_job_done(keys, t))
+
+    async def _run_job(self, key):
+        self.emit("started", key)
+        try:
+            result = await self.handler(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.info(f"分析任务失败: {key}, {e}")
+            self.emit("failed", key, e)
+        else:
+            self.emit("done", key, result)
+
+    async def _run_batch(self, keys:list):
+        task = asyncio.current_task()
+        for key in keys:
+            self.emit("started", key)
+        try:
+            results = await self.batch_handler(keys)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.info(f"批量分析任务失败: {keys}, {e}")
+            for key in self._batch_members.get(task, ()):
+                self.emit("failed", key, e)
+        else:
+            for key in self._batch_members.get(task, ()):
+                self.emit("done", key, results.get(key))
+
+    def _on_job_done(self, keys:list, task:asyncio.Task):
+        # 任务可能在开始执行前就被取消, 因此在回调中统一清理
+        members = self._batch_members.pop(task, None)
+        for key in keys:
+            if self._active.get(key) is not task:
+                continue
+            del self._active[key]
+            if task.cancelled() and (members is None or key in members):
+                self._saved_at.pop(key, None)
+                self.emit("cancelled", key)
+        self._wakeup.set()
@@ -0,0 +1,299 @@
+import os
+import re
+import bisect
+import keyword
+import logging
+import mmap
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+
+from app.find_engine import index_lines
+
+
+class SourceDocument:
+    """
+    只读的源文件, 使用内存映射, 不把整个文件读入内存
+
+    打开时建立行首偏移索引, 之后按行号范围解码需要显示的部分
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        # 空文件不能映射
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.line_starts = index_lines(self.data)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_starts)
+
+    def is_truncated(self) -> bool:
+        """文件在打开后被截短, 继续读取映射可能导致进程崩溃, 需要重新打开"""
+        try:
+            return os.fstat(self._file.fileno()).st_size < self.size
+        except OSError:
+            return True
+
+    def get_lines(self, start:int, end:int) -> str:
+        """获取 [start, end) 行(从 0 开始)的文本"""
+        start = max(0, min(start, self.line_count))
+        end = max(start, min(end, self.line_count))
+        if start == end:
+            return ""
+        begin = self.line_starts[start]
+        stop = self.line_starts[end] - 1 if end < self.line_count else self.size
+        return self.data[begin:stop].decode("utf-8", errors="replace")
+
+    def line_of_offset(self, offset:int) -> int:
+        """字节偏移所在的行(从 0 开始)"""
+        return bisect.bisect_right(self.line_starts, offset) - 1
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+
+PYTHON_PATTERN = re.compile(
+    r"(?P<comment>#[^\n]*)"
+    r"|(?P<string>[rRbBuUfF]{0,2}(?:\"\"\"[\s\S]*?\"\"\"|'''[\s\S]*?'''|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'))"
+    r"|(?P<keyword>\b(?:" + "|".join(keyword.kwlist) + r")\b)"
+    r"|(?P<decorator>@[\w.]+)"
+    r"|(?P<number>\b\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?\b)")
+
+GO_KEYWORDS = ("break", "case", "chan", "const", "continue", "default", "defer", "else", "fallthrough", "for",
+               "func", "go", "goto", "if", "import", "interface", "map", "package", "range", "return", "select",
+               "struct", "switch", "type", "var", "nil", "true", "false", "iota")
+
+GO_PATTERN = re.compile(
+    r"(?P<comment>//[^\n]*|/\*[\s\S]*?\*/)"
+    r"|(?P<string>\"(?:\\.|[^\"\\\n])*\"|`[^`]*`|'(?:\\.|[^'\\\n])*')"
+    r"|(?P<keyword>\b(?:" + "|".join(GO_KEYWORDS) + r")\b)"
+    r"|(?P<number>\b\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?\b)")
+
+HIGHLIGHT_PATTERNS = {".py": PYTHON_PATTERN, ".go": GO_PATTERN}
+
+HIGHLIGHT_COLORS = {
+    "comment": "#6a9955",
+    "string": "#a31515",
+    "keyword": "#0000ff",
+    "decorator": "#795e26",
+    "number": "#098658",
+}
+
+
+def highlight_source(text:str, pattern) -> dict:
+    """
+    对一段源码做语法高亮, 不依赖 Tk, 在后台线程中执行
+    :return: {tag: [start1, end1, ...]}, 索引为相对 text 的 "行.列"
+    """
+    line_starts = [0]
+    position = text.find("\n")
+    while position >= 0:
+        line_starts.append(position + 1)
+        position = text.find("\n", position + 1)
+
+    def index(offset):
+        line = bisect.bisect_right(line_starts, offset) - 1
+        return "{}.{}".format(line + 1, offset - line_starts[line])
+
+    spans = {}
+    for match in pattern.finditer(text):
+        spans.setdefault(match.lastgroup, []).extend((index(match.start()), index(match.end())))
+    return spans
+
+
+class SourceView(ttk.Frame):
+    """
+    虚拟化的源码查看组件
+
+    - 文本组件中只放入可见区域前后各 margin 行, 滚动到窗口边缘时重新加载附近的行(不自动换行, 一行对应一个显示行)
+    - 滚动条按整个文件的行数计算位置
+    - .py/.go 文件在后台线程中做语法高亮, 完成后只应用到仍在显示的窗口
+    """
+
+    def __init__(self, parent, margin:int = 200, **text_options):
+        super().__init__(parent)
+        self.margin = margin
+        self.document = None
+        self.window_start = 0  # 文本组件中第一行对应的文件行号(从 0 开始)
+        self.window_end = 0
+        self.pattern = None
+        self.finder = None  # 当前文档的查找结果(FindEngine)
+        self._window_id = 0  # 每次重新加载窗口递增, 丢弃过期的高亮结果
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="highlight")
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text = tk.Text(self, yscrollcommand=self.on_text_scroll, wrap=tk.NONE, **text_options)
+        x_scrollbar = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.text.xview)
+        x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.text.config(xscrollcommand=x_scrollbar.set)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for tag, color in HIGHLIGHT_COLORS.items():
+            self.text.tag_config(tag, foreground=color)
+        self.text.tag_config("found", background="yellow")
+        self.text.tag_config("found_current", background="orange")
+        self.text.tag_raise("sel")
+
+    # ---------- 文档 ----------
+
+    def load(self, path:str):
+        """打开并显示文件, 替换之前的文件"""
+        self.close_document()
+        self.document = SourceDocument(path)
+        self.pattern = HIGHLIGHT_PATTERNS.get(os.path.splitext(path)[1].lower())
+        self.window_start = self.window_end = 0
+        self.finder = None
+        self.show_line(0)
+
+    def close_document(self):
+        self._window_id += 1
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.config(state=tk.DISABLED)
+
+    def destroy(self):
+        self.close_document()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
+
+    # ---------- 滚动 ----------
+
+    def visible_lines(self) -> int:
+        height = self.text.winfo_height()
+        line_height = self.text.dlineinfo("@0,0")
+        if height <= 1 or not line_height:
+            return 40
+        return max(1, height // line_height[3])
+
+    def top_line(self) -> int:
+        """当前显示的第一行(文件行号, 从 0 开始)"""
+        return self.window_start + int(self.text.index("@0,0").split(".")[0]) - 1
+
+    def show_line(self, line:int, top:bool = True):
+        """滚动到文件的第 line 行(从 0 开始), 需要时重新加载窗口"""
+        if self.document is None:
+            return
+        line = max(0, min(line, self.document.line_count - 1))
+        visible = self.visible_lines()
+        if (line < self.window_start or
+                (line + visible > self.window_end and self.window_end < self.document.line_count)):
+            self.load_window(line - self.margin, line + visible + self.margin)
+        if top:
+            self.text.yview("{}.0".format(line - self.window_start + 1))
+        else:
+            self.text.see("{}.0".format(line - self.window_start + 1))
+
+    def load_window(self, start:int, end:int):
+        """把文件的 [start, end) 行放入文本组件"""
+        document = self.document
+        if document.is_truncated():
+            # 文件被其他程序截短, 重新打开
+            logging.info(f"文件已变化, 重新加载: {document.path}")
+            document.close()
+            self.document = document = SourceDocument(document.path)
+        start = max(0, start)
+        end = min(document.line_count, max(end, start + 1))
+        text = document.get_lines(start, end)
+        self.window_start, self.window_end = start, end
+        self._window_id += 1
+
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", text)
+        self.text.config(state=tk.DISABLED)
+        self.on_window_loaded()
+
+        if self.pattern is not None:
+            future = self._executor.submit(highlight_source, text, self.pattern)
+            self.after(20, self._apply_highlight, future, self._window_id)
+
+    def on_window_loaded(self):
+        """窗口内容被替换后恢复查找高亮"""
+        self.highlight_matches()
+
+    def _apply_highlight(self, future, window_id):
+        if window_id != self._window_id:
+            return
+        if not future.done():
+            self.after(20, self._apply_highlight, future, window_id)
+            return
+        try:
+            spans = future.result()
+        except Exception as e:
+            logging.error(f"语法高亮失败: {e}")
+            return
+        for tag, indices in spans.items():
+            self.text.tag_add(tag, *indices)
+
+    def on_text_scroll(self, first, last):
+        """文本组件滚动(鼠标滚轮、键盘)时更新滚动条, 接近窗口边缘时重新加载"""
+        document = self.document
+        if document is None or document.line_count <= 0:
+            self.scrollbar.set(first, last)
+            return
+        top = self.top_line()
+        visible = self.visible_lines()
+        near_start = self.window_start > 0 and top - self.window_start < self.margin // 4
+        near_end = self.window_end < document.line_count and self.window_end - (top + visible) < self.margin // 4
+        if near_start or near_end:
+            self.after_idle(self.show_line, top)
+        total = document.line_count
+        self.scrollbar.set(top / total, min(1.0, (top + visible) / total))
+
+    def on_scrollbar(self, action, value, unit=None):
+        """滚动条按整个文件定位"""
+        if self.document is None:
+            return
+        if action == "moveto":
+            self.show_line(int(float(value) * self.document.line_count))
+        elif action == "scroll":
+            step = self.visible_lines() if unit == "pages" else 1
+            self.show_line(self.top_line() + int(value) * step)
+
+    # ---------- 查找 ----------
+
+    def set_finder(self, finder):
+        """设置查找结果(FindEngine), 高亮当前窗口内的所有匹配, 滚动时随窗口更新"""
+        self.finder = finder
+        self.highlight_matches()
+
+    def highlight_matches(self):
+        """窗口内的所有匹配一次 tag_add"""
+        self.text.tag_remove("found", "1.0", tk.END)
+        self.text.tag_remove("found_current", "1.0", tk.END)
+        finder, document = self.finder, self.document
+        if finder is None or document is None or finder.data is not document.data or not finder.count:
+            return
+        window_start = document.line_starts[self.window_start]
+        window_end = document.line_starts[self.window_end] if self.window_end < document.line_count else document.size
+        indices = []
+        for start, end in finder.matches_between(window_start, window_end):
+            indices.append(self.text_index(start))
+            indices.append(self.text_index(end))
+        if indices:
+            self.text.tag_add("found", *indices)
+        if finder.current >= 0:
+            start, end = finder.match(finder.current)
+            if window_start <= start < window_end:
+                self.text.tag_add("found_current", self.text_index(start), self.text_index(end))
+
+    def text_index(self, offset:int) -> str:
+        """文件中的字节偏移对应的文本组件索引"""
+        line, column = self.finder.position(offset)
+        return "{}.{}".format(line - self.window_start + 1, column)
+
+    def show_match(self, start:int):
+        """滚动到匹配所在的行并刷新高亮"""
+        line = self.document.line_of_offset(start)
+        top = self.top_line()
+        if not top <= line < top + self.visible_lines() - 1:
+            self.show_line(max(0, line - 5))
+        self.highlight_matches()
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+import requests
+
+from ai.kernel.http_pool import SessionPool
+from monitor.metrics import get_metrics
+
+# 收集接口返回这些状态码(以及 5xx)时稍后重试, 其余 4xx 表示事件被拒绝, 直接丢弃
+RETRYABLE_STATUS = (408, 429)
+
+
+class TelemetryReporter:
+    """
+    后台上报review统计, 调用方只入队, 不等待网络
+
+    - 后台线程按批取出事件, 通过独立的 keep-alive 连接逐条发送到收集接口(/report 每次接收一条)
+    - 收集接口不可达时, 未发送的事件追加到本地 spool 文件, 每隔 retry_interval 秒重试, 恢复后先补发 spool
+    - 队列满时丢弃最旧的事件; spool 文件以追加方式写入, 超出 max_spool 一定比例后才整体重写一次,
+      只保留最新的 max_spool 条, 收集接口长时间不可达时每批的写入量与 spool 大小无关
+    """
+
+    def __init__(self, base_url:str, spool_path:str = "telemetry_spool.jsonl", max_queue:int = 1000,
+                 max_spool:int = 10000, batch_size:int = 50, flush_interval:float = 2, retry_interval:float = 60):
+        self.url = "{}/report".format(base_url.rstrip("/"))
+        self.spool_path = spool_path
+        self.max_spool = max_spool
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self._queue = deque(maxlen=max(1, max_queue))
+        self._condition = threading.Condition()
+        self._closing = False
+        self._retry_at = 0.0  # 收集接口不可达时, 下一次尝试的时间
+        self._spool_lines = None  # spool 文件中的事件数, 后台线程第一次写入时统计
+        # 独立的单连接池, 不占用 Kernel 请求的连接
+        self._pool = SessionPool(pool_size=1, connect_timeout=3, read_timeout=5)
+
+        self._sent = 0
+        self._dropped = 0
+        self._spooled = 0
+        metrics = get_metrics()
+        self._sent_counter = metrics.counter("telemetry_reports_total", "统计上报事件数", result="sent")
+        self._spooled_counter = metrics.counter("telemetry_reports_total", "统计上报事件数", result="spooled")
+        self._dropped_counter = metrics.counter("telemetry_reports_total", "统计上报事件数", result="dropped")
+
+        self._thread = threading.Thread(target=self._run, daemon=True, name="telemetry")
+        self._thread.start()
+
+    def report(self, name:str, file_name:str, question_count:int):
+        """记录一次上报事件(任意线程可调用, 立即返回)"""
+        event = {"name": name, "file_name": file_name, "question_count": question_count}
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self._dropped += 1
+                self._dropped_counter.inc()
+            self._queue.append(event)
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+
+    def close(self, timeout:float = 5):
+        """
+        停止后台线程, 尚未发送的事件写入 spool, 下次启动后补发
+
+        spool 文件只由后台线程读写: 关闭时后台线程中断发送, 自己写入剩余事件后关闭连接池
+        """
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.info("统计上报线程仍在等待收集接口响应, 剩余事件将在其结束后写入 spool")
+
+    def stats(self) -> dict:
+        """
+        获取上报统计信息（用于监控）
+
+        Returns:
+            dict: 已发送、写入 spool、因队列满丢弃的事件数以及当前队列长度
+        """
+        return {
+            'sent': self._sent,
+            'spooled': self._spooled,
+            'dropped': self._dropped,
+            'queued': len(self._queue),
+        }
+
+    # ---------- 后台线程 ----------
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closing and len(self._queue) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if self._closing:
+                    remaining = list(self._queue)
+                    self._queue.clear()
+                    break
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if time.monotonic() < self._retry_at:
+                # 收集接口不可达, 直接写入 spool, 恢复后补发
+                self._spool(batch)
+                continue
+            if os.path.exists(self.spool_path) and not self._replay_spool():
+                self._spool(batch)
+                continue
+            unsent = self._send(batch)
+            self._spool(unsent)
+        self._spool(remaining)
+        self._pool.close()
+
+    def _send(self, events:list) -> list:
+        """依次发送, 收集接口不可达或正在关闭时停止并返回未发送的事件"""
+        for index, event in enumerate(events):
+            if self._closing:
+                return events[index:]
+            try:
+                response = self._pool.post(self.url, data=event)
+            except requests.exceptions.RequestException as e:
+                logging.info(f"统计上报失败, {self.retry_interval}秒后重试: {e}")
+                self._retry_at = time.monotonic() + self.retry_interval
+                return events[index:]
+            status = response.status_code
+            if status in RETRYABLE_STATUS or status >= 500:
+                # 收集接口暂时不可用, 保留事件稍后重试
+                logging.info(f"统计上报失败, {self.retry_interval}秒后重试: HTTP {status}")
+                self._retry_at = time.monotonic() + self.retry_interval
+                return events[index:]
+            if not 200 <= status < 300:
+                # 收集接口拒绝的事件重试也不会成功, 丢弃, 不阻塞之后的事件
+                logging.info(f"统计上报被拒绝, 已丢弃: HTTP {status}, {event}")
+                self._dropped += 1
+                self._dropped_counter.inc()
+                continue
+            self._sent += 1
+            self._sent_counter.inc()
+        return []
+
+    def _spool(self, events:list):
+        """追加到 spool 文件, 超出 max_spool 的 10% 后丢弃最旧的, 只保留 max_spool 条"""
+        if not events:
+            return
+        try:
+            if self._spool_lines is None:
+                self._spool_lines = self._count_spool()
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+            self._spool_lines += len(events)
+            self._spooled += len(events)
+            self._spooled_counter.inc(len(events))
+            if self._spool_lines > self.max_spool + max(1, self.max_spool // 10):
+                self._trim_spool()
+        except OSError as e:
+            logging.error(f"写入统计 spool 文件失败: {e}")
+
+    def _count_spool(self) -> int:
+        try:
+            with open(self.spool_path, "rb") as f:
+                return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 16), b""))
+        except OSError:
+            return 0
+
+    def _trim_spool(self):
+        with open(self.spool_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        dropped = len(lines) - self.max_spool
+        if dropped > 0:
+            self._dropped += dropped
+            self._dropped_counter.inc(dropped)
+            lines = lines[dropped:]
+        self._write_spool(lines)
+
+    def _replay_spool(self) -> bool:
+        """补发 spool 中的事件, 全部发送成功时返回 True"""
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                events = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            logging.error(f"读取统计 spool 文件失败, 已丢弃: {e}")
+            self._remove_spool()
+            return True
+        unsent = self._send(events)
+        try:
+            if unsent:
+                self._write_spool([json.dumps(event, ensure_ascii=False) + "\n" for event in unsent])
+                return False
+            self._remove_spool()
+        except OSError as e:
+            logging.error(f"更新统计 spool 文件失败: {e}")
+        if events:
+            logging.info(f"已补发 {len(events)} 条统计")
+        return True
+
+    def _write_spool(self, lines:list):
+        temp_path = self.spool_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(temp_path, self.spool_path)
+        self._spool_lines = len(lines)
+
+    def _remove_spool(self):
+        try:
+            os.remove(self.spool_path)
+        except OSError:
+            pass
+        self._spool_lines = 0
@@ -0,0 +1,134 @@
+"""
+HTTP 连接池基准测试
+
+在本地启动一个模拟 FastGTP 接口的 HTTP 服务, 分别使用裸 requests.post (每次新建连接)
+和共享 SessionPool (keep-alive 复用连接) 发送请求, 对比单个请求的延迟。
+
+用法:
+    python benchmark/http_pool_bench.py --requests 200 --concurrency 3 --delay 0.005
+
+本地明文 HTTP 只能体现 TCP 建连的开销; 传入自签名证书 (--cert/--key) 可以同时对比 TLS 握手的开销:
+    openssl req -x509 -newkey rsa:2048 -nodes -keyout key.pem -out cert.pem -days 1 -subj "/CN=127.0.0.1"
+    python benchmark/http_pool_bench.py --cert cert.pem --key key.pem
+"""
+import argparse
+import json
+import os
+import socket
+import ssl
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai.kernel.http_pool import SessionPool  # noqa: E402
+
+
+RESPONSE_BODY = json.dumps({
+    "choices": [{"message": {"role": "assistant", "content": "代码中存在0个明显的安全问题:"}}]
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """模拟的 chat/completions 接口, 支持 HTTP/1.1 keep-alive"""
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+
+    def setup(self):
+        super().setup()
+        # 与真实网关一致, 关闭 Nagle 算法, 避免响应头和响应体分两次发送时触发延迟确认
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.delay:
+            time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(delay: float, cert: str = None, key: str = None):
+    StubHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def run(label, send, total, concurrency):
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "x" * 2048}], "stream": False}
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        response = send(payload)
+        response.content
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed * 1000)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<12} mean={statistics.mean(latencies):7.2f}ms  p50={statistics.median(latencies):7.2f}ms  "
+          f"p95={p95:7.2f}ms  throughput={total / wall:8.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比有无连接池时的请求延迟")
+    parser.add_argument("--requests", type=int, default=200, help="每种模式发送的请求数")
+    parser.add_argument("--concurrency", type=int, default=3, help="并发数, 对应 max_concurrent_analysis")
+    parser.add_argument("--delay", type=float, default=0.005, help="模拟服务端处理耗时（秒）")
+    parser.add_argument("--cert", help="自签名证书路径, 指定后使用 HTTPS")
+    parser.add_argument("--key", help="证书私钥路径")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.delay, args.cert, args.key)
+    scheme = "https" if args.cert else "http"
+    url = "{}://127.0.0.1:{}/v1/chat/completions".format(scheme, server.server_address[1])
+    verify = not args.cert
+    headers = {"Content-Type": "application/json", "Authorization": "Bearer stub"}
+    print(f"stub server: {url}, requests={args.requests}, concurrency={args.concurrency}")
+
+    if not verify:
+        import urllib3
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    try:
+        run("no-pool", lambda data: requests.post(url, headers=headers, json=data, timeout=(10, 300), verify=verify),
+            args.requests, args.concurrency)
+
+        pool = SessionPool(pool_size=args.concurrency)
+        run("pooled", lambda data: pool.post(url, headers=headers, json=data, verify=verify),
+            args.requests, args.concurrency)
+        stats = pool.stats()
+        print(f"pool stats: connections_created={stats['connections_created']} "
+              f"connections_reused={stats['connections_reused']} peak_in_flight={stats['peak_in_flight']}")
+        pool.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
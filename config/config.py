@@ -12,6 +12,20 @@ class Config:
         self.name = "" # 用户名
         self.ignore_gitignore = False  # 新增：保存.gitignore配置
         self.check_type_list = [] # 检查类型列表
+        self.review_cache_config = ReviewCacheConfig() # review结果缓存配置
+        self.rate_limit_config = RateLimitConfig() # 限流与熔断配置
+        self.chunk_config = ChunkConfig() # 大文件分段review配置
+        self.diff_review_config = DiffReviewConfig() # 增量review配置
+        self.batch_config = BatchConfig() # 小文件合并review配置
+        self.kernel_pool_config = KernelPoolConfig() # 多后端负载均衡配置
+        self.hedge_config = HedgeConfig() # 对冲请求配置
+        self.scheduler_config = SchedulerConfig() # 分析任务调度配置
+        self.journal_config = JournalConfig() # 任务日志配置
+        self.metrics_config = MetricsConfig() # 性能指标导出配置
+        self.profiling_config = ProfilingConfig() # 性能分析配置
+        self.result_store_config = ResultStoreConfig() # 分析记录内存上限配置
+        self.telemetry_config = TelemetryConfig() # 统计上报配置
+        self.history_config = HistoryConfig() # review历史配置
 
     def load_from_yaml(self):
         if os.path.exists('config.yaml'):
@@ -22,11 +36,90 @@ class Config:
                     self.fast_gtp_config.secret_key = config_data.get('fast_gtp_config', {}).get('secret_key', "")
                     self.fast_gtp_config.url = config_data.get('fast_gtp_config', {}).get('url', "")
                     self.fast_gtp_config.gtp_model = config_data.get('fast_gtp_config', {}).get('gtp_model', "gpt-3.5-turbo")
+                    self.fast_gtp_config.connect_timeout = config_data.get('fast_gtp_config', {}).get('connect_timeout', 10)
+                    self.fast_gtp_config.read_timeout = config_data.get('fast_gtp_config', {}).get('read_timeout', 300)
+                    self.fast_gtp_config.stream = config_data.get('fast_gtp_config', {}).get('stream', False)
                     self.monitor_project_path = config_data.get('monitor_project_path', "")
                     self.file_types = config_data.get('file_types', ['.py', '.go'])
                     self.max_concurrent_analysis = config_data.get('max_concurrent_analysis', 3)  # 加载并发数配置
                     self.ignore_gitignore = config_data.get('ignore_gitignore', False)  # 加载.gitignore配置
                     self.check_type_list = config_data.get('check_type_list', [])
+                    review_cache_data = config_data.get('review_cache_config', {})
+                    self.review_cache_config.enabled = review_cache_data.get('enabled', True)
+                    self.review_cache_config.path = review_cache_data.get('path', "review_cache.db")
+                    self.review_cache_config.max_entries = review_cache_data.get('max_entries', 5000)
+                    self.review_cache_config.max_size_mb = review_cache_data.get('max_size_mb', 200)
+                    self.review_cache_config.max_age_days = review_cache_data.get('max_age_days', 30)
+                    rate_limit_data = config_data.get('rate_limit_config', {})
+                    self.rate_limit_config.requests_per_minute = rate_limit_data.get('requests_per_minute', 0)
+                    self.rate_limit_config.tokens_per_minute = rate_limit_data.get('tokens_per_minute', 0)
+                    self.rate_limit_config.max_retries = rate_limit_data.get('max_retries', 3)
+                    self.rate_limit_config.base_delay = rate_limit_data.get('base_delay', 1.0)
+                    self.rate_limit_config.max_delay = rate_limit_data.get('max_delay', 60.0)
+                    self.rate_limit_config.failure_threshold = rate_limit_data.get('failure_threshold', 5)
+                    self.rate_limit_config.recovery_timeout = rate_limit_data.get('recovery_timeout', 30)
+                    chunk_data = config_data.get('chunk_config', {})
+                    self.chunk_config.enabled = chunk_data.get('enabled', True)
+                    self.chunk_config.max_lines = chunk_data.get('max_lines', 400)
+                    diff_review_data = config_data.get('diff_review_config', {})
+                    self.diff_review_config.enabled = diff_review_data.get('enabled', False)
+                    self.diff_review_config.base = diff_review_data.get('base', "last_reviewed")
+                    self.diff_review_config.context_lines = diff_review_data.get('context_lines', 5)
+                    self.diff_review_config.min_lines = diff_review_data.get('min_lines', 100)
+                    self.diff_review_config.max_changed_ratio = diff_review_data.get('max_changed_ratio', 0.5)
+                    batch_data = config_data.get('batch_config', {})
+                    self.batch_config.enabled = batch_data.get('enabled', True)
+                    self.batch_config.token_budget = batch_data.get('token_budget', 6000)
+                    self.batch_config.max_file_tokens = batch_data.get('max_file_tokens', 1500)
+                    self.batch_config.max_files = batch_data.get('max_files', 8)
+                    self.batch_config.max_wait = batch_data.get('max_wait', 0.3)
+                    kernel_pool_data = config_data.get('kernel_pool_config', {})
+                    self.kernel_pool_config.backends = kernel_pool_data.get('backends', []) or []
+                    self.kernel_pool_config.failure_threshold = kernel_pool_data.get('failure_threshold', 2)
+                    self.kernel_pool_config.cool_down = kernel_pool_data.get('cool_down', 60)
+                    self.kernel_pool_config.ewma_alpha = kernel_pool_data.get('ewma_alpha', 0.3)
+                    hedge_data = config_data.get('hedge_config', {})
+                    self.hedge_config.enabled = hedge_data.get('enabled', False)
+                    self.hedge_config.percentile = hedge_data.get('percentile', 95)
+                    self.hedge_config.max_ratio = hedge_data.get('max_ratio', 0.1)
+                    self.hedge_config.min_samples = hedge_data.get('min_samples', 20)
+                    self.hedge_config.min_delay = hedge_data.get('min_delay', 2.0)
+                    scheduler_data = config_data.get('scheduler_config', {})
+                    self.scheduler_config.policy = scheduler_data.get('policy', "priority")
+                    self.scheduler_config.size_weight = scheduler_data.get('size_weight', 1.0)
+                    self.scheduler_config.aging_rate = scheduler_data.get('aging_rate', 0.1)
+                    self.scheduler_config.recency_bonus = scheduler_data.get('recency_bonus', 2.0)
+                    self.scheduler_config.recency_decay = scheduler_data.get('recency_decay', 30.0)
+                    journal_data = config_data.get('journal_config', {})
+                    self.journal_config.enabled = journal_data.get('enabled', True)
+                    self.journal_config.path = journal_data.get('path', "review_journal.db")
+                    self.journal_config.flush_interval = journal_data.get('flush_interval', 0.5)
+                    self.journal_config.max_age_days = journal_data.get('max_age_days', 7)
+                    metrics_data = config_data.get('metrics_config', {})
+                    self.metrics_config.http_port = metrics_data.get('http_port', 0)
+                    self.metrics_config.json_path = metrics_data.get('json_path', "")
+                    self.metrics_config.dump_interval = metrics_data.get('dump_interval', 60)
+                    profiling_data = config_data.get('profiling_config', {})
+                    self.profiling_config.enabled = profiling_data.get('enabled', False)
+                    self.profiling_config.output_dir = profiling_data.get('output_dir', "profiles")
+                    self.profiling_config.sample_interval = profiling_data.get('sample_interval', 0.01)
+                    self.profiling_config.tracemalloc_frames = profiling_data.get('tracemalloc_frames', 25)
+                    result_store_data = config_data.get('result_store_config', {})
+                    self.result_store_config.memory_limit_mb = result_store_data.get('memory_limit_mb', 64)
+                    self.result_store_config.spill_path = result_store_data.get('spill_path', "review_spill.db")
+                    telemetry_data = config_data.get('telemetry_config', {})
+                    self.telemetry_config.enabled = telemetry_data.get('enabled', False)
+                    self.telemetry_config.base_url = telemetry_data.get('base_url', "")
+                    self.telemetry_config.spool_path = telemetry_data.get('spool_path', "telemetry_spool.jsonl")
+                    self.telemetry_config.max_queue = telemetry_data.get('max_queue', 1000)
+                    self.telemetry_config.max_spool = telemetry_data.get('max_spool', 10000)
+                    self.telemetry_config.batch_size = telemetry_data.get('batch_size', 50)
+                    self.telemetry_config.flush_interval = telemetry_data.get('flush_interval', 2)
+                    self.telemetry_config.retry_interval = telemetry_data.get('retry_interval', 60)
+                    history_data = config_data.get('history_config', {})
+                    self.history_config.enabled = history_data.get('enabled', True)
+                    self.history_config.path = history_data.get('path', "findings_history.db")
+                    self.history_config.max_age_days = history_data.get('max_age_days', 365)
                     # 先从配置中加载用户名,  不存在的话或为空的话则生成一个随机的
                     self.name = config_data.get('name', "")
                     if not self.name:
@@ -47,14 +140,107 @@ class Config:
             'fast_gtp_config': {
                 'secret_key': self.fast_gtp_config.secret_key,
                 'url': self.fast_gtp_config.url,
-                'gtp_model': self.fast_gtp_config.gtp_model
+                'gtp_model': self.fast_gtp_config.gtp_model,
+                'connect_timeout': self.fast_gtp_config.connect_timeout,
+                'read_timeout': self.fast_gtp_config.read_timeout,
+                'stream': self.fast_gtp_config.stream
             },
             'monitor_project_path': self.monitor_project_path,
             'file_types': self.file_types,
             'max_concurrent_analysis': self.max_concurrent_analysis,  # 保存并发数配置
             'name': self.name,
             'ignore_gitignore': self.ignore_gitignore,  # 保存.gitignore配置
-            'check_type_list': self.check_type_list
+            'check_type_list': self.check_type_list,
+            'review_cache_config': {
+                'enabled': self.review_cache_config.enabled,
+                'path': self.review_cache_config.path,
+                'max_entries': self.review_cache_config.max_entries,
+                'max_size_mb': self.review_cache_config.max_size_mb,
+                'max_age_days': self.review_cache_config.max_age_days
+            },
+            'rate_limit_config': {
+                'requests_per_minute': self.rate_limit_config.requests_per_minute,
+                'tokens_per_minute': self.rate_limit_config.tokens_per_minute,
+                'max_retries': self.rate_limit_config.max_retries,
+                'base_delay': self.rate_limit_config.base_delay,
+                'max_delay': self.rate_limit_config.max_delay,
+                'failure_threshold': self.rate_limit_config.failure_threshold,
+                'recovery_timeout': self.rate_limit_config.recovery_timeout
+            },
+            'chunk_config': {
+                'enabled': self.chunk_config.enabled,
+                'max_lines': self.chunk_config.max_lines
+            },
+            'diff_review_config': {
+                'enabled': self.diff_review_config.enabled,
+                'base': self.diff_review_config.base,
+                'context_lines': self.diff_review_config.context_lines,
+                'min_lines': self.diff_review_config.min_lines,
+                'max_changed_ratio': self.diff_review_config.max_changed_ratio
+            },
+            'batch_config': {
+                'enabled': self.batch_config.enabled,
+                'token_budget': self.batch_config.token_budget,
+                'max_file_tokens': self.batch_config.max_file_tokens,
+                'max_files': self.batch_config.max_files,
+                'max_wait': self.batch_config.max_wait
+            },
+            'kernel_pool_config': {
+                'backends': self.kernel_pool_config.backends,
+                'failure_threshold': self.kernel_pool_config.failure_threshold,
+                'cool_down': self.kernel_pool_config.cool_down,
+                'ewma_alpha': self.kernel_pool_config.ewma_alpha
+            },
+            'hedge_config': {
+                'enabled': self.hedge_config.enabled,
+                'percentile': self.hedge_config.percentile,
+                'max_ratio': self.hedge_config.max_ratio,
+                'min_samples': self.hedge_config.min_samples,
+                'min_delay': self.hedge_config.min_delay
+            },
+            'scheduler_config': {
+                'policy': self.scheduler_config.policy,
+                'size_weight': self.scheduler_config.size_weight,
+                'aging_rate': self.scheduler_config.aging_rate,
+                'recency_bonus': self.scheduler_config.recency_bonus,
+                'recency_decay': self.scheduler_config.recency_decay
+            },
+            'journal_config': {
+                'enabled': self.journal_config.enabled,
+                'path': self.journal_config.path,
+                'flush_interval': self.journal_config.flush_interval,
+                'max_age_days': self.journal_config.max_age_days
+            },
+            'metrics_config': {
+                'http_port': self.metrics_config.http_port,
+                'json_path': self.metrics_config.json_path,
+                'dump_interval': self.metrics_config.dump_interval
+            },
+            'profiling_config': {
+                'enabled': self.profiling_config.enabled,
+                'output_dir': self.profiling_config.output_dir,
+                'sample_interval': self.profiling_config.sample_interval,
+                'tracemalloc_frames': self.profiling_config.tracemalloc_frames
+            },
+            'result_store_config': {
+                'memory_limit_mb': self.result_store_config.memory_limit_mb,
+                'spill_path': self.result_store_config.spill_path
+            },
+            'telemetry_config': {
+                'enabled': self.telemetry_config.enabled,
+                'base_url': self.telemetry_config.base_url,
+                'spool_path': self.telemetry_config.spool_path,
+                'max_queue': self.telemetry_config.max_queue,
+                'max_spool': self.telemetry_config.max_spool,
+                'batch_size': self.telemetry_config.batch_size,
+                'flush_interval': self.telemetry_config.flush_interval,
+                'retry_interval': self.telemetry_config.retry_interval
+            },
+            'history_config': {
+                'enabled': self.history_config.enabled,
+                'path': self.history_config.path,
+                'max_age_days': self.history_config.max_age_days
+            }
         }
         logging.info("正在保存配置到 YAML 文件...")
         with open('config.yaml', 'w', encoding='utf-8') as file:
@@ -67,6 +253,131 @@ class FastGTPConfig:
         self.secret_key = "" # API 密钥
         self.url = "" # API URL
         self.gtp_model = "" # 模型名称
+        self.connect_timeout = 10 # 建立连接超时时间（秒）
+        self.read_timeout = 300 # 读取响应超时时间（秒）
+        self.stream = False # 是否使用流式(SSE)响应
+
+
+class ReviewCacheConfig:
+    def __init__(self):
+        self.enabled = True # 是否启用review结果缓存
+        self.path = "review_cache.db" # 缓存数据库路径
+        self.max_entries = 5000 # 最大缓存条目数
+        self.max_size_mb = 200 # 缓存最大总大小（MB）
+        self.max_age_days = 30 # 缓存最长保存天数
+
+
+class RateLimitConfig:
+    def __init__(self):
+        self.requests_per_minute = 0 # 每分钟最大请求数, 0 表示不限制
+        self.tokens_per_minute = 0 # 每分钟最大 token 数(估算), 0 表示不限制
+        self.max_retries = 3 # 失败最大重试次数
+        self.base_delay = 1.0 # 指数退避的初始等待时间（秒）
+        self.max_delay = 60.0 # 单次重试最长等待时间（秒）
+        self.failure_threshold = 5 # 连续失败多少次后熔断, 0 表示不熔断
+        self.recovery_timeout = 30 # 熔断后多久尝试恢复（秒）
+
+    def to_kwargs(self) -> dict:
+        """转换为 RateLimiter 的参数"""
+        return dict(self.__dict__)
+
+
+class ChunkConfig:
+    def __init__(self):
+        self.enabled = True # 超过 max_lines 的文件是否分段review
+        self.max_lines = 400 # 单个分段的最大行数
+
+
+class DiffReviewConfig:
+    def __init__(self):
+        self.enabled = False # 是否只review变更的代码
+        self.base = "last_reviewed" # 对比基准: last_reviewed(上次review的内容) 或 head(git HEAD)
+        self.context_lines = 5 # 变更前后附带的上下文行数
+        self.min_lines = 100 # 文件超过多少行才使用增量review
+        self.max_changed_ratio = 0.5 # 变更区域超过全文的比例时改为review全文
+
+
+class BatchConfig:
+    def __init__(self):
+        self.enabled = True # 是否把多个小文件合并到一个请求中review
+        self.token_budget = 6000 # 单个合并请求中代码的最大 token 数(估算)
+        self.max_file_tokens = 1500 # 超过该 token 数的文件单独review
+        self.max_files = 8 # 单个合并请求的最大文件数
+        self.max_wait = 0.3 # 等待更多文件合并的最长时间（秒）
+
+
+class KernelPoolConfig:
+    def __init__(self):
+        # 主后端(fast_gtp_config)之外的其他后端, 每项为 dict:
+        # fast_gtp: {type: fast_gtp, name, url, secret_key, gtp_model}
+        # ai53: {type: ai53, name, url, bot_id, secret_key}
+        self.backends = []
+        self.failure_threshold = 2 # 后端连续失败多少次后暂停使用
+        self.cool_down = 60 # 后端暂停使用的时间（秒）
+        self.ewma_alpha = 0.3 # 耗时 EWMA 的平滑系数, 越大越看重最近的请求
+
+
+class HedgeConfig:
+    def __init__(self):
+        self.enabled = False # 是否启用对冲请求
+        self.percentile = 95 # 请求超过最近耗时的该百分位仍未返回时发出对冲请求
+        self.max_ratio = 0.1 # 对冲请求数占总请求数的上限
+        self.min_samples = 20 # 至少有多少个耗时样本后才开始对冲
+        self.min_delay = 2.0 # 发出对冲请求前的最短等待时间（秒）
+
+
+class SchedulerConfig:
+    def __init__(self):
+        self.policy = "priority" # 任务调度策略: priority(短任务/最近保存优先, 带老化) 或 fifo(按提交顺序)
+        self.size_weight = 1.0 # 每 1000 token 增加的优先级分数, 越大越偏向小文件
+        self.aging_rate = 0.1 # 每等待 1 秒减少的优先级分数, 保证大文件最终能被执行
+        self.recency_bonus = 2.0 # 刚保存的文件的优先级加成
+        self.recency_decay = 30.0 # 保存加成的衰减时间（秒）
+
+
+class JournalConfig:
+    def __init__(self):
+        self.enabled = True # 是否记录任务日志, 重启后恢复分析结果和未完成的任务
+        self.path = "review_journal.db" # 任务日志数据库路径
+        self.flush_interval = 0.5 # 批量写入的最长间隔（秒）
+        self.max_age_days = 7 # 已完成的记录最长保留天数
 
-    
 
+class MetricsConfig:
+    def __init__(self):
+        self.http_port = 0 # 本机 Prometheus 指标端口(http://127.0.0.1:端口/metrics), 0 表示不启动
+        self.json_path = "" # 定期写入指标快照的 JSON 文件路径, 为空表示不写入
+        self.dump_interval = 60 # JSON 快照的写入间隔（秒）
+
+
+class ProfilingConfig:
+    def __init__(self):
+        self.enabled = False # 启动时即开始性能分析, 退出时写入结果; 也可在界面中按 Ctrl+Shift+P 开启
+        self.output_dir = "profiles" # pstats、火焰图和内存快照的输出目录
+        self.sample_interval = 0.01 # 调用栈采样间隔（秒）
+        self.tracemalloc_frames = 25 # 内存快照中每次分配记录的调用栈深度
+
+
+class ResultStoreConfig:
+    def __init__(self):
+        self.memory_limit_mb = 64 # 内存中压缩后的分析结果上限（MB）, 超过后最久未查看的结果转存到磁盘, 0 表示不限制
+        self.spill_path = "review_spill.db" # 转存文件路径, 只在本次运行中使用
+
+
+class TelemetryConfig:
+    def __init__(self):
+        self.enabled = False # 发现问题时是否上报统计, 需同时配置 base_url
+        self.base_url = "" # 统计收集接口地址, 如 http://host:5000, 为空表示不上报
+        self.spool_path = "telemetry_spool.jsonl" # 收集接口不可达时暂存统计的文件
+        self.max_queue = 1000 # 内存中等待发送的最大事件数, 超出时丢弃最旧的
+        self.max_spool = 10000 # 暂存文件中的最大事件数, 超出时丢弃最旧的
+        self.batch_size = 50 # 每批发送的最大事件数
+        self.flush_interval = 2 # 两次发送之间的最长间隔（秒）
+        self.retry_interval = 60 # 收集接口不可达后的重试间隔（秒）
+
+
+class HistoryConfig:
+    def __init__(self):
+        self.enabled = True # 是否记录每次review的结果和拆分后的问题
+        self.path = "findings_history.db" # review历史数据库路径
+        self.max_age_days = 365 # 历史记录保留天数, 每个文件最近一次review始终保留
@@ -1,12 +1,13 @@
 import os
 import sys
+import signal
+import argparse
+import threading
 import logging
 from config.config import Config
-from app.app import App
-import tkinter as tk
 sys.stdout = open(os.devnull, 'w')
 sys.stderr = open(os.devnull, 'w')
-def setup_logging(log_level):
+def setup_logging(log_level, stream=None):
     """设置日志记录"""
     valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
     if log_level.upper() not in valid_levels:
@@ -15,8 +16,9 @@ def setup_logging(log_level):
     logging.basicConfig(
         level=log_level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        force=True,  # 加载配置时的日志可能已经初始化了默认的处理器
         handlers=[
-            logging.StreamHandler(sys.stderr)
+            logging.StreamHandler(stream or sys.stderr)
         ]
     )
     logging.info("日志系统已初始化，日志级别: %s", logging.getLevelName(log_level))
@@ -26,7 +28,7 @@ def setup_logging_not_log(log_level):
     # 禁用整个日志模块
     def do_nothing(*args, **kwargs):
         pass
-    
+
     # 替换所有日志方法为空函数
     logging.debug = do_nothing
     logging.info = do_nothing
@@ -34,19 +36,162 @@ def setup_logging_not_log(log_level):
     logging.error = do_nothing
     logging.critical = do_nothing
     logging.log = do_nothing
-    
+
     # 禁用根记录器
     logging.getLogger().disabled = True
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Code Review AI Assistant")
+    parser.add_argument("--daemon", action="store_true", help="不启动界面, 作为后台进程持续监控并把结果写入磁盘")
+    parser.add_argument("--path", help="监控目录, 默认使用配置文件中的 monitor_project_path")
+    parser.add_argument("--output-dir", default="review_results", help="守护进程模式下分析结果的输出目录")
+    parser.add_argument("--log-level", help="日志级别, 默认使用配置文件中的 log_level")
+    parser.add_argument("--review-all", action="store_true", help="review --path 下所有已跟踪的文件后退出")
+    parser.add_argument("--range", dest="rev_range", help="review git 版本范围(如 main..HEAD)中变更的文件后退出")
+    parser.add_argument("--json", help="批量review的 JSON 报告路径, 默认 <output-dir>/review.json")
+    parser.add_argument("--sarif", help="批量review的 SARIF 报告路径")
+    parser.add_argument("--concurrency", type=int, help="最大并发请求数, 默认使用配置文件中的 max_concurrent_analysis")
+    parser.add_argument("--metrics-port", type=int, help="在 127.0.0.1 的该端口提供 Prometheus 格式的 /metrics")
+    parser.add_argument("--metrics-json", help="定期把性能指标快照写入该 JSON 文件")
+    parser.add_argument("--profile", metavar="DIR", help="启动时开始性能分析, 退出时把 pstats/火焰图写入该目录")
+    parser.add_argument("--findings", nargs="?", const="", metavar="DIR",
+                        help="输出review历史中(该目录下)各文件最近一次review的问题(JSON)后退出")
+    parser.add_argument("--regressions", nargs="?", const="", metavar="DIR",
+                        help="输出review历史中(该目录下)问题数比上一次多的文件(JSON)后退出")
+    parser.add_argument("--since", help="--findings/--regressions 的时间范围, 如 7d、12h 或 2024-01-31")
+    return parser.parse_args(argv)
+
+def run_daemon(config, args):
+    """无界面运行: 监控目录, 分析结果写入 output_dir, 收到 SIGINT/SIGTERM 后退出"""
+    from app.engine import AnalysisEngine
+    from app.result_writer import ResultWriter
+
+    path = args.path or config.monitor_project_path
+    engine = AnalysisEngine(config)
+    engine.subscribe(ResultWriter(engine, args.output_dir, path))
+    engine.start()
+    engine.restore_journal()
+    if not engine.start_monitoring(path):
+        engine.close()
+        logging.error("监控路径无效: %s", path)
+        return 1
+    logging.info("守护进程已启动, 监控: %s, 结果输出: %s", path, os.path.abspath(args.output_dir))
+
+    stop_event = threading.Event()
+    def on_signal(signum, frame):
+        logging.info("收到退出信号: %s", signum)
+        stop_event.set()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, "SIGUSR1"):
+        # SIGUSR1 开始/停止性能分析, SIGUSR2 写入内存快照
+        def on_profile_signal(signum, frame):
+            if engine.profiler is not None and engine.profiler.running:
+                engine.stop_profiling()
+            else:
+                engine.start_profiling()
+        signal.signal(signal.SIGUSR1, on_profile_signal)
+        signal.signal(signal.SIGUSR2, lambda signum, frame: engine.memory_snapshot())
+
+    try:
+        engine.serve_forever(stop_event)
+    finally:
+        engine.close()
+        logging.info("守护进程已退出")
+    return 0
+
+def run_batch(config, args):
+    """批量review整个仓库或版本范围内的文件, 有文件分析失败时返回 1"""
+    from app.batch_review import run_batch_review
+
+    path = args.path or config.monitor_project_path
+    if not path or not os.path.isdir(path):
+        logging.error("无效的review路径: %s", path)
+        return 1
+    json_path = args.json
+    if not json_path and not args.sarif:
+        os.makedirs(args.output_dir, exist_ok=True)
+        json_path = os.path.join(args.output_dir, "review.json")
+
+    stop_event = threading.Event()
+    def on_signal(signum, frame):
+        logging.info("收到退出信号: %s", signum)
+        stop_event.set()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    summary = run_batch_review(config, path, args.rev_range, json_path, args.sarif, stop_event=stop_event)
+    logging.info("批量review完成: %s", summary)
+    return 1 if summary["failed"] else 0
+
+def parse_since(value):
+    """把 7d/12h/30m 或 YYYY-MM-DD 转换为时间戳"""
+    import time
+    from datetime import datetime
+    if not value:
+        return None
+    units = {"d": 86400, "h": 3600, "m": 60}
+    if value[-1] in units and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    return datetime.strptime(value, "%Y-%m-%d").timestamp()
+
+def run_history_query(config, args):
+    """查询review历史, 结果以 JSON 输出到标准输出"""
+    import json
+    from app.findings_history import FindingsHistory
+
+    try:
+        since = parse_since(args.since)
+    except ValueError:
+        logging.error("无效的时间范围: %s", args.since)
+        return 1
+    history = FindingsHistory(config.history_config.path, max_age_days=config.history_config.max_age_days)
+    try:
+        if args.findings is not None:
+            result = history.open_findings(under=args.findings or None, since=since)
+        else:
+            result = history.regressions(under=args.regressions or None, since=since)
+    finally:
+        history.close()
+    stdout = sys.__stdout__ or sys.stdout
+    json.dump(result, stdout, ensure_ascii=False, indent=2)
+    stdout.write("\n")
+    return 0
+
+def main(argv=None):
+    args = parse_args(argv)
     try:
         config = Config()
         config.load_from_yaml()
-        setup_logging(config.log_level)
-        
+        if args.concurrency:
+            config.max_concurrent_analysis = args.concurrency
+        if args.metrics_port is not None:
+            config.metrics_config.http_port = args.metrics_port
+        if args.metrics_json:
+            config.metrics_config.json_path = args.metrics_json
+        if args.profile:
+            config.profiling_config.enabled = True
+            config.profiling_config.output_dir = args.profile
+        if args.findings is not None or args.regressions is not None:
+            setup_logging(args.log_level or config.log_level, sys.__stderr__ or sys.stderr)
+            sys.exit(run_history_query(config, args))
+        if args.review_all or args.rev_range:
+            setup_logging(args.log_level or config.log_level, sys.__stderr__ or sys.stderr)
+            sys.exit(run_batch(config, args))
+        if args.daemon:
+            # 守护进程没有界面, 日志输出到原始的标准错误
+            setup_logging(args.log_level or config.log_level, sys.__stderr__ or sys.stderr)
+            sys.exit(run_daemon(config, args))
+        setup_logging(args.log_level or config.log_level)
+        if args.path:
+            config.monitor_project_path = args.path
+
         # 创建并运行GUI应用
+        import tkinter as tk
+        from app.app import App
         root = tk.Tk()
-        app = App(root)
+        app = App(root, config)
+        root.protocol("WM_DELETE_WINDOW", app.on_closing)
         root.mainloop()
     except Exception as e:
         # 使用基本日志记录（避免动态内容泄露）
@@ -55,7 +200,7 @@ def main():
     finally:
         if 'root' in locals():  # 仅检查变量是否存在，不检查对象状态
             logging.info("应用已关闭")
-    
+
 # pyinstaller -w -F -n "Code Review AI Assistant" -i icon.ico main.py
 if __name__ == "__main__":
-    main()  
\ No newline at end of file
+    main()
@@ -6,6 +6,7 @@ import logging
 import subprocess
 import threading
 from monitor.gitignore import GitIgnoreChecker
+from monitor.metrics import get_metrics
 from config.config import Config
 
 class DirectoryWatcher:
@@ -38,6 +39,12 @@ class DirectoryWatcher:
             self.git_lock = git_lock # 用于保护 git 状态的锁
             self.config = config
             self.git_ignore_checker = git_ignore_checker
+            metrics = get_metrics()
+            self.events_counter = metrics.counter("watchdog_events_total", "文件修改事件数")
+            self.event_timer = metrics.stage("watchdog_event")
+            self.git_status_timer = metrics.stage("git_status")
+            self.gitignore_timer = metrics.stage("gitignore")
+            self.file_read_timer = metrics.stage("file_read")
 
         def _match_type(self, file_path):
             if not self.file_types:
@@ -46,21 +53,37 @@ class DirectoryWatcher:
 
         def on_modified(self, event):
             if not event.is_directory and self._match_type(event.src_path):
-                git_changes, is_git = self._get_git_changes()
-                file_name = os.path.basename(event.src_path)
-                # 如果是 git 仓库且文件不在变更列表中，则忽略
-                if is_git and file_name not in git_changes:
-                    return
-                if self.config.ignore_gitignore and self.git_ignore_checker.is_ignored(event.src_path):
-                    return
+                self.events_counter.inc()
+                start = time.perf_counter()
                 try:
-                    with open(event.src_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    # 调用回调函数，传递文件路径和内容
-                    if self.callback:
-                        self.callback(event.src_path, content)
-                except Exception as e:
-                    logging.info(f"读取文件失败: {e}")
+                    self._handle_modified(event.src_path)
+                finally:
+                    self.event_timer.observe(time.perf_counter() - start)
+
+        def _handle_modified(self, src_path):
+            start = time.perf_counter()
+            git_changes, is_git = self._get_git_changes()
+            self.git_status_timer.observe(time.perf_counter() - start)
+            file_name = os.path.basename(src_path)
+            # 如果是 git 仓库且文件不在变更列表中，则忽略
+            if is_git and file_name not in git_changes:
+                return
+            if self.config.ignore_gitignore:
+                start = time.perf_counter()
+                ignored = self.git_ignore_checker.is_ignored(src_path)
+                self.gitignore_timer.observe(time.perf_counter() - start)
+                if ignored:
+                    return
+            try:
+                start = time.perf_counter()
+                with open(src_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                self.file_read_timer.observe(time.perf_counter() - start)
+                # 调用回调函数，传递文件路径和内容
+                if self.callback:
+                    self.callback(src_path, content)
+            except Exception as e:
+                logging.info(f"读取文件失败: {e}")
 
         # 返还变更文件,以及是否是git目录            
         def _get_git_changes(self):
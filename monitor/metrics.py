@@ -0,0 +1,298 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 耗时直方图的桶上限(秒): 0.1ms ~ 约 14 分钟, 按 2 倍递增
+DEFAULT_BUCKETS = tuple(0.0001 * 2 ** i for i in range(24))
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    TYPE = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name:str, labels:str):
+        yield name, labels, self.value
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """可设置的当前值, 指定 func 时在导出时调用 func 取值"""
+
+    TYPE = "gauge"
+
+    def __init__(self, func=None):
+        self.value = 0
+        self.func = func
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def get(self):
+        if self.func is None:
+            return self.value
+        try:
+            return self.func()
+        except Exception as e:
+            logging.debug(f"读取指标失败: {e}")
+            return 0
+
+    def samples(self, name:str, labels:str):
+        yield name, labels, self.get()
+
+    def snapshot(self):
+        return self.get()
+
+
+class Histogram:
+    """
+    固定桶的直方图
+
+    observe() 只做一次二分查找和几次加法, 开销在 1 微秒以内; 分位数按桶内线性插值估算
+    """
+
+    TYPE = "histogram"
+
+    def __init__(self, buckets:tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value:float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, p:float) -> float:
+        """估算第 p 百分位的值, 没有样本时返回 0"""
+        with self._lock:
+            counts, total, maximum = list(self.counts), self.count, self.max
+        if not total:
+            return 0.0
+        rank = total * p / 100
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                return min(maximum, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return maximum
+
+    def samples(self, name:str, labels:str):
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield name + "_bucket", _join_labels(labels, 'le="{:g}"'.format(bound)), cumulative
+        yield name + "_bucket", _join_labels(labels, 'le="+Inf"'), total
+        yield name + "_sum", labels, value_sum
+        yield name + "_count", labels, total
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+def _join_labels(labels:str, extra:str) -> str:
+    return "{},{}".format(labels, extra) if labels else extra
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表
+
+    - counter/gauge/histogram 按 (名称, 标签) 获取或创建指标, 调用方应在初始化时获取并保存, 避免每次查找
+    - render_prometheus() 生成 Prometheus 文本格式, snapshot() 生成 JSON 可序列化的 dict
+    """
+
+    def __init__(self):
+        self._metrics = {}  # {(name, labels): metric}
+        self._help = {}  # {name: (type, help)}
+        self._label_values = {}  # {(name, labels): "值1,值2"}, JSON 快照中使用
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name:str, help_text:str, labels:dict, *args):
+        key = (name, _format_labels(labels))
+        metric = self._metrics.get(key)
+        if metric is not None:
+            return metric
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = cls(*args)
+                self._metrics[key] = metric
+                self._label_values[key] = ",".join(str(v) for _, v in sorted(labels.items()))
+                self._help.setdefault(name, (cls.TYPE, help_text))
+            return metric
+
+    def counter(self, name:str, help_text:str = "", **labels) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name:str, help_text:str = "", func=None, **labels) -> Gauge:
+        gauge = self._get(Gauge, name, help_text, labels)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name:str, help_text:str = "", buckets:tuple = DEFAULT_BUCKETS, **labels) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets)
+
+    def stage(self, stage:str) -> Histogram:
+        """流水线各阶段的耗时直方图"""
+        return self.histogram("review_stage_seconds", "代码review流水线各阶段耗时(秒)", stage=stage)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            items = sorted(self._metrics.items())
+        lines = []
+        current = None
+        for (name, labels), metric in items:
+            if name != current:
+                current = name
+                metric_type, help_text = self._help[name]
+                if help_text:
+                    lines.append("# HELP {} {}".format(name, help_text))
+                lines.append("# TYPE {} {}".format(name, metric_type))
+            for sample_name, sample_labels, value in metric.samples(name, labels):
+                label_text = "{{{}}}".format(sample_labels) if sample_labels else ""
+                lines.append("{}{} {}".format(sample_name, label_text, _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """{名称: 值} 或 {名称: {标签值: 值}}, 直方图的值包含 count/sum/max/p50/p95/p99"""
+        with self._lock:
+            items = sorted(self._metrics.items())
+        result = {'timestamp': time.time()}
+        for (name, labels), metric in items:
+            if labels:
+                result.setdefault(name, {})[self._label_values[(name, labels)]] = metric.snapshot()
+            else:
+                result[name] = metric.snapshot()
+        return result
+
+
+def _format_labels(labels:dict) -> str:
+    return ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                    for k, v in sorted(labels.items()))
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class MetricsServer:
+    """在本机端口上提供 /metrics (Prometheus 文本格式) 和 /metrics.json"""
+
+    def __init__(self, registry:MetricsRegistry, port:int, host:str = "127.0.0.1"):
+        self.registry = registry
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry_ref.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry_ref.snapshot(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics-http")
+        self._thread.start()
+        logging.info(f"指标服务已启动: http://{host}:{self.port}/metrics")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsDumper:
+    """每隔 interval 秒把指标快照写入 JSON 文件（先写临时文件再替换, 读取方不会读到半个文件）"""
+
+    def __init__(self, registry:MetricsRegistry, path:str, interval:float = 60):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="metrics-dump")
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.registry.snapshot(), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.error(f"写入指标文件失败: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self.dump()
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """获取进程内共享的指标注册表"""
+    return _default_registry
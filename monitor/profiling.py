@@ -0,0 +1,184 @@
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+class StackSampler:
+    """
+    采样所有线程的调用栈, 输出 flamegraph.pl / speedscope 可读取的 collapsed stack 格式
+
+    每隔 interval 秒读取一次 sys._current_frames(), 不需要在各个线程中注册钩子
+    """
+
+    def __init__(self, interval:float = 0.01):
+        self.interval = interval
+        self.stacks = Counter()  # {"线程;外层函数;...;内层函数": 次数}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="stack-sampler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename),
+                                                     code.co_firstlineno))
+                    frame = frame.f_back
+                parts.append(names.get(thread_id, str(thread_id)))
+                parts.reverse()
+                self.stacks[";".join(p.replace(";", ":") for p in parts)] += 1
+            self.samples += 1
+
+    def write(self, path:str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+
+class Profiler:
+    """
+    按需开启的性能分析
+
+    - start()/stop(): 在注册的线程(UI 线程、调度器事件循环线程)中开启 cProfile, 同时采样所有线程的调用栈,
+      停止后写入 .pstats (可用 snakeviz / pstats 查看) 和 .collapsed (火焰图)
+    - memory_snapshot(): 使用 tracemalloc 记录内存分配, 写入占用最多的位置以及与上一次快照的差异
+    - 未开启时不安装任何钩子, 没有额外开销
+    """
+
+    def __init__(self, output_dir:str = "profiles", sample_interval:float = 0.01, tracemalloc_frames:int = 25):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self._profiles = {}  # {线程名: cProfile.Profile}
+        self._sampler = None
+        self._started_at = None
+        self._last_snapshot = None
+        self._snapshot_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._started_at is not None
+
+    def start(self):
+        """开始采样调用栈, 并在当前线程开启 cProfile; 其他线程通过 enable_current_thread() 加入"""
+        with self._lock:
+            if self._started_at is not None:
+                return
+            self._started_at = time.time()
+            self._sampler = StackSampler(self.sample_interval)
+            self._sampler.start()
+        self.enable_current_thread()
+        logging.info("性能分析已开始")
+
+    def enable_current_thread(self):
+        """在调用线程中开启 cProfile（cProfile 只能在开启它的线程中统计和关闭）"""
+        name = threading.current_thread().name
+        with self._lock:
+            if self._started_at is None or name in self._profiles:
+                return
+            profile = cProfile.Profile()
+            self._profiles[name] = profile
+        profile.enable()
+
+    def disable_current_thread(self):
+        profile = self._profiles.get(threading.current_thread().name)
+        if profile is not None:
+            profile.disable()
+
+    def stop(self) -> list:
+        """
+        停止性能分析并写入结果文件, 其他线程需要先调用 disable_current_thread()
+        :return: 写入的文件路径列表
+        """
+        self.disable_current_thread()
+        with self._lock:
+            if self._started_at is None:
+                return []
+            started_at, self._started_at = self._started_at, None
+            profiles, self._profiles = self._profiles, {}
+            sampler, self._sampler = self._sampler, None
+        sampler.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, time.strftime("profile_%Y%m%d_%H%M%S", time.localtime(started_at)))
+        paths = []
+        for name, profile in profiles.items():
+            path = "{}_{}.pstats".format(prefix, _safe_name(name))
+            profile.dump_stats(path)
+            paths.append(path)
+        if profiles:
+            # 合并后的统计按累计耗时输出文本摘要
+            path = prefix + "_summary.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                stats = pstats.Stats(*(p for p in profiles.values()), stream=f)
+                stats.sort_stats("cumulative").print_stats(80)
+            paths.append(path)
+        path = prefix + ".collapsed"
+        sampler.write(path)
+        paths.append(path)
+        logging.info(f"性能分析已停止, {time.time() - started_at:.0f}秒, 采样 {sampler.samples} 次: {paths}")
+        return paths
+
+    def memory_snapshot(self, top:int = 50) -> str:
+        """
+        记录一次内存快照, 第一次调用时开启 tracemalloc(之后的分配才会被记录)
+        :return: 写入的文件路径
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._snapshot_count += 1
+        path = os.path.join(self.output_dir, "{}_{}.txt".format(time.strftime("memory_%Y%m%d_%H%M%S"),
+                                                                self._snapshot_count))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("当前: {:.1f} MB, 峰值: {:.1f} MB\n\n".format(current / 1024 / 1024, peak / 1024 / 1024))
+            if self._last_snapshot is not None:
+                f.write("与上一次快照相比增长最多的位置:\n")
+                for stat in snapshot.compare_to(self._last_snapshot, "lineno")[:top]:
+                    f.write("{}\n".format(stat))
+                f.write("\n")
+            f.write("占用最多的位置:\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                f.write("{}\n".format(stat))
+        self._last_snapshot = snapshot
+        logging.info(f"内存快照已写入: {path}")
+        return path
+
+    def stop_memory_tracing(self):
+        """关闭 tracemalloc, 释放其占用的内存"""
+        self._last_snapshot = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def _safe_name(name:str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)